@@ -1,16 +1,39 @@
 import typer
 import os
 import asyncio
-import uvicorn
+import importlib.util
+from pathlib import Path
 from typing import Optional
 
 # Import necessary components from other modules
 from . import state # Import state module
 from .web_server import app, configure_static_files # Import FastAPI app and static config
 from .stdio_server import run_stdio_mode # Import stdio runner
+from .core import ensure_dir
 # Import handlers to ensure they are loaded (though not directly used here)
 from . import handlers
 
+def _uvicorn_fast_options() -> dict:
+    """
+    Selects uvicorn's C-accelerated components (uvloop event loop, httptools parser)
+    explicitly when they are installed (they come with 'uvicorn[standard]'), falling
+    back to uvicorn's defaults where they are not available (e.g. uvloop on Windows).
+    """
+    options = {}
+    if importlib.util.find_spec("uvloop") is not None: options["loop"] = "uvloop"
+    else: state.log.warning("uvloop not available, using the default asyncio event loop.")
+    if importlib.util.find_spec("httptools") is not None: options["http"] = "httptools"
+    else: state.log.warning("httptools not available, using the pure-Python h11 HTTP parser.")
+    return options
+
+def _run_stdio_with_fast_loop() -> None:
+    """Runs stdio mode on uvloop's libuv event loop when it is installed, else on the default asyncio loop."""
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy()) # asyncio.Runner(loop_factory=...) needs Python 3.11+
+    except ImportError: state.log.info("uvloop not available, running stdio mode on the default asyncio event loop.")
+    asyncio.run(run_stdio_mode())
+
 # Define the Typer app globally
 cli = typer.Typer()
 
@@ -41,14 +64,17 @@ def main(
     # --- Determine Static/Assets Path (if provided) ---
     serve_frontend = False
     if static_dir_arg:
-        state.ACTIVE_STATIC_DIR = os.path.abspath(static_dir_arg)
+        static_root = Path(static_dir_arg).resolve() # Resolved once; paths below are derived from it
+        state.ACTIVE_STATIC_DIR = str(static_root)
         # Assume assets is always a subdir named 'assets' within the static dir
-        state.ACTIVE_ASSETS_DIR_PATH = os.path.join(state.ACTIVE_STATIC_DIR, "assets")
+        state.ACTIVE_ASSETS_DIR_PATH = str(static_root / "assets")
         serve_frontend = True
         state.log.info(f"Static directory for frontend enabled: {state.ACTIVE_STATIC_DIR}")
-        # Ensure static/assets dirs exist if specified
-        os.makedirs(state.ACTIVE_STATIC_DIR, exist_ok=True)
-        if state.ACTIVE_ASSETS_DIR_PATH: os.makedirs(state.ACTIVE_ASSETS_DIR_PATH, exist_ok=True)
+        # Ensure static/assets dirs exist if specified. One scandir of the static dir shows
+        # which subdirs are already there, so makedirs only runs for the missing ones.
+        try: static_subdirs = {entry.name for entry in os.scandir(state.ACTIVE_STATIC_DIR) if entry.is_dir()}
+        except FileNotFoundError: ensure_dir(state.ACTIVE_STATIC_DIR); static_subdirs = set()
+        if "assets" not in static_subdirs: ensure_dir(state.ACTIVE_ASSETS_DIR_PATH)
         state.log.info(f"Ensured static directory exists: {state.ACTIVE_STATIC_DIR}")
     else:
         state.ACTIVE_STATIC_DIR = None # Explicitly set to None if not provided
@@ -64,8 +90,9 @@ def main(
         state.log.warning("Static file serving enabled, but render/preview paths are now workspace-relative.")
         state.log.warning(f"Mounting default '/{state.DEFAULT_RENDER_DIR_NAME}' and '/{state.DEFAULT_PART_PREVIEW_DIR_NAME}' - actual files must be served separately or via workspace-aware routing.")
         # Use placeholder paths for the function signature, as they aren't used for direct file access here.
-        placeholder_render_path = os.path.join(os.getcwd(), state.DEFAULT_RENDER_DIR_NAME)
-        placeholder_preview_path = os.path.join(os.getcwd(), state.DEFAULT_PART_PREVIEW_DIR_NAME)
+        cwd = Path.cwd()
+        placeholder_render_path = str(cwd / state.DEFAULT_RENDER_DIR_NAME)
+        placeholder_preview_path = str(cwd / state.DEFAULT_PART_PREVIEW_DIR_NAME)
         # configure_static_files is imported from web_server
         configure_static_files(
             app, # Use the imported app instance
@@ -84,12 +111,13 @@ def main(
     if mode_lower == "stdio":
         state.log.info("Starting server in stdio mode.")
         # Run the stdio mode handler directly
-        asyncio.run(run_stdio_mode()) # Call imported function
+        _run_stdio_with_fast_loop()
     elif mode_lower == "sse":
         state.log.info(f"Starting HTTP/SSE server on {host}:{port}")
         # Run the FastAPI server using uvicorn
         # Pass the app instance imported from web_server
-        uvicorn.run(app, host=host, port=port)
+        import uvicorn # Only needed for SSE mode
+        uvicorn.run(app, host=host, port=port, **_uvicorn_fast_options())
     else:
         state.log.error(f"Invalid mode specified: '{mode}'. Must be 'sse' or 'stdio'.")
         raise typer.Exit(code=1)
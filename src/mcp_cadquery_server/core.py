@@ -1,24 +1,103 @@
+import io
 import os
 import re
-import ast
+import inspect
 import logging
-from typing import Dict, Any, List, Optional
-
-# Import CadQuery-related libraries directly needed by core functions
-import cadquery as cq
-from cadquery import cqgi
-from cadquery import exporters
+import functools
+import concurrent.futures
+import hashlib
+import importlib
+import weakref
+from typing import Dict, Any, List, Optional, Set, Tuple, TYPE_CHECKING
+
+# CadQuery pulls in the OCCT bindings, which take seconds to import, so it is imported
+# inside the functions that need it. Startup, --help and tools that never touch
+# geometry (e.g. search_parts) don't pay for it.
+if TYPE_CHECKING:
+    import cadquery as cq
+    from cadquery import cqgi
 
 log = logging.getLogger(__name__) # Use standard logging
 
+# Module attributes resolved on first access (kept for code that refers to core.cq etc.)
+_LAZY_CADQUERY_ATTRS = frozenset({"cq", "cqgi", "exporters"})
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_CADQUERY_ATTRS: raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    cadquery = importlib.import_module("cadquery")
+    if name == "cq": value = cadquery
+    else: value = getattr(cadquery, name, None) or importlib.import_module(f"cadquery.{name}") # Same as 'from cadquery import <name>'
+    globals()[name] = value # Later lookups bypass __getattr__
+    return value
+
 # --- Core Logic Functions (Moved from server.py) ---
 
+# Blank lines and comments that may precede a module docstring
+_LEADING_TRIVIA_RE = re.compile(r"(?:[ \t\f]*(?:#[^\n]*)?\r?\n)*")
+# A triple-quoted str literal that makes up the whole first statement
+_DOCSTRING_RE = re.compile(r'[rRuU]?(?P<quote>"""|\'\'\')(?P<body>.*?)(?P=quote)[ \t]*(?:#[^\n]*)?(?:\r?\n|\Z)', re.DOTALL)
+# Start of any string literal, including prefixed ones (b'', f'', rb'', ...)
+_STRING_START_RE = re.compile(r"""[rRuUbBfF]{0,2}['"]""")
+
+def extract_module_docstring(source: str) -> Optional[str]:
+    """
+    Returns the module docstring of Python source code.
+
+    Equivalent to ast.get_docstring(ast.parse(source)), but avoids parsing the
+    whole module for the common cases of a plain triple-quoted docstring or no
+    docstring at all. Anything the fast path cannot reproduce exactly, such as
+    escape sequences or single-quoted docstrings, falls back to ast.
+
+    Raises:
+        SyntaxError: If the fallback parse fails.
+    """
+    start = _LEADING_TRIVIA_RE.match(source).end()
+    match = _DOCSTRING_RE.match(source, start)
+    if match:
+        body = match.group("body")
+        if "\\" not in body and "\r" not in body:
+            return inspect.cleandoc(body)
+    elif not _STRING_START_RE.match(source, start) and not source.startswith(("(", "\\"), start):
+        return None # First statement is not a string literal, so there is no docstring
+    import ast # Only needed on the slow path
+    return ast.get_docstring(ast.parse(source))
+
+# A 'Key: Value' line: everything before the first colon, and the rest of the line
+_METADATA_LINE_RE = re.compile(r"^([^:\r\n]*):([^\r\n]*)", re.MULTILINE)
+
+@functools.lru_cache(maxsize=2048)
+def _parse_docstring_metadata_cached(docstring: str) -> Dict[str, Any]:
+    """Cached worker for parse_docstring_metadata. The returned dict must not be mutated."""
+    metadata: Dict[str, Any] = {}
+    if not docstring: return metadata
+    # One regex scan visits only the lines containing a colon (split at the first one),
+    # without building a list of all lines first.
+    for match in _METADATA_LINE_RE.finditer(docstring):
+        key_part, value = match.group(1).strip(), match.group(2).strip()
+        if not value: continue
+        # Only single-word keys are converted to snake_case and checked with isidentifier()
+        if ' ' not in key_part:
+            key = key_part.lower() # No need for replace if no spaces
+            if key.isidentifier():
+                if key == 'tags':
+                    # Lowercase the whole value once and strip each tag once
+                    metadata[key] = [tag for tag in map(str.strip, value.lower().split(',')) if tag]
+                else:
+                    metadata[key] = value
+        # Handle known multi-word keys explicitly (like 'Part Name')
+        elif key_part.lower() == "part name":
+            metadata["part_name"] = value
+        # Add other known multi-word keys here if needed
+    return metadata
+
 def parse_docstring_metadata(docstring: Optional[str]) -> Dict[str, Any]:
     """
     Parses metadata key-value pairs from a Python docstring.
 
     Looks for lines formatted as 'Key: Value'. Converts keys to lowercase
     snake_case. Handles 'Tags' key specially, splitting by comma.
+    Results are memoized per docstring text, so re-scanning unchanged
+    headers is cheap.
 
     Args:
         docstring: The docstring to parse.
@@ -26,34 +105,25 @@ def parse_docstring_metadata(docstring: Optional[str]) -> Dict[str, Any]:
     Returns:
         A dictionary containing the parsed metadata.
     """
-    metadata = {}
-    if not docstring: return metadata
-    lines = docstring.strip().split('\n')
-    for line in lines:
-        line = line.strip()
-        if ':' in line:
-            parts = line.split(':', 1)
-            key_part = parts[0].strip()
-            value = parts[1].strip()
-            # Check if value is non-empty and original key_part doesn't contain spaces
-            # before converting to snake_case and checking isidentifier()
-            if value and ' ' not in key_part:
-                 key = key_part.lower() # No need for replace if no spaces
-                 if key.isidentifier():
-                     if key == 'tags':
-                         metadata[key] = [tag.strip().lower() for tag in value.split(',') if tag.strip()]
-                     else:
-                         metadata[key] = value
-            # Handle known multi-word keys explicitly (like 'Part Name')
-            elif value and key_part.lower() == "part name":
-                 metadata["part_name"] = value
-            # Add other known multi-word keys here if needed
-    return metadata
+    if not docstring: return {}
+    # Return a copy so callers can add keys (e.g. 'filename') without touching the cache
+    return {key: list(value) if isinstance(value, list) else value
+            for key, value in _parse_docstring_metadata_cached(docstring).items()}
+
+@functools.lru_cache(maxsize=64)
+def _parse_cqgi_script(script_content: str) -> "cqgi.CQModel":
+    """
+    Parses a CQGI script, reusing the model for repeated builds of the same script text.
+    CQModel.build() sets up a fresh environment on each call, so a cached model can be rebuilt.
+    """
+    from cadquery import cqgi
+    log.info("Parsing script with CQGI...")
+    return cqgi.parse(script_content) # SyntaxError propagates (and is not cached)
 
-def execute_cqgi_script(script_content: str) -> cqgi.BuildResult:
+def execute_cqgi_script(script_content: str) -> "cqgi.BuildResult":
     """Parses and executes a CQGI script."""
-    log.info("Parsing script with CQGI..."); model = cqgi.parse(script_content)
-    log.info("Script parsed."); log.info(f"Building model...")
+    model = _parse_cqgi_script(script_content)
+    log.info(f"Building model...")
     # Build without attempting parameter injection via arguments
     build_result = model.build(); log.info(f"Model build finished. Success: {build_result.success}")
     if not build_result.success:
@@ -62,43 +132,118 @@ def execute_cqgi_script(script_content: str) -> cqgi.BuildResult:
         # raise Exception(f"Script execution failed: {build_result.exception}")
     return build_result
 
-def _substitute_parameters(script_lines: List[str], params: Dict[str, Any]) -> List[str]:
-    """Substitutes parameters into script lines marked with # PARAM."""
-    modified_lines = []
-    param_pattern = re.compile(r"^\s*(\w+)\s*=\s*.*#\s*PARAM\s*$")
-    for line in script_lines:
-        match = param_pattern.match(line)
-        if match:
-            param_name = match.group(1)
-            if param_name in params:
-                value = params[param_name]
-                # Format value as Python literal (basic handling)
-                if isinstance(value, str): formatted_value = repr(value)
-                elif isinstance(value, (int, float, bool, list, dict, tuple)) or value is None: formatted_value = repr(value)
-                else: formatted_value = str(value) # Fallback for other types
-                indent = line[:match.start(1)] # Preserve original indentation
-                modified_lines.append(f"{indent}{param_name} = {formatted_value} # PARAM (Substituted)")
-                log.debug(f"Substituted parameter '{param_name}' with value: {formatted_value}")
-                continue # Skip original line
-        modified_lines.append(line)
-    return modified_lines
+# Matches a whole '<name> = <value> # PARAM' line anywhere in a script.
+# [^\S\n] is used instead of \s so a match can never run across line breaks.
+_PARAM_RE = re.compile(r"^(?P<indent>[^\S\n]*)(?P<name>\w+)[^\S\n]*=[^\S\n]*.*#[^\S\n]*PARAM[^\S\n]*$", re.MULTILINE)
+
+def _format_param_value(value: Any) -> str:
+    """Formats a parameter value as a Python literal (basic handling)."""
+    if isinstance(value, str): return repr(value)
+    elif isinstance(value, (int, float, bool, list, dict, tuple)) or value is None: return repr(value)
+    else: return str(value) # Fallback for other types
+
+def _substitute_parameters(script_content: str, params: Dict[str, Any]) -> str:
+    """
+    Substitutes parameters into script lines marked with # PARAM.
+
+    The whole script is scanned in a single pass by the regex engine rather
+    than matching line by line. Original indentation is preserved.
+    """
+    if not params: return script_content
+
+    def _replace(match: "re.Match[str]") -> str:
+        param_name = match.group("name")
+        if param_name not in params: return match.group(0)
+        formatted_value = _format_param_value(params[param_name])
+        log.debug("Substituted parameter '%s' with value: %s", param_name, formatted_value) # Lazy, once per match
+        return f"{match.group('indent')}{param_name} = {formatted_value} # PARAM (Substituted)"
+
+    return _PARAM_RE.sub(_replace, script_content)
+
+# Directories known to exist, so repeated exports into the same directory skip the mkdir syscall
+_ensured_dirs: Set[str] = set()
+
+def ensure_dir(dir_path: str) -> None:
+    """Creates a directory (and parents) unless this process already created or saw it."""
+    if not dir_path or dir_path in _ensured_dirs: return
+    os.makedirs(dir_path, exist_ok=True)
+    _ensured_dirs.add(dir_path)
+
+def _forget_missing_dir(dir_path: str) -> bool:
+    """Drops a cached directory that has been deleted since; returns True if it was dropped."""
+    if dir_path in _ensured_dirs and not os.path.isdir(dir_path):
+        _ensured_dirs.discard(dir_path); return True
+    return False
+
+def _as_shape(shape_or_workplane: Any, action: str) -> "cq.Shape":
+    """Returns the cq.Shape for a Shape or Workplane (its first value); raises TypeError otherwise."""
+    import cadquery as cq
+    shape = shape_or_workplane.val() if isinstance(shape_or_workplane, cq.Workplane) else shape_or_workplane
+    if not isinstance(shape, cq.Shape): raise TypeError(f"Object to {action} is not a cq.Shape or cq.Workplane, but {type(shape)}")
+    return shape
+
+def _export_to_path(export: Any, output_path: str) -> None:
+    """
+    Runs an exporter call writing output_path, after ensuring its directory exists.
+
+    ensure_dir caches directories, so one deleted later is recreated and the export
+    retried once. Some cq exporters report nothing when they cannot write, so a
+    missing output file is raised as an error.
+    """
+    output_dir = os.path.dirname(output_path)
+    ensure_dir(output_dir)
+    try: export()
+    except Exception:
+        if not _forget_missing_dir(output_dir): raise
+    else:
+        if os.path.exists(output_path): return
+        if not _forget_missing_dir(output_dir): raise IOError(f"Exporter did not write '{output_path}'")
+    # The directory was removed after ensure_dir cached it; recreate it and retry once
+    ensure_dir(output_dir); export()
+    if not os.path.exists(output_path): raise IOError(f"Exporter did not write '{output_path}'")
 
 def export_shape_to_file(shape_to_export: Any, output_path: str, export_format: Optional[str] = None, export_options: Optional[dict] = None):
      """Exports a CadQuery shape/workplane to a specified file."""
-     shape = shape_to_export.val() if isinstance(shape_to_export, cq.Workplane) else shape_to_export
-     if not isinstance(shape, cq.Shape): raise TypeError(f"Object to export is not a cq.Shape or cq.Workplane, but {type(shape)}")
+     from cadquery import exporters
+     shape = _as_shape(shape_to_export, "export")
      if export_options is None: export_options = {}
      log.info(f"Exporting shape to file '{output_path}' (Format: {export_format or 'Infer'}, Options: {export_options})")
      try:
-         output_dir = os.path.dirname(output_path)
-         if output_dir: os.makedirs(output_dir, exist_ok=True)
-         exporters.export(shape, output_path, exportType=export_format, opt=export_options)
+         _export_to_path(lambda: exporters.export(shape, output_path, exportType=export_format, opt=export_options), output_path)
          log.info(f"Shape successfully exported to file '{output_path}'.")
      except Exception as e:
          error_msg = f"Core shape export to file '{output_path}' failed: {e}"
          log.error(error_msg, exc_info=True)
          raise Exception(error_msg) from e
 
+# Optional SVG post-processing: cq writes every coordinate at full float precision and one
+# <path> per edge. With the 'optimize' svg_opt (default False) path coordinates are rounded to
+# 'precision' decimals (default 2) and runs of sibling <path> elements (same attributes, so same
+# style) are merged into one. The rounding is in model units, before the SVG's scale transform,
+# so it is opt-in: it visibly distorts small parts. Neither option is passed on to cq.
+SVG_DEFAULT_PRECISION = 2
+_SVG_POSTPROCESS_OPTS = frozenset({"optimize", "precision"})
+_SVG_PATH_RUN_RE = re.compile(r'<path d="([^"]*)"\s*/>(?:\s*<path d="[^"]*"\s*/>)*')
+_SVG_PATH_D_RE = re.compile(r'<path d="([^"]*)"')
+_SVG_FLOAT_RE = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?')
+
+def optimize_svg_text(svg_text: str, precision: int = SVG_DEFAULT_PRECISION) -> str:
+    """Rounds path coordinates to 'precision' decimals and merges consecutive <path> elements."""
+    def round_number(match: "re.Match[str]") -> str:
+        rounded = f"{float(match.group(0)):.{precision}f}".rstrip('0').rstrip('.')
+        return "0" if rounded in ("-0", "") else rounded
+    def merge_paths(match: "re.Match[str]") -> str:
+        path_data = " ".join(d.strip() for d in _SVG_PATH_D_RE.findall(match.group(0)))
+        return f'<path d="{_SVG_FLOAT_RE.sub(round_number, path_data)}" />'
+    return _SVG_PATH_RUN_RE.sub(merge_paths, svg_text)
+
+def _render_svg_text(shape: Any, svg_opts: dict) -> str:
+    """Renders a cq.Shape to SVG text, post-processed when svg_opts asks for it (see optimize_svg_text)."""
+    from cadquery.occ_impl.exporters.svg import getSVG
+    svg_text = getSVG(shape, {key: value for key, value in svg_opts.items() if key not in _SVG_POSTPROCESS_OPTS})
+    if svg_opts.get('optimize', False): svg_text = optimize_svg_text(svg_text, svg_opts.get('precision', SVG_DEFAULT_PRECISION))
+    return svg_text
+
 def export_shape_to_svg_file(shape_to_render: Any, output_path: str, svg_opts: dict) -> None:
     """
     Exports a CadQuery shape or Workplane to an SVG file.
@@ -106,21 +251,96 @@ def export_shape_to_svg_file(shape_to_render: Any, output_path: str, svg_opts: d
     Args:
         shape_to_render: The CadQuery object (Shape or Workplane) to export.
         output_path: The full path to save the SVG file.
-        svg_opts: A dictionary of options for cq.exporters.export (SVG specific).
+        svg_opts: A dictionary of SVG options for cq's SVG exporter, plus the opt-in
+            'optimize'/'precision' post-processing (see optimize_svg_text).
 
     Raises:
         TypeError: If the object is not a cq.Shape or cq.Workplane.
         Exception: If the export process fails.
     """
-    shape = shape_to_render.val() if isinstance(shape_to_render, cq.Workplane) else shape_to_render
-    if not isinstance(shape, cq.Shape): raise TypeError(f"Object to export is not a cq.Shape or cq.Workplane, but {type(shape)}")
+    shape = _as_shape(shape_to_render, "export")
     log.info(f"Exporting shape to SVG '{output_path}' with options: {svg_opts}")
     try:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        exporters.export(shape, output_path, exportType='SVG', opt=svg_opts)
+        # Rendered in memory (as cq's SVG exporter does) so any post-processing happens before the one write
+        svg_text = _render_svg_text(shape, svg_opts)
+        def write_svg() -> None:
+            with open(output_path, 'w', encoding='utf-8') as f: f.write(svg_text)
+        _export_to_path(write_svg, output_path)
         log.info(f"Shape successfully exported to SVG '{output_path}'.")
     except Exception as e: error_msg = f"Core SVG export failed: {e}"; log.error(error_msg, exc_info=True); raise Exception(error_msg) from e
 
+def shape_to_brep_bytes(shape_to_serialize: Any) -> bytes:
+    """Serializes a CadQuery shape or Workplane to BREP bytes (e.g. to pass it to another process)."""
+    shape = _as_shape(shape_to_serialize, "serialize")
+    brep_buffer = io.BytesIO()
+    shape.exportBrep(brep_buffer)
+    return brep_buffer.getvalue()
+
+def export_brep_to_svg_file(brep_bytes: bytes, output_path: str, svg_opts: dict) -> None:
+    """
+    Exports a shape given as BREP bytes to an SVG file.
+
+    cq.Shape objects cannot be pickled, so this is the entry point used to render
+    SVGs in worker processes. Raises the same exceptions as export_shape_to_svg_file.
+    """
+    import cadquery as cq
+    shape = cq.Shape.importBrep(io.BytesIO(brep_bytes))
+    export_shape_to_svg_file(shape, output_path, svg_opts)
+
+def render_brep_to_svg_bytes(brep_bytes: bytes, svg_opts: dict) -> bytes:
+    """
+    Renders a shape given as BREP bytes to an SVG document (UTF-8 bytes) without writing a file.
+
+    The result is identical to what export_brep_to_svg_file writes, so callers can compare
+    it with an existing file and skip rewriting unchanged output. Picklable in and out,
+    for worker processes.
+    """
+    import cadquery as cq
+    shape = cq.Shape.importBrep(io.BytesIO(brep_bytes))
+    try: return _render_svg_text(shape, svg_opts).encode('utf-8')
+    except Exception as e: error_msg = f"Core SVG render failed: {e}"; log.error(error_msg, exc_info=True); raise Exception(error_msg) from e
+
+def build_script_brep_bytes(script_content: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Executes a CQGI script and returns its first shown result as BREP bytes.
+
+    Takes and returns only plain (picklable) values so scripts can be built in worker
+    processes. Returns (brep_bytes, None) on success, (None, None) if the script showed
+    no objects and (None, error message) if the build failed. SyntaxError propagates.
+    """
+    build_result = execute_cqgi_script(script_content)
+    if not build_result.success: return None, str(build_result.exception)
+    if not build_result.results: return None, None
+    return shape_to_brep_bytes(build_result.results[0].shape), None
+
+# Analysis results per shape (properties, type, face/edge/vertex counts), so describing,
+# exporting and re-describing the same shape does not repeat the OCCT traversals.
+# Weakly keyed: entries go away with the shape. cq.Shape hashes/compares by the wrapped
+# TopoDS shape, so wrappers of the same geometry share an entry.
+_shape_analysis_cache: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+def invalidate_shape_cache(shape: Any) -> None:
+    """Drops cached analysis for a shape, for callers that modify its geometry in place."""
+    _shape_analysis_cache.pop(shape, None)
+
+def _mass_properties(shape: Any) -> Any:
+    """
+    Runs one GProp_GProps pass over the shape, choosing linear/surface/volume properties
+    by shape type exactly as cq.Shape.Volume() and Center() do (each of which would run it again).
+    Uses OCP's public BRepGProp API rather than cadquery's internal lookup table.
+    """
+    from OCP.GProp import GProp_GProps
+    from OCP.BRepGProp import BRepGProp
+    from OCP.TopAbs import TopAbs_ShapeEnum
+    shape_type = shape.wrapped.ShapeType()
+    if shape_type in (TopAbs_ShapeEnum.TopAbs_EDGE, TopAbs_ShapeEnum.TopAbs_WIRE): calc_function = BRepGProp.LinearProperties_s
+    elif shape_type in (TopAbs_ShapeEnum.TopAbs_FACE, TopAbs_ShapeEnum.TopAbs_SHELL): calc_function = BRepGProp.SurfaceProperties_s
+    elif shape_type in (TopAbs_ShapeEnum.TopAbs_SOLID, TopAbs_ShapeEnum.TopAbs_COMPSOLID, TopAbs_ShapeEnum.TopAbs_COMPOUND): calc_function = BRepGProp.VolumeProperties_s
+    else: raise NotImplementedError(f"No mass properties for shape type {shape.ShapeType()}")
+    props = GProp_GProps()
+    calc_function(shape.wrapped, props)
+    return props
+
 def get_shape_properties(shape_to_analyze: Any) -> Dict[str, Any]:
     """
     Calculates various geometric properties of a CadQuery Shape or Workplane.
@@ -137,9 +357,18 @@ def get_shape_properties(shape_to_analyze: Any) -> Dict[str, Any]:
         TypeError: If the object is not a cq.Shape or cq.Workplane.
         Exception: For errors during property calculation.
     """
-    shape = shape_to_analyze.val() if isinstance(shape_to_analyze, cq.Workplane) else shape_to_analyze
-    if not isinstance(shape, cq.Shape):
-        raise TypeError(f"Object to analyze is not a cq.Shape or cq.Workplane, but {type(shape)}")
+    return _get_shape_properties_raw(_as_shape(shape_to_analyze, "analyze"))
+
+def _copy_properties(properties: Dict[str, Any]) -> Dict[str, Any]:
+    """Copies a properties dict down to its nested dicts, so callers can't modify the cached one."""
+    return {key: _copy_properties(value) if isinstance(value, dict) else value for key, value in properties.items()}
+
+def _get_shape_properties_raw(shape: "cq.Shape") -> Dict[str, Any]:
+    """get_shape_properties for an already normalized cq.Shape (no Workplane/type handling)."""
+    analysis = _shape_analysis_cache.get(shape)
+    if analysis and "properties" in analysis:
+        log.info(f"Using cached properties for shape of type {type(shape)}")
+        return _copy_properties(analysis["properties"])
 
     log.info(f"Calculating properties for shape of type {type(shape)}")
     properties = {}
@@ -158,9 +387,15 @@ def get_shape_properties(shape_to_analyze: Any) -> Dict[str, Any]:
             log.warning(f"Could not calculate bounding box: {bb_err}", exc_info=True)
             properties['bounding_box'] = None
 
+        # Volume and center of mass share a single mass-properties pass
+        mass_props, mass_err = None, None
+        try: mass_props = _mass_properties(shape)
+        except Exception as e: mass_err = e
+
         # Volume
         try:
-            properties['volume'] = shape.Volume()
+            if mass_props is None: raise mass_err
+            properties['volume'] = mass_props.Mass()
             log.debug(f"Calculated volume: {properties['volume']}")
         except Exception as vol_err:
             # Volume calculation can fail for non-solids (wires, faces, shells)
@@ -177,8 +412,12 @@ def get_shape_properties(shape_to_analyze: Any) -> Dict[str, Any]:
 
         # Center of Mass
         try:
-            com = shape.Center() # Use Center() which works for more types than CenterOfMass()
-            properties['center_of_mass'] = {'x': com.x, 'y': com.y, 'z': com.z}
+            if mass_props is not None:
+                com = mass_props.CentreOfMass() # Same point shape.Center() computes from this pass
+                properties['center_of_mass'] = {'x': com.X(), 'y': com.Y(), 'z': com.Z()}
+            else: # e.g. vertices, whose Center() is the point itself
+                com = shape.Center() # Use Center() which works for more types than CenterOfMass()
+                properties['center_of_mass'] = {'x': com.x, 'y': com.y, 'z': com.z}
             log.debug(f"Calculated center of mass: {properties['center_of_mass']}")
         except Exception as com_err:
             log.warning(f"Could not calculate center of mass: {com_err}", exc_info=True)
@@ -187,13 +426,31 @@ def get_shape_properties(shape_to_analyze: Any) -> Dict[str, Any]:
         # TODO: Add more properties as needed (e.g., inertia, specific checks)
 
         log.info("Finished calculating shape properties.")
-        return properties
+        _shape_analysis_cache.setdefault(shape, {})["properties"] = properties
+        return _copy_properties(properties)
 
     except Exception as e:
         error_msg = f"Core property calculation failed: {e}"
         log.error(error_msg, exc_info=True)
         raise Exception(error_msg) from e
 
+# Property batches (the get_shape_properties_batch tool) are spread over a process-wide thread
+# pool (created on first use). Set MCP_SERIAL_SHAPE_ANALYSIS=1 to run batches serially, e.g. when debugging.
+_shape_analysis_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+def _map_shapes(func: Any, shapes: List[Any]) -> List[Any]:
+    """Applies func to each shape, in the shape analysis pool unless disabled or trivial."""
+    global _shape_analysis_pool
+    if len(shapes) < 2 or os.environ.get("MCP_SERIAL_SHAPE_ANALYSIS") == "1":
+        return [func(shape) for shape in shapes]
+    if _shape_analysis_pool is None:
+        _shape_analysis_pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="shape-analysis")
+    return list(_shape_analysis_pool.map(func, shapes))
+
+def get_shape_properties_batch(shapes: List[Any]) -> List[Dict[str, Any]]:
+    """Calculates get_shape_properties for several shapes concurrently; results keep the input order."""
+    return _map_shapes(get_shape_properties, shapes)
+
 def get_shape_description(shape_to_describe: Any) -> str:
     """
     Generates a textual description of a CadQuery Shape or Workplane based on
@@ -209,20 +466,25 @@ def get_shape_description(shape_to_describe: Any) -> str:
         TypeError: If the object is not a cq.Shape or cq.Workplane.
         Exception: For errors during analysis.
     """
-    shape = shape_to_describe.val() if isinstance(shape_to_describe, cq.Workplane) else shape_to_describe
-    if not isinstance(shape, cq.Shape):
-        raise TypeError(f"Object to describe is not a cq.Shape or cq.Workplane, but {type(shape)}")
+    shape = _as_shape(shape_to_describe, "describe")
+
+    analysis = _shape_analysis_cache.get(shape)
+    if analysis and "description" in analysis: # Same geometry, so the same text; skip all formatting
+        log.info(f"Using cached description for shape of type {type(shape)}")
+        return analysis["description"]
 
     log.info(f"Generating description for shape of type {type(shape)}")
     description_parts = []
 
     try:
+        analysis = _shape_analysis_cache.setdefault(shape, {}) # Reused by repeat descriptions
         # 1. Identify Shape Type
-        shape_type = shape.ShapeType()
+        if "shape_type" not in analysis: analysis["shape_type"] = shape.ShapeType()
+        shape_type = analysis["shape_type"]
         description_parts.append(f"The object is a {shape_type}.")
 
         # 2. Get Properties (reuse existing function for consistency)
-        properties = get_shape_properties(shape) # Call the existing properties function
+        properties = _get_shape_properties_raw(shape) # Shape is already normalized (cached per shape)
 
         # 3. Add Bounding Box Info
         bb = properties.get('bounding_box')
@@ -267,9 +529,9 @@ def get_shape_description(shape_to_describe: Any) -> str:
 
         # 7. Add Counts (Faces, Edges, Vertices)
         try:
-            num_faces = len(shape.Faces())
-            num_edges = len(shape.Edges())
-            num_vertices = len(shape.Vertices())
+            if "num_faces" not in analysis:
+                analysis.update(num_faces=len(shape.Faces()), num_edges=len(shape.Edges()), num_vertices=len(shape.Vertices()))
+            num_faces, num_edges, num_vertices = analysis["num_faces"], analysis["num_edges"], analysis["num_vertices"]
             description_parts.append(f"It consists of {num_faces} faces, {num_edges} edges, and {num_vertices} vertices.")
         except Exception as count_err:
             log.warning(f"Could not count faces/edges/vertices: {count_err}")
@@ -278,7 +540,8 @@ def get_shape_description(shape_to_describe: Any) -> str:
         # TODO: Add more sophisticated analysis later if needed (e.g., feature recognition)
 
         log.info("Finished generating shape description.")
-        return " ".join(description_parts)
+        analysis["description"] = description = " ".join(description_parts)
+        return description
 
     except Exception as e:
         error_msg = f"Core description generation failed: {e}"
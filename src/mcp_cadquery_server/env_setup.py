@@ -1,21 +1,55 @@
+import asyncio
 import os
 import sys
 import subprocess
 import shutil
+import stat
 import logging
+import hashlib
+import json
+from collections import deque
 from typing import Optional
 
 # Constants for environment setup
 VENV_DIR = ".venv"
 PYTHON_VERSION = "3.11"
+COMMAND_OUTPUT_TAIL_LINES = 200 # Lines of command output kept for results/error reports
+# Hardlink packages from the uv cache instead of copying their files into the venv
+# (uv falls back to copying if the cache is on another filesystem). Bytecode is not
+# compiled at install time (uv's default); .pyc files are written on first import.
+UV_PIP_INSTALL_FLAGS = ["--link-mode=hardlink"]
+# Fixed command prefixes; "uv" is swapped for the cached absolute path when executed
+UV_VENV_CMD = ("uv", "venv")
+UV_PIP_INSTALL_CMD = ("uv", "pip", "install")
+# File in the venv recording a digest of everything the environment was prepared from.
+# When it matches, prepare_workspace_env returns without running uv at all (this also
+# holds across server restarts, unlike the in-process mtime cache).
+ENV_STAMP_FILE = ".mcp_env_stamp.json"
+ENV_STAMP_VERSION = "cadquery-base-v1" # Bump when the base install steps change
+ENV_PREP_CONCURRENCY = 4 # Max workspace environments prepared at once by prepare_workspace_envs
 
 # Cache for workspace requirements.txt modification times
 workspace_reqs_mtime_cache: dict[str, float] = {}
+# Absolute path of the uv executable, looked up on first use (PATH rarely changes while running)
+_uv_path: Optional[str] = None
+UV_NOT_FOUND_MSG = "Error: Python 'uv' is not installed or not in PATH. Please install it: https://github.com/astral-sh/uv"
+
+def _get_uv() -> str:
+    """Returns the absolute path of uv, walking PATH only until it has been found once."""
+    global _uv_path
+    if _uv_path is None:
+        _uv_path = shutil.which("uv") # A miss is not cached, so installing uv later is picked up
+        if _uv_path is None: raise FileNotFoundError(UV_NOT_FOUND_MSG)
+    return _uv_path
 
 def _run_command_helper(command: list[str], check: bool = True, log_prefix: str = "Setup", **kwargs) -> subprocess.CompletedProcess:
     """
-    Helper to run a command, capture output, and raise exceptions on failure.
+    Helper to run a command, stream its output to the log, and raise exceptions on failure.
     Uses logging.
+
+    Output (stderr merged into stdout) is logged line by line as it arrives instead of
+    being buffered until the command exits; only the last COMMAND_OUTPUT_TAIL_LINES
+    lines are kept and returned as the CompletedProcess stdout (or CalledProcessError output).
     """
     # Ensure basic logging is configured if needed
     if not logging.getLogger().hasHandlers():
@@ -24,17 +58,19 @@ def _run_command_helper(command: list[str], check: bool = True, log_prefix: str
     log_msg_prefix = f"[{log_prefix}]"
     logging.info(f"{log_msg_prefix} Running command: {' '.join(command)}")
     try:
-        process = subprocess.run(
-            command,
-            check=check,
-            capture_output=True,
-            text=True,
-            **kwargs
-        )
-        logging.debug(f"{log_msg_prefix} Command stdout:\n{process.stdout}")
-        if process.stderr:
-            logging.debug(f"{log_msg_prefix} Command stderr:\n{process.stderr}")
-        return process
+        # Commands are logged in their readable "uv ..." form but exec'd via the cached absolute path
+        exec_command = [_get_uv(), *command[1:]] if command[0] == "uv" else command
+        output_tail: deque = deque(maxlen=COMMAND_OUTPUT_TAIL_LINES)
+        with subprocess.Popen(exec_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **kwargs) as process:
+            for raw_line in process.stdout: # Bytes, read as the command produces them
+                line = raw_line.decode('utf-8', errors='replace').rstrip()
+                output_tail.append(line)
+                logging.info(f"{log_msg_prefix} {line}")
+            returncode = process.wait()
+        output = "\n".join(output_tail)
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command, output=output)
+        return subprocess.CompletedProcess(command, returncode, stdout=output, stderr="")
     except FileNotFoundError as e:
         logging.error(f"{log_msg_prefix} Error: Command '{command[0]}' not found. Is it installed and in PATH?")
         raise e
@@ -50,6 +86,44 @@ def _run_command_helper(command: list[str], check: bool = True, log_prefix: str
         logging.error(f"{log_msg_prefix} An unexpected error occurred running command: {e}")
         raise e
 
+def _safe_stat(path: str) -> Optional[os.stat_result]:
+    """os.stat that returns None instead of raising; one syscall answers exists/isdir/isfile/mtime."""
+    try: return os.stat(path)
+    except OSError: return None
+
+def _env_stamp_digest(venv_dir: str, requirements_file: str) -> str:
+    """Digest of the base install version, Python version, requirements.txt content and venv identity."""
+    digest = hashlib.sha256(f"{ENV_STAMP_VERSION}\0{PYTHON_VERSION}\0{' '.join(UV_PIP_INSTALL_FLAGS)}\0".encode())
+    try:
+        with open(requirements_file, 'rb') as f: digest.update(f.read())
+    except FileNotFoundError: digest.update(b"\0no-requirements")
+    # pyvenv.cfg is rewritten when the venv is recreated, so a new venv never matches an old stamp
+    try: digest.update(repr(os.path.getmtime(os.path.join(venv_dir, "pyvenv.cfg"))).encode())
+    except OSError: digest.update(b"\0no-pyvenv-cfg")
+    return digest.hexdigest()
+
+def _read_env_stamp(venv_dir: str) -> Optional[str]:
+    """Returns the digest stored in the venv's stamp file, or None."""
+    try:
+        with open(os.path.join(venv_dir, ENV_STAMP_FILE), 'r', encoding='utf-8') as f: return json.load(f).get("digest")
+    except (OSError, ValueError, AttributeError): return None
+
+def workspace_env_version(workspace_path: str) -> Optional[int]:
+    """
+    Identifies the current install state of a workspace venv: the env stamp's mtime, which
+    changes whenever prepare_workspace_env actually (re)installs something. None if unstamped.
+    """
+    stamp_st = _safe_stat(os.path.join(workspace_path, VENV_DIR, ENV_STAMP_FILE))
+    return stamp_st.st_mtime_ns if stamp_st is not None else None
+
+def _write_env_stamp(venv_dir: str, digest: str) -> None:
+    """Atomically records the digest of a successfully prepared environment (best effort)."""
+    stamp_path = os.path.join(venv_dir, ENV_STAMP_FILE)
+    try:
+        with open(stamp_path + ".tmp", 'w', encoding='utf-8') as f: json.dump({"digest": digest}, f)
+        os.replace(stamp_path + ".tmp", stamp_path)
+    except OSError as e: logging.warning(f"Could not write environment stamp {stamp_path}: {e}")
+
 def prepare_workspace_env(workspace_path: str) -> str:
     """
     Ensures a virtual environment exists in the workspace, creates it if not,
@@ -68,77 +142,122 @@ def prepare_workspace_env(workspace_path: str) -> str:
     log_prefix = f"WorkspaceEnv({os.path.basename(workspace_path)})"
     logging.info(f"[{log_prefix}] Ensuring environment for workspace: {workspace_path}")
 
-    if not os.path.isdir(workspace_path):
+    workspace_st = _safe_stat(workspace_path)
+    if workspace_st is None or not stat.S_ISDIR(workspace_st.st_mode):
         msg = f"Workspace path does not exist or is not a directory: {workspace_path}"
         logging.error(f"[{log_prefix}] {msg}")
         raise FileNotFoundError(msg)
 
-    # 1. Check for uv
-    if not shutil.which("uv"):
-        msg = "Error: Python 'uv' is not installed or not in PATH. Please install it: https://github.com/astral-sh/uv"
-        logging.error(f"[{log_prefix}] {msg}")
-        raise FileNotFoundError(msg)
-
-    # 2. Define paths
+    # 1. Define paths
     venv_dir = os.path.join(workspace_path, VENV_DIR)
     requirements_file = os.path.join(workspace_path, "requirements.txt")
     bin_subdir = "Scripts" if sys.platform == "win32" else "bin"
     python_exe = os.path.join(venv_dir, bin_subdir, "python.exe" if sys.platform == "win32" else "python")
 
+    # 2. Nothing to do if the environment was already prepared from the same inputs
+    env_digest = _env_stamp_digest(venv_dir, requirements_file)
+    python_st = _safe_stat(python_exe)
+    if python_st is not None and _read_env_stamp(venv_dir) == env_digest:
+        logging.info(f"[{log_prefix}] Environment stamp matches, skipping uv. Python: {python_exe}")
+        return python_exe
+
+    # Check for uv
+    try: _get_uv()
+    except FileNotFoundError:
+        logging.error(f"[{log_prefix}] {UV_NOT_FOUND_MSG}")
+        raise
+
     try:
         # 3. Create venv if needed
-        if not os.path.isdir(venv_dir) or not os.path.exists(python_exe):
+        # python_exe lives inside venv_dir, so its stat (taken above) also proves the venv dir exists
+        if python_st is None:
             logging.info(f"[{log_prefix}] Creating virtual environment in {venv_dir} using Python {PYTHON_VERSION}...")
-            _run_command_helper(["uv", "venv", venv_dir, "-p", PYTHON_VERSION], log_prefix=log_prefix)
+            _run_command_helper([*UV_VENV_CMD, venv_dir, "-p", PYTHON_VERSION], log_prefix=log_prefix)
             logging.info(f"[{log_prefix}] Virtual environment created.")
+            python_st = _safe_stat(python_exe)
         else:
             logging.info(f"[{log_prefix}] Virtual environment already exists: {venv_dir}")
 
-        if not os.path.exists(python_exe):
+        if python_st is None:
             msg = f"Python executable still not found at {python_exe} after check/creation."
             logging.error(f"[{log_prefix}] {msg}")
             raise RuntimeError(msg)
 
-        # 4. Install base cadquery
-        logging.info(f"[{log_prefix}] Ensuring base 'cadquery' package is installed in {venv_dir}...")
-        _run_command_helper(["uv", "pip", "install", "cadquery", "--python", python_exe], log_prefix=log_prefix)
-        logging.info(f"[{log_prefix}] Base 'cadquery' installed/verified.")
-
-        # 5. Handle workspace requirements.txt
+        # 4. Check whether workspace requirements.txt needs (re)installing
         install_reqs = False
         current_mtime: Optional[float] = None
-        if os.path.isfile(requirements_file):
-            try:
-                current_mtime = os.path.getmtime(requirements_file)
-                cached_mtime = workspace_reqs_mtime_cache.get(workspace_path)
-                if current_mtime != cached_mtime:
-                    install_reqs = True
-                    logging.info(f"[{log_prefix}] requirements.txt changed (Current: {current_mtime}, Cached: {cached_mtime}). Will install.")
-                else:
-                    logging.info(f"[{log_prefix}] requirements.txt unchanged (mtime: {current_mtime}). Skipping install.")
-            except OSError as mtime_err:
-                logging.warning(f"[{log_prefix}] Could not get mtime for {requirements_file}: {mtime_err}. Assuming install needed.")
+        requirements_st = _safe_stat(requirements_file)
+        if requirements_st is not None and stat.S_ISREG(requirements_st.st_mode):
+            current_mtime = requirements_st.st_mtime
+            cached_mtime = workspace_reqs_mtime_cache.get(workspace_path)
+            if current_mtime != cached_mtime:
                 install_reqs = True
+                logging.info(f"[{log_prefix}] requirements.txt changed (Current: {current_mtime}, Cached: {cached_mtime}). Will install.")
+            else:
+                logging.info(f"[{log_prefix}] requirements.txt unchanged (mtime: {current_mtime}). Skipping install.")
         else:
             if workspace_path in workspace_reqs_mtime_cache:
                 del workspace_reqs_mtime_cache[workspace_path]
             logging.info(f"[{log_prefix}] No requirements.txt found in workspace. Skipping additional dependencies.")
 
+        # 5. Install base cadquery, together with requirements.txt when it changed, so uv
+        # resolves the whole set in one pass instead of two separate installs
         if install_reqs:
-            logging.info(f"[{log_prefix}] Installing/syncing additional dependencies from {requirements_file} into {venv_dir}...")
+            logging.info(f"[{log_prefix}] Installing 'cadquery' and dependencies from {requirements_file} into {venv_dir}...")
             try:
-                _run_command_helper(["uv", "pip", "install", "-r", requirements_file, "--python", python_exe], log_prefix=log_prefix)
+                _run_command_helper([*UV_PIP_INSTALL_CMD, "cadquery", "-r", requirements_file, "--python", python_exe, *UV_PIP_INSTALL_FLAGS], log_prefix=log_prefix)
                 workspace_reqs_mtime_cache[workspace_path] = current_mtime
-                logging.info(f"[{log_prefix}] Additional dependencies installed/synced. Updated mtime cache to {current_mtime}.")
+                logging.info(f"[{log_prefix}] 'cadquery' and additional dependencies installed/synced. Updated mtime cache to {current_mtime}.")
             except Exception as install_err:
                 if workspace_path in workspace_reqs_mtime_cache:
                     del workspace_reqs_mtime_cache[workspace_path]
                 logging.error(f"[{log_prefix}] Failed to install dependencies from {requirements_file}. Error: {install_err}")
                 raise RuntimeError(f"Failed to install dependencies from {requirements_file}") from install_err
+        else:
+            logging.info(f"[{log_prefix}] Ensuring base 'cadquery' package is installed in {venv_dir}...")
+            _run_command_helper([*UV_PIP_INSTALL_CMD, "cadquery", "--python", python_exe, *UV_PIP_INSTALL_FLAGS], log_prefix=log_prefix)
+            logging.info(f"[{log_prefix}] Base 'cadquery' installed/verified.")
 
+        # Recomputed: creating the venv wrote pyvenv.cfg
+        _write_env_stamp(venv_dir, _env_stamp_digest(venv_dir, requirements_file))
         logging.info(f"[{log_prefix}] Environment preparation complete.")
         return python_exe
 
     except (FileNotFoundError, subprocess.CalledProcessError, Exception) as e:
         logging.error(f"[{log_prefix}] Failed to set up workspace environment: {e}")
-        raise RuntimeError(f"Failed to set up workspace environment for {workspace_path}: {e}") from e
\ No newline at end of file
+        raise RuntimeError(f"Failed to set up workspace environment for {workspace_path}: {e}") from e
+
+async def prepare_workspace_env_async(workspace_path: str) -> str:
+    """
+    Async variant of prepare_workspace_env. The preparation runs on a worker thread,
+    so the event loop stays free while uv runs.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, prepare_workspace_env, workspace_path)
+
+async def prepare_workspace_envs(workspace_paths: list[str], max_concurrency: int = ENV_PREP_CONCURRENCY) -> list[str]:
+    """
+    Prepares several workspace environments concurrently.
+
+    uv does its work in a child process, so preparing N workspaces takes roughly as long
+    as the slowest one rather than the sum. The semaphore bounds how many uv processes
+    run at once. Each distinct path is prepared once, even if listed more than once.
+
+    Args:
+        workspace_paths: Absolute paths to the workspace directories.
+        max_concurrency: Maximum number of environments prepared at the same time.
+
+    Returns:
+        The venv Python executable for each path, in the same order as workspace_paths.
+
+    Raises:
+        The first error raised by prepare_workspace_env (FileNotFoundError or RuntimeError).
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _prepare_one(workspace_path: str) -> str:
+        async with semaphore: return await prepare_workspace_env_async(workspace_path)
+
+    unique_paths = list(dict.fromkeys(workspace_paths))
+    python_exes = dict(zip(unique_paths, await asyncio.gather(*(_prepare_one(p) for p in unique_paths))))
+    return [python_exes[p] for p in workspace_paths]
@@ -2,33 +2,58 @@
 
 # Import necessary modules
 import os
+import logging
 import sys
-import json
+import asyncio
 import uuid
 import subprocess
-import ast
+import time
 import re # Added for scan_part_library
-from typing import List, Dict, Any, Optional
-
-import cadquery as cq
-from cadquery import cqgi
-
-from src.mcp_cadquery_server.env_setup import prepare_workspace_env, _run_command_helper
+import shutil
+import hashlib
+import multiprocessing
+import functools
+import heapq
+import threading
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from types import MappingProxyType
+from collections import OrderedDict
+from operator import itemgetter
+from pathlib import PurePath
+from typing import List, Dict, Any, Optional, Tuple, Set, Callable
+
+from src.mcp_cadquery_server.env_setup import prepare_workspace_env, workspace_env_version, workspace_reqs_mtime_cache, _run_command_helper, UV_PIP_INSTALL_CMD, UV_PIP_INSTALL_FLAGS
 from src.mcp_cadquery_server.core import (
     export_shape_to_file,
     export_shape_to_svg_file,
+    render_brep_to_svg_bytes,
+    build_script_brep_bytes,
+    ensure_dir,
+    extract_module_docstring,
     parse_docstring_metadata,
+    _substitute_parameters,
     get_shape_properties as core_get_shape_properties,
+    get_shape_properties_batch as core_get_shape_properties_batch,
     get_shape_description as core_get_shape_description,
 )
 
 from src.mcp_cadquery_server.models import ExecuteCadqueryScriptArgs
+from src.mcp_cadquery_server.runner_pool import workspace_runner, close_workspace_runners, MAX_WORKSPACE_RUNNERS
+from src.mcp_cadquery_server.serialization import dumps_bytes, loads
 
 # Import shared state and config
 from .state import (
     log,
     shape_results,
     part_index,
+    part_token_index,
+    part_tokens,
+    part_search_fields,
+    part_search_sources,
+    svg_preview_cache,
+    svg_preview_keys,
+    part_content_cache,
     _PROJECT_ROOT, # Use project root for finding script_runner
     DEFAULT_PART_LIBRARY_DIR,
     DEFAULT_OUTPUT_DIR_NAME,
@@ -37,18 +62,120 @@ from .state import (
     ACTIVE_PART_LIBRARY_DIR, # Use active config paths
     ACTIVE_OUTPUT_DIR_PATH,
     ACTIVE_RENDER_DIR_PATH,
-    ACTIVE_PART_PREVIEW_DIR_PATH
+    ACTIVE_PART_PREVIEW_DIR_PATH,
 )
+from . import state # For settings the CLI assigns after this module is imported (read at call time)
+
+# SVG export defaults, merged with the caller's options on each export (read-only; never mutate)
+_DEFAULT_SVG_OPTS = MappingProxyType({"width": 400, "height": 300, "marginLeft": 10, "marginTop": 10, "showAxes": False, "projectionDir": (0.5, 0.5, 0.5), "strokeWidth": 0.25, "strokeColor": (0, 0, 0), "hiddenColor": (0, 0, 255, 100), "showHidden": False})
+# SVG options for part library previews
+_DEFAULT_PREVIEW_SVG_OPTS = MappingProxyType({"width": 150, "height": 100, "showAxes": False})
+
+@functools.lru_cache(maxsize=128)
+def _abspath(path: str) -> str:
+    """os.path.abspath memoized per argument (the server never changes its cwd)."""
+    return os.path.abspath(path)
+
+def _resolve_workspace(workspace_path_arg: str) -> str:
+    """
+    Returns the absolute workspace path, raising ValueError if it is not a directory.
+    Only the path normalization is cached; the directory is checked on every call so a
+    workspace removed between requests is still reported.
+    """
+    workspace_path = _abspath(workspace_path_arg)
+    if not os.path.isdir(workspace_path): raise ValueError(f"Invalid workspace path: {workspace_path}")
+    return workspace_path
+
+@functools.lru_cache(maxsize=8)
+def _static_root(static_dir: str) -> PurePath:
+    """Absolute static dir as a PurePath, computed once per configured dir."""
+    return PurePath(os.path.abspath(static_dir))
+
+# Matches this platform's path separators: os.sep and os.altsep ('/' on POSIX, '\\' and '/' on Windows)
+_PATH_SEP_RE = re.compile("[" + re.escape(os.sep + (os.altsep or "")) + "]")
+
+@functools.lru_cache(maxsize=16)
+def _import_brep_cached(path: str, mtime_ns: int, size: int):
+    import cadquery as cq # Imported on first use, see core.py
+    return cq.importers.importBrep(path)
+
+def _import_brep(path: str):
+    """
+    Imports an intermediate BREP file, reusing the shape from an earlier import of the same
+    file. Keyed on (path, mtime_ns, size), so a rewritten file is parsed again. Callers only
+    read or export the returned shape and must not modify it.
+    """
+    st = os.stat(path)
+    return _import_brep_cached(path, st.st_mtime_ns, st.st_size)
+
+def _to_static_url(path: str) -> Optional[str]:
+    """
+    Returns the URL ("/sub/dir/file") under which the static dir serves path, or None
+    if static serving is off or path is outside the static dir.
+    """
+    if not state.ACTIVE_STATIC_DIR: return None
+    try: return "/" + PurePath(os.path.abspath(path)).relative_to(_static_root(state.ACTIVE_STATIC_DIR)).as_posix()
+    except ValueError: return None # Outside the static dir (or on another drive on Windows)
+
+def _decode_output(output: Any) -> str:
+    """Decodes captured subprocess output for logging (undecodable bytes are replaced)."""
+    if isinstance(output, bytes): return output.decode('utf-8', 'replace')
+    return output or ""
+
+def _run_script_runner(workspace_python_exe: str, script_runner_path: str, workspace_path: str, runner_input: dict, log_prefix: str, sub_env: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Runs one script_runner request in the workspace venv and returns its result dict.
 
-def handle_execute_cadquery_script(args: ExecuteCadqueryScriptArgs, request_id: str = "unknown") -> dict:
+    By default the request goes to the workspace's persistent runner process, which keeps
+    CadQuery imported between executions; concurrent callers each get their own runner
+    process. MCP_ONESHOT_SCRIPT_RUNNER=1 starts a fresh runner subprocess per request instead,
+    with sub_env as its environment (callers running many requests build it once).
+    """
+    if os.environ.get("MCP_ONESHOT_SCRIPT_RUNNER") != "1":
+        with workspace_runner(workspace_path, workspace_python_exe, script_runner_path, workspace_env_version(workspace_path)) as runner:
+            log.info("[%s] Sending request to persistent script runner for %s", log_prefix, workspace_python_exe)
+            return runner.run(runner_input)
+
+    cmd = [workspace_python_exe, script_runner_path]
+    log.info("[%s] Running script runner: %s %s", log_prefix, workspace_python_exe, script_runner_path)
+
+    if sub_env is None: sub_env = {**os.environ, "COVERAGE_RUN_SUBPROCESS": "1"}
+
+    # Pipes stay binary: the JSON reply is parsed straight from the bytes without a
+    # separate decode to str, and only stderr (small) is decoded, for logging
+    process = subprocess.run(
+        cmd,
+        input=dumps_bytes(runner_input),
+        capture_output=True,
+        check=False,
+        env=sub_env,
+        cwd=workspace_path
+    )
+
+    # stdout can be large; only decoded and formatted when DEBUG is on
+    if log.isEnabledFor(logging.DEBUG): log.debug("[%s] Runner stdout:\n%s", log_prefix, _decode_output(process.stdout))
+    stderr = _decode_output(process.stderr)
+    if stderr:
+        log.warning("[%s] Runner stderr:\n%s", log_prefix, stderr)
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Script runner failed with exit code {process.returncode}. Stderr: {stderr}")
+
+    return loads(process.stdout)
+
+def handle_execute_cadquery_script(request: dict, progress: Optional[Callable[[dict], None]] = None) -> dict:
     """
     Handles the 'execute_cadquery_script' tool request.
     Ensures workspace environment exists and executes the script
     within that environment using a subprocess runner.
+    If a progress callback is given, each parameter set's summary is reported
+    through it as soon as that set completes.
     """
-    log.info(f"Handling execute_cadquery_script request (ID: {request_id})")
+    request_id = request.get("request_id", "unknown")
+    log.info("Handling execute_cadquery_script request (ID: %s)", request_id)
     try:
-        workspace_path = os.path.abspath(args.workspace_path)
+        args = ExecuteCadqueryScriptArgs(**request.get("arguments", {}))
+        workspace_path = _abspath(args.workspace_path)
         script_content = args.script
 
         # Determine parameter sets
@@ -59,9 +186,9 @@ def handle_execute_cadquery_script(args: ExecuteCadqueryScriptArgs, request_id:
         else:
             parameter_sets = [{}]
 
-        log.info(f"Target workspace: {workspace_path}")
-        log.info(f"Script content received (first 100 chars): {script_content[:100]}...")
-        log.info(f"Processing {len(parameter_sets)} parameter set(s).")
+        log.info("Target workspace: %s", workspace_path)
+        if log.isEnabledFor(logging.INFO): log.info("Script content received (first 100 chars): %s...", script_content[:100])
+        log.info("Processing %d parameter set(s).", len(parameter_sets))
 
         # Ensure the workspace environment is ready
         workspace_python_exe = prepare_workspace_env(workspace_path)
@@ -71,67 +198,56 @@ def handle_execute_cadquery_script(args: ExecuteCadqueryScriptArgs, request_id:
         if not os.path.exists(script_runner_path):
             raise RuntimeError(f"Script runner not found at {script_runner_path}")
 
-        results_summary = []
+        # Parameter sets are independent runner requests, so up to one per CPU run at once.
+        # Each concurrent set gets its own persistent runner process; capped at the runner pool
+        # size so one request never needs more runners than the pool keeps.
+        max_workers = min(len(parameter_sets), os.cpu_count() or 1, MAX_WORKSPACE_RUNNERS)
+        runner_env = {**os.environ, "COVERAGE_RUN_SUBPROCESS": "1"} # Shared by every one-shot runner of this request
 
-        for i, params in enumerate(parameter_sets):
+        def run_parameter_set(i: int, params: dict) -> dict:
             result_id = f"{request_id}_{i}"
             log_prefix = f"Exec({os.path.basename(workspace_path)}/{result_id})"
-            log.info(f"[{log_prefix}] Preparing execution for parameter set {i} with params: {params}")
+            log.info("[%s] Preparing execution for parameter set %d with params: %s", log_prefix, i, params)
 
             try:
-                runner_input_data = json.dumps({
+                # Substitute '# PARAM' values here; the runner executes the script as given
+                runner_input = {
                     "workspace_path": workspace_path,
-                    "script_content": script_content,
+                    "script_content": _substitute_parameters(script_content, params),
                     "parameters": params,
                     "result_id": result_id
-                })
-
-                cmd = [workspace_python_exe, script_runner_path]
-                log.info(f"[{log_prefix}] Running script runner: {' '.join(cmd)}")
-
-                sub_env = os.environ.copy()
-                sub_env["COVERAGE_RUN_SUBPROCESS"] = "1"
-
-                process = subprocess.run(
-                    cmd,
-                    input=runner_input_data,
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    encoding='utf-8',
-                    env=sub_env,
-                    cwd=workspace_path
-                )
-
-                log.debug(f"[{log_prefix}] Runner stdout:\n{process.stdout}")
-                if process.stderr:
-                    log.warning(f"[{log_prefix}] Runner stderr:\n{process.stderr}")
-
-                if process.returncode != 0:
-                    raise RuntimeError(f"Script runner failed with exit code {process.returncode}. Stderr: {process.stderr}")
-
-                runner_result = json.loads(process.stdout)
+                }
+                runner_result = _run_script_runner(workspace_python_exe, script_runner_path, workspace_path, runner_input, log_prefix, runner_env)
 
                 shape_results[result_id] = runner_result
 
-                results_summary.append({
+                set_summary = {
                     "result_id": result_id,
                     "success": runner_result.get("success", False),
                     "shapes_count": len(runner_result.get("results", [])),
                     "error": runner_result.get("exception_str")
-                })
-                log.info(f"[{log_prefix}] Stored execution result for set {i}. Success: {runner_result.get('success', False)}")
+                }
+                log.info("[%s] Stored execution result for set %d. Success: %s", log_prefix, i, runner_result.get('success', False))
 
             except Exception as exec_err:
-                log.error(f"[{log_prefix}] Subprocess execution/processing failed for parameter set {i}: {exec_err}", exc_info=True)
-                results_summary.append({
+                log.error("[%s] Subprocess execution/processing failed for parameter set %d: %s", log_prefix, i, exec_err, exc_info=True)
+                set_summary = {
                     "result_id": result_id,
                     "success": False,
                     "shapes_count": 0,
                     "error": f"Handler error during execution: {exec_err}"
-                })
-                if result_id in shape_results:
-                    del shape_results[result_id]
+                }
+                shape_results.pop(result_id, None)
+
+            if progress: progress(set_summary) # Stream this set's outcome as soon as it completes
+            return set_summary
+
+        if max_workers == 1:
+            results_summary = [run_parameter_set(i, params) for i, params in enumerate(parameter_sets)]
+        else:
+            # map() keeps results_summary in parameter set order; progress follows completion order
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="param-set") as executor:
+                results_summary = list(executor.map(run_parameter_set, range(len(parameter_sets)), parameter_sets))
 
         total_sets = len(parameter_sets)
         successful_sets = sum(1 for r in results_summary if r["success"])
@@ -166,36 +282,14 @@ def handle_export_shape(request: dict) -> dict:
         if not isinstance(shape_index, int) or shape_index < 0: raise ValueError("'shape_index' must be a non-negative integer.")
         if not isinstance(export_options, dict): raise ValueError("'options' argument must be a dictionary.")
 
-        workspace_path = os.path.abspath(workspace_path_arg)
-        if not os.path.isdir(workspace_path): raise ValueError(f"Invalid workspace path: {workspace_path}")
-
-        # Retrieve result dict from main process state
-        result_dict = shape_results.get(result_id)
-        if not result_dict: raise ValueError(f"Result ID '{result_id}' not found.")
-        if not result_dict.get("success"): raise ValueError(f"Result ID '{result_id}' corresponds to a failed build.")
-
-        results_list = result_dict.get("results", [])
-        if not results_list or shape_index >= len(results_list): raise ValueError(f"Invalid shape_index {shape_index} for result ID '{result_id}'.")
-
-        # Get the intermediate path from the stored result data
-        shape_data = results_list[shape_index]
-        intermediate_path = shape_data.get("intermediate_path")
-        if not intermediate_path or not os.path.exists(intermediate_path):
-             raise ValueError(f"Intermediate file path not found or file missing for shape {shape_index} in result ID '{result_id}'. Path: {intermediate_path}")
-
-        # Import the shape from the intermediate BREP file
-        log.info(f"Importing shape from intermediate file: {intermediate_path}")
-        try:
-            # Ensure CadQuery is available in the main server env for import/export ops
-            shape_to_export = cq.importers.importBrep(intermediate_path)
-            log.info(f"Successfully imported shape for export.")
-        except Exception as import_err:
-            log.error(f"Failed to import BREP file '{intermediate_path}': {import_err}", exc_info=True)
-            raise RuntimeError(f"Failed to import intermediate shape file: {import_err}") from import_err
+        workspace_path = _resolve_workspace(workspace_path_arg)
+
+        # Repeated exports of the same result reuse the parsed shape, see _import_brep
+        shape_to_export = _resolve_shape(result_id, shape_index)
 
         # Determine final output path, resolving relative paths against the WORKSPACE
         output_path: str
-        if os.path.isabs(filename_arg) or os.path.sep in filename_arg or (os.altsep and os.altsep in filename_arg):
+        if os.path.isabs(filename_arg) or _PATH_SEP_RE.search(filename_arg):
             # If filename is absolute or contains a directory path, use it directly (but ensure it's absolute)
             output_path = os.path.abspath(filename_arg)
             log.info(f"Using provided absolute/relative path for export: '{output_path}'")
@@ -206,9 +300,7 @@ def handle_export_shape(request: dict) -> dict:
             log.info(f"Using workspace default output directory '{output_dir_name}'. Exporting to: '{output_path}'")
 
         # Ensure the target directory exists
-        output_dir = os.path.dirname(output_path)
-        if output_dir:
-             os.makedirs(output_dir, exist_ok=True)
+        ensure_dir(os.path.dirname(output_path))
 
         log.info(f"Attempting to export shape to '{output_path}' (Format: {export_format or 'Infer'}, Options: {export_options})")
         # Call the core export function with the imported shape and calculated absolute path
@@ -238,36 +330,14 @@ def handle_export_shape_to_svg(request: dict) -> dict:
         if not isinstance(shape_index, int) or shape_index < 0: raise ValueError("'shape_index' must be a non-negative integer.")
         if not isinstance(export_options, dict): raise ValueError("'options' argument must be a dictionary.")
 
-        workspace_path = os.path.abspath(workspace_path_arg)
-        if not os.path.isdir(workspace_path): raise ValueError(f"Invalid workspace path: {workspace_path}")
-
-        # Retrieve result dict
-        result_dict = shape_results.get(result_id)
-        if not result_dict: raise ValueError(f"Result ID '{result_id}' not found.")
-        if not result_dict.get("success"): raise ValueError(f"Result ID '{result_id}' corresponds to a failed build.")
+        workspace_path = _resolve_workspace(workspace_path_arg)
 
-        results_list = result_dict.get("results", [])
-        if not results_list or shape_index >= len(results_list): raise ValueError(f"Invalid shape_index {shape_index} for result ID '{result_id}'.")
-
-        # Get intermediate path
-        shape_data = results_list[shape_index]
-        intermediate_path = shape_data.get("intermediate_path")
-        if not intermediate_path or not os.path.exists(intermediate_path):
-             raise ValueError(f"Intermediate file path not found or file missing for shape {shape_index} in result ID '{result_id}'. Path: {intermediate_path}")
-
-        # Import shape
-        log.info(f"Importing shape from intermediate file: {intermediate_path}")
-        try:
-            shape_to_render = cq.importers.importBrep(intermediate_path)
-            log.info(f"Successfully imported shape for SVG export.")
-        except Exception as import_err:
-            log.error(f"Failed to import BREP file '{intermediate_path}': {import_err}", exc_info=True)
-            raise RuntimeError(f"Failed to import intermediate shape file: {import_err}") from import_err
+        shape_to_render = _resolve_shape(result_id, shape_index)
 
         # Determine output path within the workspace's render directory
         render_dir_name = DEFAULT_RENDER_DIR_NAME # Use default from state
         render_dir_path = os.path.join(workspace_path, DEFAULT_OUTPUT_DIR_NAME, render_dir_name)
-        os.makedirs(render_dir_path, exist_ok=True)
+        ensure_dir(render_dir_path)
 
         default_svg_name = f"render_{uuid.uuid4()}.svg"
         base_filename = os.path.basename(filename_arg or default_svg_name)
@@ -277,23 +347,16 @@ def handle_export_shape_to_svg(request: dict) -> dict:
 
         output_path = os.path.join(render_dir_path, base_filename)
         # Generate a relative URL if static serving is enabled, otherwise just return path
-        output_url_or_path = output_path # Default to path
-        if ACTIVE_STATIC_DIR: # Check if static serving is active
-            # Construct URL relative to static dir root
-            try:
-                rel_path = os.path.relpath(output_path, ACTIVE_STATIC_DIR)
-                if not rel_path.startswith(".."): # Ensure it's within static dir
-                    output_url_or_path = "/" + rel_path.replace(os.sep, "/")
-                    log.info(f"Generated relative URL for SVG: {output_url_or_path}")
-                else:
-                    log.warning(f"SVG output path '{output_path}' is outside static dir '{ACTIVE_STATIC_DIR}'. Returning absolute path.")
-            except ValueError: # Handle case where paths are on different drives (Windows)
-                 log.warning(f"Could not determine relative path for SVG from '{output_path}' to '{ACTIVE_STATIC_DIR}'. Returning absolute path.")
+        output_url_or_path = _to_static_url(output_path)
+        if output_url_or_path:
+            log.info(f"Generated relative URL for SVG: {output_url_or_path}")
+        else:
+            if state.ACTIVE_STATIC_DIR: log.warning(f"SVG output path '{output_path}' is outside static dir '{state.ACTIVE_STATIC_DIR}'. Returning absolute path.")
+            output_url_or_path = output_path # Default to path
 
 
         # Default SVG options (can be overridden)
-        svg_opts = {"width": 400, "height": 300, "marginLeft": 10, "marginTop": 10, "showAxes": False, "projectionDir": (0.5, 0.5, 0.5), "strokeWidth": 0.25, "strokeColor": (0, 0, 0), "hiddenColor": (0, 0, 255, 100), "showHidden": False}
-        svg_opts.update(export_options)
+        svg_opts = {**_DEFAULT_SVG_OPTS, **export_options}
 
         # Call core SVG export function
         export_shape_to_svg_file(shape_to_render, output_path, svg_opts)
@@ -301,12 +364,295 @@ def handle_export_shape_to_svg(request: dict) -> dict:
         return {"success": True, "message": f"Shape successfully exported to SVG: {output_url_or_path}.", "filename": output_url_or_path}
     except Exception as e: error_msg = f"Error during SVG export handling: {e}"; log.error(error_msg, exc_info=True); raise Exception(error_msg)
 
-def handle_scan_part_library(request: dict) -> dict:
+# (part_index.version, results) for the "list all parts" search. Results are cached as tuples
+# and every response gets its own list, so callers may modify what they receive
+_all_parts_cache: Optional[Tuple[int, Tuple[Dict[str, Any], ...]]] = None
+# Results of recent non-empty queries (normalized query -> result tuple) for _search_cache_version;
+# emptied as soon as part_index changes (any mutation bumps part_index.version)
+SEARCH_CACHE_SIZE = 512
+_search_cache: "OrderedDict[str, Tuple[Dict[str, Any], ...]]" = OrderedDict()
+_search_cache_version = -1
+_score_key = itemgetter("score") # Sort key for scored search results (no Python frame per comparison)
+
+# Search tokens are lowercase alphanumeric runs
+_SEARCH_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def _part_search_fields(part_id: str, part_data: Dict[str, Any]) -> Tuple[str, str, str, str, str]:
+    """
+    Returns the lowercased (id, part, description, filename, tags) fields scored by handle_search_parts.
+    Tags are joined with newlines, which never occur in a search term (terms come from str.split()),
+    so a term is a substring of the joined tags exactly when it is a substring of one tag.
+    """
+    metadata = part_data.get("metadata", {})
+    tags = metadata.get("tags", [])
+    return (
+        part_id.lower(),
+        str(metadata.get("part", "")).lower(),
+        str(metadata.get("description", "")).lower(),
+        str(metadata.get("filename", "")).lower(),
+        "\n".join(str(tag).lower() for tag in tags) if isinstance(tags, list) else "",
+    )
+
+def _index_part_for_search(part_id: str, part_data: Dict[str, Any]) -> None:
+    """Precomputes a part's search fields and registers its tokens in the inverted token index."""
+    _unindex_part_for_search(part_id)
+    fields = _part_search_fields(part_id, part_data)
+    part_search_fields[part_id] = fields
+    part_search_sources[part_id] = part_data
+    tokens = set(_SEARCH_TOKEN_RE.findall(" ".join(fields)))
+    part_tokens[part_id] = tokens
+    for token in tokens:
+        part_token_index.setdefault(token, set()).add(part_id)
+
+def _unindex_part_for_search(part_id: str) -> None:
+    """Removes a part from the search structures."""
+    part_search_fields.pop(part_id, None)
+    part_search_sources.pop(part_id, None)
+    for token in part_tokens.pop(part_id, ()):
+        part_ids = part_token_index.get(token)
+        if part_ids is not None:
+            part_ids.discard(part_id)
+            if not part_ids: del part_token_index[token]
+
+# Position of each part ID in part_index (insertion order), for ordering tied search scores, and
+# the part IDs whose tokens contain a given alphanumeric run. Both are rebuilt for each part_index version
+_part_order: Dict[str, int] = {}
+_run_candidates_cache: Dict[str, Set[str]] = {}
+
+def _sync_search_index() -> None:
+    """
+    Brings the search structures up to date with part_index, however it was changed.
+    The scan indexes parts itself, so after a scan this finds nothing to do; parts added,
+    replaced or removed directly in part_index are (re)indexed or dropped here. Called
+    once per part_index version, so the O(N) pass is not paid per query.
+    """
+    for part_id in [part_id for part_id in part_search_sources if part_id not in part_index]:
+        _unindex_part_for_search(part_id)
+    for part_id, part_data in part_index.items():
+        if part_search_sources.get(part_id) is not part_data: _index_part_for_search(part_id, part_data)
+    _part_order.clear(); _part_order.update((part_id, position) for position, part_id in enumerate(part_index))
+    _run_candidates_cache.clear()
+
+def _run_candidates(run: str) -> Set[str]:
+    """Returns the IDs of parts with a token containing run (memoized until part_index changes)."""
+    run_candidates = _run_candidates_cache.get(run)
+    if run_candidates is None:
+        run_candidates = set()
+        for token, part_ids in part_token_index.items():
+            if run in token: run_candidates |= part_ids
+        _run_candidates_cache[run] = run_candidates
+    return run_candidates
+
+def _search_candidates(search_terms: Set[str]) -> Optional[Set[str]]:
+    """
+    Returns the IDs of parts that can possibly match any of the search terms,
+    or None if the terms cannot be narrowed down via the token index.
+
+    A term can only be a substring of a field if each of its alphanumeric runs
+    is a substring of one of that field's tokens, so the result is always a
+    superset of the parts the scoring in handle_search_parts would accept.
+    """
+    candidates: Set[str] = set()
+    for term in search_terms:
+        runs = _SEARCH_TOKEN_RE.findall(term)
+        if not runs: return None # e.g. punctuation-only term, cannot use the index
+        term_candidates: Optional[Set[str]] = None
+        for run in runs:
+            run_candidates = _run_candidates(run)
+            term_candidates = run_candidates if term_candidates is None else term_candidates & run_candidates
+            if not term_candidates: break
+        candidates |= term_candidates or set()
+    return candidates
+
+# Building part scripts and hidden-line removal are CPU-bound and partly serialized by the
+# GIL, so both run in worker processes; shapes cross the process boundary as BREP bytes.
+# Created on first use and reused across scans; spawned (not forked) because the server
+# process runs threads.
+_part_process_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+def _get_part_process_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """Returns the part build/render process pool, creating it on first use."""
+    global _part_process_pool
+    if _part_process_pool is None:
+        _part_process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+    return _part_process_pool
+
+def _run_in_part_process(func: Callable, *args: Any) -> Any:
+    """Runs func(*args) in the part process pool, or in-process if the pool has broken."""
+    global _part_process_pool
+    try:
+        return _get_part_process_pool().submit(func, *args).result()
+    except BrokenProcessPool as e:
+        log.warning(f"Part process pool failed ({e}), running {func.__name__} in-process.")
+        _part_process_pool = None # Recreated on next use
+        return func(*args)
+
+# Content hashes whose build results part_content_cache keeps (each entry holds a rendered SVG).
+# Beyond this the least recently used are dropped; entries of removed parts go immediately
+PART_CONTENT_CACHE_SIZE = 256
+# Guards svg_preview_cache, svg_preview_keys and part_content_cache, which scan worker threads
+# update concurrently, and the preview files they point at: a file in svg_preview_cache is only
+# read or replaced while holding it, so a copy never picks up geometry swapped in by another thread.
+# Renders and builds run outside it; only the (small) file reads/writes are serialized
+_preview_lock = threading.Lock()
+
+def _remember_part_content(content_hash: str, entry: Dict[str, Any]) -> None:
+    """Records a part's build results under its content hash, evicting the least recently used. Caller holds _preview_lock."""
+    part_content_cache[content_hash] = entry
+    part_content_cache.move_to_end(content_hash)
+    while len(part_content_cache) > PART_CONTENT_CACHE_SIZE: part_content_cache.popitem(last=False)
+
+def _write_preview(preview_output_path: str, svg_bytes: bytes) -> bool:
+    """
+    Writes an SVG preview unless the file already holds exactly these bytes.
+    Returns True if the file was written.
+
+    The new content goes to a temporary file that then replaces the preview, so a
+    concurrent reader (or the web server) never sees a truncated SVG.
+    """
+    try: existing_size = os.stat(preview_output_path).st_size
+    except FileNotFoundError: existing_size = None
+    if existing_size == len(svg_bytes): # Only same-size files can match; compare content
+        with open(preview_output_path, 'rb') as f:
+            if f.read() == svg_bytes: return False
+    ensure_dir(os.path.dirname(preview_output_path))
+    tmp_path = f"{preview_output_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f: f.write(svg_bytes)
+        os.replace(tmp_path, preview_output_path)
+    except BaseException:
+        try: os.unlink(tmp_path)
+        except OSError: pass
+        raise
+    return True
+
+def _render_part_preview(brep_bytes: bytes, preview_output_path: str, svg_opts: dict) -> Tuple[str, bytes]:
+    """
+    Writes the SVG preview for a part (given as BREP bytes), reusing an earlier render of identical geometry.
+    Returns the preview's svg_preview_cache key and the SVG bytes.
+
+    Hidden-line removal is by far the most expensive step of a scan, so previews are
+    memoized by geometry fingerprint and SVG options. Edits that only touch a part's
+    docstring/metadata then skip the render entirely. New renders run in the part
+    process pool (returning the SVG in memory); the calling worker thread waits for the
+    result. The preview file is only rewritten if its content changes.
+    """
+    # Fingerprint by BREP content, not Shape.hashCode() (which identifies the OCCT object
+    # and changes on every re-execution); the bytes are also what the render worker needs
+    cache_key = f"{hashlib.sha1(brep_bytes).hexdigest()}:{sorted(svg_opts.items())!r}"
+    with _preview_lock:
+        cached_path = svg_preview_cache.get(cache_key)
+        if cached_path and os.path.isfile(cached_path):
+            with open(cached_path, 'rb') as f: svg_bytes = f.read()
+            if cached_path != preview_output_path:
+                _write_preview(preview_output_path, svg_bytes)
+                _remember_preview(cache_key, preview_output_path) # The file's previous render is stale now
+            log.info(f"Reused cached SVG preview '{cached_path}' for '{preview_output_path}' (geometry unchanged).")
+            return cache_key, svg_bytes
+    svg_bytes = _run_in_part_process(render_brep_to_svg_bytes, brep_bytes, svg_opts)
+    with _preview_lock:
+        if not _write_preview(preview_output_path, svg_bytes):
+            log.info(f"SVG preview '{preview_output_path}' is unchanged, not rewritten.")
+        _remember_preview(cache_key, preview_output_path)
+    return cache_key, svg_bytes
+
+def _remember_preview(cache_key: str, preview_output_path: str) -> None:
+    """Records that preview_output_path now holds the render for cache_key. Caller holds _preview_lock."""
+    # The file now holds different geometry, so forget the entry that pointed at its old content.
+    # Found through the reverse index: scanning svg_preview_cache per write made a scan O(N^2)
+    stale_key = svg_preview_keys.get(preview_output_path)
+    if stale_key is not None and stale_key != cache_key and svg_preview_cache.get(stale_key) == preview_output_path:
+        del svg_preview_cache[stale_key]
+    # This render may have been recorded for another file before; that file no longer maps to it
+    old_path = svg_preview_cache.get(cache_key)
+    if old_path is not None and old_path != preview_output_path and svg_preview_keys.get(old_path) == cache_key:
+        del svg_preview_keys[old_path]
+    svg_preview_cache[cache_key] = preview_output_path
+    svg_preview_keys[preview_output_path] = cache_key
+
+def _process_part_file(filename: str, part_name: str, file_path: str, current_mtime: float, script_bytes: bytes, content_hash: str,
+                       preview_dir_path: str, preview_dir_url_base: Optional[str], svg_opts: dict) -> Optional[Dict[str, Any]]:
+    """
+    Executes a single part script, renders its SVG preview and parses its metadata.
+    Runs in a worker thread, so it must not touch part_index.
+
+    Script content seen before (e.g. a reverted edit, or a copy of another part) reuses the
+    metadata and SVG recorded under its content hash instead of executing again.
+
+    Returns:
+        The part_data dict for the index, or None if the part could not be indexed
+        (the reason is logged here).
+    """
+    error_msg = None
+    try:
+        log.info(f"Processing part: {filename} (new or modified)")
+        script_content = script_bytes.decode('utf-8')
+        preview_filename = f"{part_name}.svg"
+        preview_output_path = os.path.join(preview_dir_path, preview_filename)
+        # Determine preview URL (fall back to the path if there is no URL base)
+        preview_output_url = f"{preview_dir_url_base}/{preview_filename}" if preview_dir_url_base else preview_output_path
+
+        with _preview_lock:
+            known_content = part_content_cache.get(content_hash)
+            if known_content and known_content["svg_opts"] != svg_opts: known_content = None # Rendered with other SVG options
+            if known_content:
+                part_content_cache.move_to_end(content_hash)
+                # Skip the rewrite if the preview file already holds this render
+                if svg_preview_cache.get(known_content["preview_key"]) != preview_output_path or not os.path.isfile(preview_output_path):
+                    _write_preview(preview_output_path, known_content["svg"])
+                    _remember_preview(known_content["preview_key"], preview_output_path)
+        if known_content:
+            log.info(f"Reusing metadata and preview for {filename} (content seen before).")
+            return {
+                "part_id": part_name,
+                "metadata": {**known_content["metadata"], "filename": filename},
+                "preview_url": preview_output_url,
+                "preview_path": preview_output_path,
+                "script_path": file_path,
+                "mtime": current_mtime,
+                "content_hash": content_hash
+            }
+
+        # Execute with the server's CadQuery (parts don't need isolated envs) in a worker
+        # process, so scripts build in parallel; the first shown shape comes back as BREP bytes
+        brep_bytes, build_error = _run_in_part_process(build_script_brep_bytes, script_content)
+
+        if brep_bytes is not None:
+            preview_key, svg_bytes = _render_part_preview(brep_bytes, preview_output_path, svg_opts)
+
+            # Parse metadata from docstring
+            docstring = extract_module_docstring(script_content)
+            metadata = parse_docstring_metadata(docstring)
+            metadata['filename'] = filename # Add filename to metadata
+            with _preview_lock: _remember_part_content(content_hash, {"metadata": metadata, "preview_key": preview_key, "svg": svg_bytes, "svg_opts": svg_opts})
+
+            return {
+                "part_id": part_name,
+                "metadata": metadata,
+                "preview_url": preview_output_url, # Use URL or path
+                "preview_path": preview_output_path, # Filesystem path, whatever preview_url is
+                "script_path": file_path,
+                "mtime": current_mtime,
+                "content_hash": content_hash
+            }
+        elif build_error is None:
+            log.warning(f"Part script {filename} executed successfully but produced no results. Skipping indexing.")
+        else: # Build failed
+            log.error(f"Failed to execute part script {filename}: {build_error}")
+
+    except SyntaxError as e: error_msg = f"Syntax error parsing {filename}: {e}"
+    except Exception as e: error_msg = f"Error processing {filename}: {e}"
+    if error_msg: log.error(error_msg, exc_info=True)
+    return None
+
+async def handle_scan_part_library(request: dict) -> dict:
     """
     Handles the 'scan_part_library' tool request.
     Scans a specified directory (or the default) for CadQuery part scripts (.py),
     executes them to get metadata and generate previews, and updates the part_index.
     Uses the ACTIVE configured paths for library and previews.
+    New or modified parts are processed concurrently in worker threads (bounded by
+    the CPU count) so the event loop stays responsive during long scans.
     """
     request_id = request.get("request_id", "unknown")
     log.info(f"Handling scan_part_library request (ID: {request_id})")
@@ -324,124 +670,113 @@ def handle_scan_part_library(request: dict) -> dict:
              raise ValueError("Part preview directory path is not configured.")
 
         # Determine preview URL base if static serving is active
-        preview_dir_url_base = None
-        if ACTIVE_STATIC_DIR:
-            try:
-                rel_path = os.path.relpath(preview_dir_path, ACTIVE_STATIC_DIR)
-                if not rel_path.startswith(".."):
-                    preview_dir_url_base = "/" + rel_path.replace(os.sep, "/")
-                    log.info(f"Using preview URL base: {preview_dir_url_base}")
-                else:
-                    log.warning(f"Preview directory '{preview_dir_path}' is outside static dir '{ACTIVE_STATIC_DIR}'. Previews may not be accessible via URL.")
-            except ValueError:
-                 log.warning(f"Could not determine relative path for preview dir '{preview_dir_path}' to static dir '{ACTIVE_STATIC_DIR}'. Previews may not be accessible via URL.")
-
-
-        if not os.path.isdir(library_path):
-            raise ValueError(f"Part library directory not found: {library_path}")
+        preview_dir_url_base = _to_static_url(preview_dir_path)
+        if preview_dir_url_base:
+            log.info(f"Using preview URL base: {preview_dir_url_base}")
+        elif state.ACTIVE_STATIC_DIR:
+            log.warning(f"Preview directory '{preview_dir_path}' is outside static dir '{state.ACTIVE_STATIC_DIR}'. Previews may not be accessible via URL.")
+
+
         if not os.path.isdir(preview_dir_path):
              log.warning(f"Preview directory '{preview_dir_path}' not found. Creating it.")
-             os.makedirs(preview_dir_path, exist_ok=True)
+             ensure_dir(preview_dir_path)
 
         scanned_count, indexed_count, updated_count, cached_count, error_count = 0, 0, 0, 0, 0
         found_parts = set()
-        default_svg_opts = {"width": 150, "height": 100, "showAxes": False}
-
-        # Ensure the library path itself exists before listing directory
-        if not os.path.isdir(library_path):
-            log.warning(f"Part library directory '{library_path}' does not exist. Scan aborted.")
-            return {"success": True, "message": f"Part library directory '{library_path}' not found.", "scanned": 0, "indexed": 0, "updated": 0, "cached": 0, "removed": 0, "errors": 0}
-
-
-        for filename in os.listdir(library_path):
-            if filename.endswith(".py") and not filename.startswith("_"):
-                scanned_count += 1
-                part_name = os.path.splitext(filename)[0]
-                found_parts.add(part_name)
-                file_path = os.path.join(library_path, filename)
-                error_msg = None
+        default_svg_opts = dict(_DEFAULT_PREVIEW_SVG_OPTS) # Plain dict: it is pickled to the part process pool
+
+        # Opening the directory listing is also the existence check (one syscall instead of isdir + scandir)
+        try: library_entries = os.scandir(library_path)
+        except (FileNotFoundError, NotADirectoryError): raise ValueError(f"Part library directory not found: {library_path}")
+
+        # Collect new or modified parts; unchanged parts are served from the cache
+        # scandir yields name, path and (cached) stat data in a single directory pass
+        pending_parts: List[Tuple[str, str, str, float, bytes, str]] = []
+        with library_entries as entries:
+            for entry in entries:
+                filename = entry.name
+                if not filename.endswith(".py") or filename.startswith("_"): continue
+                try:
+                    if not entry.is_file(): continue
+                    scanned_count += 1
+                    part_name = filename[:-3] # Strip '.py'
+                    found_parts.add(part_name)
+                    current_mtime = entry.stat().st_mtime
+                except OSError as e:
+                    log.error(f"Error processing {filename}: {e}", exc_info=True)
+                    error_count += 1
+                    continue
+                cached_data = part_index.get(part_name)
+                if cached_data and cached_data.get('mtime') == current_mtime:
+                    log.debug(f"Using cached data for part: {filename}")
+                    cached_count += 1
+                    continue
+                # A new mtime does not mean new content (touch, save-then-revert): compare content hashes
                 try:
-                    current_mtime = os.path.getmtime(file_path)
-                    cached_data = part_index.get(part_name)
-                    if cached_data and cached_data.get('mtime') == current_mtime:
-                        log.debug(f"Using cached data for part: {filename}")
-                        cached_count += 1
-                        continue
-
-                    log.info(f"Processing part: {filename} (new or modified)")
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        script_content = f.read()
-
-                    # Execute in the *current* server environment, assuming parts don't need isolated envs
-                    # If isolation is needed, this would need to use script_runner via subprocess
-                    build_result = execute_cqgi_script(script_content) # Using core function directly
-
-                    if build_result.success and build_result.results:
-                        shape_to_preview = build_result.results[0].shape
-                        preview_filename = f"{part_name}.svg"
-                        preview_output_path = os.path.join(preview_dir_path, preview_filename)
-
-                        # Determine preview URL
-                        preview_output_url = None
-                        if preview_dir_url_base:
-                            preview_output_url = f"{preview_dir_url_base}/{preview_filename}"
-                        else:
-                            preview_output_url = preview_output_path # Fallback to path if no URL base
-
-                        export_shape_to_svg_file(shape_to_preview, preview_output_path, default_svg_opts)
-
-                        # Parse metadata from docstring
-                        tree = ast.parse(script_content)
-                        docstring = ast.get_docstring(tree)
-                        metadata = parse_docstring_metadata(docstring)
-                        metadata['filename'] = filename # Add filename to metadata
-
-                        part_data = {
-                            "part_id": part_name,
-                            "metadata": metadata,
-                            "preview_url": preview_output_url, # Use URL or path
-                            "script_path": file_path,
-                            "mtime": current_mtime
-                        }
-                        if part_name in part_index: updated_count += 1
-                        else: indexed_count += 1
-                        part_index[part_name] = part_data
-                        log.info(f"Successfully indexed/updated part: {part_name}")
-                    elif not build_result.results:
-                        log.warning(f"Part script {filename} executed successfully but produced no results. Skipping indexing.")
-                        error_count += 1
-                    else: # Build failed
-                        log.error(f"Failed to execute part script {filename}: {build_result.exception}")
-                        error_count += 1
-
-                except SyntaxError as e: error_msg = f"Syntax error parsing {filename}: {e}"; error_count += 1
-                except Exception as e: error_msg = f"Error processing {filename}: {e}"; error_count += 1
-                if error_msg: log.error(error_msg, exc_info=True)
+                    with open(entry.path, 'rb') as f: script_bytes = f.read()
+                except OSError as e:
+                    log.error(f"Error processing {filename}: {e}", exc_info=True)
+                    error_count += 1
+                    continue
+                content_hash = hashlib.blake2b(script_bytes, digest_size=16).hexdigest()
+                if cached_data and cached_data.get('content_hash') == content_hash:
+                    log.debug(f"Content unchanged for part: {filename}, updating mtime only")
+                    cached_data['mtime'] = current_mtime
+                    cached_count += 1
+                    continue
+                pending_parts.append((filename, part_name, entry.path, current_mtime, script_bytes, content_hash))
+
+        # Build and render the pending parts in worker threads. OCCT releases the GIL
+        # for most geometry work, so this overlaps the kernels across cores.
+        semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+
+        async def _scan_one(filename: str, part_name: str, file_path: str, current_mtime: float, script_bytes: bytes, content_hash: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                return await asyncio.to_thread(
+                    _process_part_file, filename, part_name, file_path, current_mtime, script_bytes, content_hash,
+                    preview_dir_path, preview_dir_url_base, default_svg_opts
+                )
+
+        tasks = [asyncio.create_task(_scan_one(*pending)) for pending in pending_parts]
+        scanned_parts = await asyncio.gather(*tasks)
+
+        # Aggregate on the event loop so part_index is only ever mutated here
+        for part_data in scanned_parts:
+            if part_data is None:
+                error_count += 1
+                continue
+            part_name = part_data["part_id"]
+            if part_name in part_index: updated_count += 1
+            else: indexed_count += 1
+            part_index[part_name] = part_data
+            _index_part_for_search(part_name, part_data)
+            log.info(f"Successfully indexed/updated part: {part_name}")
 
         # Remove parts from index that are no longer found
         removed_count = 0
+        removed_hashes = set()
         indexed_parts = set(part_index.keys())
         parts_to_remove = indexed_parts - found_parts
         for part_name_to_remove in parts_to_remove:
             log.info(f"Removing deleted part from index: {part_name_to_remove}")
             removed_data = part_index.pop(part_name_to_remove, None)
-            # Attempt to remove the preview file
-            if removed_data and 'preview_url' in removed_data:
-                 # Try to reconstruct the path from URL or use path directly
-                 preview_path_to_remove = None
-                 if preview_dir_url_base and removed_data['preview_url'].startswith(preview_dir_url_base):
-                      preview_filename = os.path.basename(removed_data['preview_url'])
-                      preview_path_to_remove = os.path.join(preview_dir_path, preview_filename)
-                 elif os.path.exists(removed_data['preview_url']): # Check if it's a path
-                      preview_path_to_remove = removed_data['preview_url']
-
-                 if preview_path_to_remove and os.path.exists(preview_path_to_remove):
-                     try:
-                         os.remove(preview_path_to_remove)
-                         log.info(f"Removed preview file: {preview_path_to_remove}")
-                     except OSError as e:
-                         log.error(f"Error removing preview file {preview_path_to_remove}: {e}")
+            _unindex_part_for_search(part_name_to_remove)
+            if removed_data: removed_hashes.add(removed_data.get("content_hash"))
+            # The preview's filesystem path is recorded at index time (preview_url may be a URL)
+            preview_path_to_remove = removed_data.get("preview_path") if removed_data else None
+            if preview_path_to_remove:
+                try:
+                    with _preview_lock: os.unlink(preview_path_to_remove)
+                    log.info(f"Removed preview file: {preview_path_to_remove}")
+                except FileNotFoundError: pass # Already gone
+                except OSError as e:
+                    log.error(f"Error removing preview file {preview_path_to_remove}: {e}")
             removed_count += 1
+        if removed_hashes:
+            # Forget build results of removed parts, unless a remaining part has the same content
+            removed_hashes -= {p.get("content_hash") for p in part_index.values()}
+            with _preview_lock:
+                for content_hash in removed_hashes: part_content_cache.pop(content_hash, None)
 
         summary_msg = (f"Scan complete. Scanned: {scanned_count}, Newly Indexed: {indexed_count}, "
                        f"Updated: {updated_count}, Cached: {cached_count}, Removed: {removed_count}, Errors: {error_count}.")
@@ -464,15 +799,14 @@ def handle_save_workspace_module(request: dict) -> dict:
         if not module_filename: raise ValueError("Missing 'module_filename' argument.")
         if module_content is None: raise ValueError("Missing 'module_content' argument.") # Allow empty string
         if not module_filename.endswith(".py"): raise ValueError("'module_filename' must end with .py")
-        if os.path.sep in module_filename or (os.altsep and os.altsep in module_filename):
+        if _PATH_SEP_RE.search(module_filename):
              raise ValueError("'module_filename' cannot contain path separators.")
 
-        workspace_path = os.path.abspath(workspace_path_arg)
-        if not os.path.isdir(workspace_path): raise ValueError(f"Invalid workspace path: {workspace_path}")
+        workspace_path = _resolve_workspace(workspace_path_arg)
 
         # Define the 'modules' subdirectory within the workspace
         modules_dir = os.path.join(workspace_path, "modules")
-        os.makedirs(modules_dir, exist_ok=True)
+        ensure_dir(modules_dir)
 
         # Prevent writing outside the modules directory
         target_path = os.path.abspath(os.path.join(modules_dir, module_filename))
@@ -480,8 +814,8 @@ def handle_save_workspace_module(request: dict) -> dict:
              raise ValueError("Invalid module filename, attempted path traversal.")
 
         log.info(f"Saving module content to: {target_path}")
-        with open(target_path, 'w', encoding='utf-8') as f:
-            f.write(module_content)
+        # Binary mode, so the content's newlines are kept as sent on every platform
+        with open(target_path, 'wb') as f: f.write(module_content.encode('utf-8'))
 
         # Invalidate the mtime cache for this workspace's requirements
         # This isn't strictly necessary for saving a module, but good practice
@@ -503,7 +837,7 @@ def handle_install_workspace_package(request: dict) -> dict:
         if not workspace_path_arg: raise ValueError("Missing 'workspace_path' argument.")
         if not package_name: raise ValueError("Missing 'package_name' argument.")
 
-        workspace_path = os.path.abspath(workspace_path_arg)
+        workspace_path = _abspath(workspace_path_arg)
         log_prefix = f"InstallPkg({os.path.basename(workspace_path)})"
         log.info(f"[{log_prefix}] Request to install '{package_name}' into workspace: {workspace_path}")
 
@@ -513,20 +847,21 @@ def handle_install_workspace_package(request: dict) -> dict:
         # Construct the uv install command
         # Use the specific python from the workspace venv to ensure install goes there
         install_cmd = [
-            "uv", "pip", "install", package_name,
-            "--python", workspace_python_exe
+            *UV_PIP_INSTALL_CMD, package_name,
+            "--python", workspace_python_exe, *UV_PIP_INSTALL_FLAGS
         ]
 
         log.info(f"[{log_prefix}] Running install command: {' '.join(install_cmd)}")
-        # Run the command using the helper, capturing output
-        success, output = _run_command_helper(install_cmd, log_prefix=log_prefix, cwd=workspace_path) # Run in workspace CWD
+        # Run the command using the helper, capturing output (a failed install is reported below, not raised)
+        install_result = _run_command_helper(install_cmd, check=False, log_prefix=log_prefix, cwd=workspace_path) # Run in workspace CWD
+        success, output = install_result.returncode == 0, install_result.stdout
 
         if success:
             log.info(f"[{log_prefix}] Successfully installed '{package_name}'.")
+            close_workspace_runners(workspace_path) # Persistent runners restart and see the new package
             # Update the mtime cache after successful install
             reqs_file = os.path.join(workspace_path, "requirements.txt")
             if os.path.exists(reqs_file):
-                 from .state import workspace_reqs_mtime_cache # Import here to avoid top-level circularity if state imports handlers
                  workspace_reqs_mtime_cache[workspace_path] = os.path.getmtime(reqs_file)
             return {"success": True, "message": f"Package '{package_name}' installed successfully.", "output": output}
         else:
@@ -543,40 +878,73 @@ def handle_search_parts(request: dict) -> dict:
     try:
         args = request.get("arguments", {})
         query = args.get("query", "").strip().lower()
+        limit = args.get("limit") # Optional: only the best 'limit' matches are returned
+        if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+            raise ValueError("'limit' must be a positive integer.")
 
         if not query:
             log.info("Empty search query, returning all indexed parts.")
-            results = list(part_index.values())
-            return {"success": True, "message": f"Found {len(results)} parts.", "results": results}
+            # Reuse the list built for the current index version instead of rebuilding it per call
+            global _all_parts_cache
+            if _all_parts_cache is None or _all_parts_cache[0] != part_index.version:
+                _all_parts_cache = (part_index.version, tuple(part_index.values()))
+            results = _all_parts_cache[1]
+            return {"success": True, "message": f"Found {len(results)} parts.", "results": list(results if limit is None else results[:limit])}
 
         log.info(f"Searching parts with query: '{query}'")
-        search_terms = set(term.strip() for term in query.split() if term.strip())
+        global _search_cache_version
+        if _search_cache_version != part_index.version:
+            _search_cache.clear(); _sync_search_index(); _search_cache_version = part_index.version
+        final_results = _search_cache.get(query)
+        if final_results is not None:
+            _search_cache.move_to_end(query)
+            message = f"Found {len(final_results)} parts matching query '{query}'."
+            log.info(message + " (cached)")
+            return {"success": True, "message": message, "results": list(final_results if limit is None else final_results[:limit])}
+
+        search_terms = set(query.split()) # split() already drops whitespace and empty terms
+        # Narrow down to candidate parts via the inverted token index before scoring
+        candidate_ids = _search_candidates(search_terms)
+        # Candidates are scored in part_index order, so equal scores keep the index order
+        candidate_order = list(part_index) if candidate_ids is None else sorted(candidate_ids, key=_part_order.__getitem__)
+        log.debug(f"Scoring {len(candidate_order)} candidate part(s) out of {len(part_index)}.")
         results = []
-        for part_id, part_data in part_index.items():
+        for part_id in candidate_order:
+            part_data = part_index.get(part_id)
+            if part_data is None: continue
             match_score = 0
-            metadata = part_data.get("metadata", {})
+            # Lowercased fields are precomputed at index time: by the scan, or by _sync_search_index
+            # for parts placed in part_index some other way, so every part here has them
+            lc_id, lc_part, lc_description, lc_filename, lc_tags = part_search_fields[part_id]
 
             # Score based on matches in different fields
-            if query in part_id.lower(): match_score += 5
-            if query in metadata.get("part", "").lower(): match_score += 3 # Check 'part' field if exists
-            if query in metadata.get("description", "").lower(): match_score += 2
-            tags = metadata.get("tags", [])
-            if isinstance(tags, list):
-                 if any(term in tag for term in search_terms for tag in tags): match_score += 5
-            if query in metadata.get("filename", "").lower(): match_score += 1
+            if query in lc_id: match_score += 5
+            if query in lc_part: match_score += 3 # Check 'part' field if exists
+            if query in lc_description: match_score += 2
+            if any(term in lc_tags for term in search_terms): match_score += 5 # One C-level substring search per term
+            if query in lc_filename: match_score += 1
 
             if match_score > 0:
                 results.append({"score": match_score, "part": part_data})
 
+        message = f"Found {len(results)} parts matching query '{query}'."
+        log.info(message)
+        if limit is not None and limit < len(results):
+            # Only the top 'limit' are needed: O(N log K) selection instead of a full sort. nlargest keeps
+            # the order of equal scores like the stable sort does, so this matches the unlimited results' head.
+            # Not cached, the cache only holds complete result lists
+            return {"success": True, "message": message, "results": [item["part"] for item in heapq.nlargest(limit, results, key=_score_key)]}
+
         # Sort results by score (descending)
-        results.sort(key=lambda x: x["score"], reverse=True)
+        results.sort(key=_score_key, reverse=True)
         final_results = [item["part"] for item in results]
-
-        message = f"Found {len(final_results)} parts matching query '{query}'."
-        log.info(message)
+        _search_cache[query] = tuple(final_results)
+        if len(_search_cache) > SEARCH_CACHE_SIZE: _search_cache.popitem(last=False)
         return {"success": True, "message": message, "results": final_results}
     except Exception as e: error_msg = f"Error during part search: {e}"; log.error(error_msg, exc_info=True); raise Exception(error_msg)
 
+CQ_EDITOR_STARTUP_CHECK_DELAY = 0.01 # Seconds to wait before checking whether a launched CQ-Editor exited straight away
+
 def handle_launch_cq_editor(request: dict) -> dict:
     """
     Handles launching the standalone CQ-Editor application.
@@ -590,30 +958,53 @@ def handle_launch_cq_editor(request: dict) -> dict:
         cq_editor_command = "cq-editor"
         log.info(f"Attempting to launch CQ-Editor using command: '{cq_editor_command}'")
 
-        # Use subprocess.Popen for non-blocking launch
-        process = subprocess.Popen([cq_editor_command], stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
-
-        # Small delay to check if process started immediately (optional)
-        try:
-            process.wait(timeout=0.1)
-            # If wait() returns quickly, it likely failed to launch
-            stderr_output = process.stderr.read().decode('utf-8', errors='ignore')
-            log.error(f"CQ-Editor command '{cq_editor_command}' exited immediately. Error: {stderr_output}")
-            raise RuntimeError(f"Failed to launch CQ-Editor. Command exited immediately. Is it installed and in PATH? Error: {stderr_output}")
-        except subprocess.TimeoutExpired:
-            # Process is running, launch successful
-            log.info(f"CQ-Editor launched successfully in background (PID: {process.pid}).")
-            return {"success": True, "message": "CQ-Editor launched successfully."}
+        # Fully detached: no pipes the editor could fill (and block on), no inherited stdin
+        try: process = subprocess.Popen([cq_editor_command], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
         except FileNotFoundError:
-             log.error(f"CQ-Editor command '{cq_editor_command}' not found. Is CQ-Editor installed and in the system PATH?")
-             raise FileNotFoundError(f"Command '{cq_editor_command}' not found. Ensure CQ-Editor is installed and in PATH.")
-        except Exception as e:
-             log.error(f"Error launching CQ-Editor: {e}", exc_info=True)
-             raise Exception(f"An unexpected error occurred while launching CQ-Editor: {e}")
+            log.error(f"CQ-Editor command '{cq_editor_command}' not found. Is CQ-Editor installed and in the system PATH?")
+            raise FileNotFoundError(f"Command '{cq_editor_command}' not found. Ensure CQ-Editor is installed and in PATH.")
+
+        # Brief non-blocking check for a launch that fails straight away (e.g. broken install)
+        time.sleep(CQ_EDITOR_STARTUP_CHECK_DELAY)
+        returncode = process.poll()
+        if returncode is not None:
+            log.error(f"CQ-Editor command '{cq_editor_command}' exited immediately with code {returncode}.")
+            raise RuntimeError(f"Failed to launch CQ-Editor. Command exited immediately with code {returncode}. Is it installed and in PATH?")
+        log.info(f"CQ-Editor launched successfully in background (PID: {process.pid}).")
+        return {"success": True, "message": "CQ-Editor launched successfully."}
 
     except Exception as e: error_msg = f"Error launching CQ-Editor: {e}"; log.error(error_msg, exc_info=True); raise Exception(error_msg)
 
 
+def _resolve_shape(result_id: Any, shape_index: Any) -> Any:
+    """
+    Validates a (result_id, shape_index) reference to a stored execution result and returns
+    the imported shape (cached per intermediate file, see _import_brep).
+
+    Raises:
+        ValueError: If the reference is invalid or the intermediate file is missing.
+        RuntimeError: If the intermediate file cannot be imported.
+    """
+    if not result_id: raise ValueError("Missing 'result_id' argument.")
+    if not isinstance(shape_index, int) or shape_index < 0: raise ValueError("'shape_index' must be a non-negative integer.")
+
+    result_dict = shape_results.get(result_id)
+    if not result_dict: raise ValueError(f"Result ID '{result_id}' not found.")
+    if not result_dict.get("success"): raise ValueError(f"Result ID '{result_id}' corresponds to a failed build.")
+
+    results_list = result_dict.get("results", [])
+    if not results_list or shape_index >= len(results_list): raise ValueError(f"Invalid shape_index {shape_index} for result ID '{result_id}'.")
+
+    intermediate_path = results_list[shape_index].get("intermediate_path")
+    if not intermediate_path or not os.path.exists(intermediate_path):
+         raise ValueError(f"Intermediate file path not found or file missing for shape {shape_index} in result ID '{result_id}'. Path: {intermediate_path}")
+
+    log.info(f"Importing shape from intermediate file: {intermediate_path}")
+    try: return _import_brep(intermediate_path)
+    except Exception as import_err:
+        log.error(f"Failed to import BREP file '{intermediate_path}': {import_err}", exc_info=True)
+        raise RuntimeError(f"Failed to import intermediate shape file: {import_err}") from import_err
+
 def handle_get_shape_properties(request: dict) -> dict:
     """
     Handles the 'get_shape_properties' tool request.
@@ -625,33 +1016,7 @@ def handle_get_shape_properties(request: dict) -> dict:
         args = request.get("arguments", {})
         result_id = args.get("result_id")
         shape_index = args.get("shape_index", 0)
-        # workspace_path_arg = args.get("workspace_path") # Optional context
-
-        if not result_id: raise ValueError("Missing 'result_id' argument.")
-        if not isinstance(shape_index, int) or shape_index < 0: raise ValueError("'shape_index' must be a non-negative integer.")
-
-        # Retrieve result dict
-        result_dict = shape_results.get(result_id)
-        if not result_dict: raise ValueError(f"Result ID '{result_id}' not found.")
-        if not result_dict.get("success"): raise ValueError(f"Result ID '{result_id}' corresponds to a failed build.")
-
-        results_list = result_dict.get("results", [])
-        if not results_list or shape_index >= len(results_list): raise ValueError(f"Invalid shape_index {shape_index} for result ID '{result_id}'.")
-
-        # Get intermediate path
-        shape_data = results_list[shape_index]
-        intermediate_path = shape_data.get("intermediate_path")
-        if not intermediate_path or not os.path.exists(intermediate_path):
-             raise ValueError(f"Intermediate file path not found or file missing for shape {shape_index} in result ID '{result_id}'. Path: {intermediate_path}")
-
-        # Import shape
-        log.info(f"Importing shape from intermediate file for properties: {intermediate_path}")
-        try:
-            shape_object = cq.importers.importBrep(intermediate_path)
-            log.info(f"Successfully imported shape.")
-        except Exception as import_err:
-            log.error(f"Failed to import BREP file '{intermediate_path}': {import_err}", exc_info=True)
-            raise RuntimeError(f"Failed to import intermediate shape file: {import_err}") from import_err
+        shape_object = _resolve_shape(result_id, shape_index)
 
         # Get properties using the core function
         properties = core_get_shape_properties(shape_object)
@@ -661,6 +1026,29 @@ def handle_get_shape_properties(request: dict) -> dict:
 
     except Exception as e: error_msg = f"Error getting shape properties: {e}"; log.error(error_msg, exc_info=True); raise Exception(error_msg)
 
+def handle_get_shape_properties_batch(request: dict) -> dict:
+    """
+    Handles the 'get_shape_properties_batch' tool request.
+    Retrieves the properties of several shapes in one call; results keep the request order.
+
+    Each intermediate file is imported once however often it is referenced, and the
+    shapes are analyzed concurrently. Any invalid reference fails the whole batch.
+    """
+    request_id = request.get("request_id", "unknown")
+    log.info(f"Handling get_shape_properties_batch request (ID: {request_id})")
+    try:
+        shape_refs = request.get("arguments", {}).get("shapes")
+        if not isinstance(shape_refs, list) or not shape_refs: raise ValueError("'shapes' must be a non-empty list of {result_id, shape_index} objects.")
+        if not all(isinstance(ref, dict) for ref in shape_refs): raise ValueError("Each entry in 'shapes' must be an object with 'result_id' and 'shape_index'.")
+
+        shapes = [_resolve_shape(ref.get("result_id"), ref.get("shape_index", 0)) for ref in shape_refs]
+        properties = core_get_shape_properties_batch(shapes)
+
+        log.info(f"Retrieved properties for {len(properties)} shape(s).")
+        return {"success": True, "message": f"Properties retrieved for {len(properties)} shape(s).", "results": properties}
+
+    except Exception as e: error_msg = f"Error getting shape properties batch: {e}"; log.error(error_msg, exc_info=True); raise Exception(error_msg)
+
 def handle_get_shape_description(request: dict) -> dict:
     """
     Handles the 'get_shape_description' tool request.
@@ -672,33 +1060,7 @@ def handle_get_shape_description(request: dict) -> dict:
         args = request.get("arguments", {})
         result_id = args.get("result_id")
         shape_index = args.get("shape_index", 0)
-        # workspace_path_arg = args.get("workspace_path") # Optional context
-
-        if not result_id: raise ValueError("Missing 'result_id' argument.")
-        if not isinstance(shape_index, int) or shape_index < 0: raise ValueError("'shape_index' must be a non-negative integer.")
-
-        # Retrieve result dict
-        result_dict = shape_results.get(result_id)
-        if not result_dict: raise ValueError(f"Result ID '{result_id}' not found.")
-        if not result_dict.get("success"): raise ValueError(f"Result ID '{result_id}' corresponds to a failed build.")
-
-        results_list = result_dict.get("results", [])
-        if not results_list or shape_index >= len(results_list): raise ValueError(f"Invalid shape_index {shape_index} for result ID '{result_id}'.")
-
-        # Get intermediate path
-        shape_data = results_list[shape_index]
-        intermediate_path = shape_data.get("intermediate_path")
-        if not intermediate_path or not os.path.exists(intermediate_path):
-             raise ValueError(f"Intermediate file path not found or file missing for shape {shape_index} in result ID '{result_id}'. Path: {intermediate_path}")
-
-        # Import shape
-        log.info(f"Importing shape from intermediate file for description: {intermediate_path}")
-        try:
-            shape_object = cq.importers.importBrep(intermediate_path)
-            log.info(f"Successfully imported shape.")
-        except Exception as import_err:
-            log.error(f"Failed to import BREP file '{intermediate_path}': {import_err}", exc_info=True)
-            raise RuntimeError(f"Failed to import intermediate shape file: {import_err}") from import_err
+        shape_object = _resolve_shape(result_id, shape_index)
 
         # Get description using the core function
         description = core_get_shape_description(shape_object)
@@ -720,6 +1082,7 @@ tool_handlers = {
     "launch_cq_editor": handle_launch_cq_editor,
     "get_shape_properties": handle_get_shape_properties,
     "get_shape_description": handle_get_shape_description,
+    "get_shape_properties_batch": handle_get_shape_properties_batch,
     "save_workspace_module": handle_save_workspace_module,
     "install_workspace_package": handle_install_workspace_package,
 }
\ No newline at end of file
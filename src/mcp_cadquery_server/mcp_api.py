@@ -1,27 +1,57 @@
-from typing import Dict, Any, Optional
+import os
+import asyncio
+import inspect
+import concurrent.futures
+import functools
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Tuple
 
 # Import necessary components from other modules
 from .state import log # Import log from state
 from .handlers import tool_handlers # Import tool_handlers from handlers
+from .models import ( # models.py imports nothing from this package, so no import cycle
+    ExecuteCadqueryScriptArgs,
+    ExportShapeArgs,
+    ExportShapeToSvgArgs,
+    ScanPartLibraryArgs,
+    SaveWorkspaceModuleArgs,
+    InstallWorkspacePackageArgs,
+    SearchPartsArgs,
+    GetShapePropertiesArgs,
+    GetShapeDescriptionArgs,
+    GetShapePropertiesBatchArgs,
+)
 # Removed import from server to break circular dependency
 
-def get_tool_schemas() -> Dict[str, Dict[str, Any]]:
-    """
-    Generates input schemas for each tool based on Pydantic models.
-    """
-    from src.mcp_cadquery_server.models import (
-        ExecuteCadqueryScriptArgs,
-        ExportShapeArgs,
-        ExportShapeToSvgArgs,
-        ScanPartLibraryArgs,
-        SaveWorkspaceModuleArgs,
-        InstallWorkspacePackageArgs,
-        SearchPartsArgs,
-        GetShapePropertiesArgs,
-        GetShapeDescriptionArgs,
-    )
-
-    schemas = {
+# Tools cheap enough to run directly on the event loop
+INLINE_TOOLS = frozenset({"search_parts"})
+# Tools whose handlers accept a 'progress' callback to stream intermediate results
+PROGRESS_TOOLS = frozenset({"execute_cadquery_script"})
+# Blocking tool handlers (CQGI builds, runner subprocesses, exports) run here so the
+# event loop stays free to serve SSE streams and further requests
+tool_executor = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="mcp-tool")
+
+# Bound once: tool_handlers is only ever updated in place, never rebound
+_lookup_handler = tool_handlers.get
+
+# How each handler is called, resolved on first use instead of inspecting the handler on every request.
+# Keyed by handler (not tool name) so replacing an entry in tool_handlers is picked up.
+DISPATCH_AWAIT, DISPATCH_INLINE, DISPATCH_EXECUTOR = "await", "inline", "executor"
+_dispatch_modes: Dict[Callable, str] = {}
+
+def _get_dispatch_mode(tool_name: str, handler: Callable) -> str:
+    """Returns how a tool's handler should be called (awaited, inline or in tool_executor)."""
+    mode = _dispatch_modes.get(handler)
+    if mode is None:
+        if inspect.iscoroutinefunction(handler): mode = DISPATCH_AWAIT
+        elif tool_name in INLINE_TOOLS: mode = DISPATCH_INLINE
+        else: mode = DISPATCH_EXECUTOR
+        _dispatch_modes[handler] = mode
+    return mode
+
+@functools.lru_cache(maxsize=1)
+def _model_schemas() -> Dict[str, Dict[str, Any]]:
+    """Input schemas generated from the Pydantic argument models, built once (the models never change)."""
+    return {
         "execute_cadquery_script": ExecuteCadqueryScriptArgs.schema(),
         "export_shape": ExportShapeArgs.schema(),
         "export_shape_to_svg": ExportShapeToSvgArgs.schema(),
@@ -31,9 +61,17 @@ def get_tool_schemas() -> Dict[str, Dict[str, Any]]:
         "search_parts": SearchPartsArgs.schema(),
         "get_shape_properties": GetShapePropertiesArgs.schema(),
         "get_shape_description": GetShapeDescriptionArgs.schema(),
+        "get_shape_properties_batch": GetShapePropertiesBatchArgs.schema(),
         "launch_cq_editor": {"type": "object", "properties": {}, "required": []},
     }
 
+def get_tool_schemas() -> Dict[str, Dict[str, Any]]:
+    """
+    Generates input schemas for each tool based on Pydantic models.
+    The schema dicts are shared between calls and must not be modified.
+    """
+    schemas = dict(_model_schemas())
+
     # Ensure all handlers have a schema entry (even if empty)
     # tool_handlers is imported directly now
     for tool_name in tool_handlers:
@@ -42,11 +80,22 @@ def get_tool_schemas() -> Dict[str, Dict[str, Any]]:
             schemas[tool_name] = {"type": "object", "properties": {}, "required": []}
     return schemas
 
+# (tool_handlers items, message) of the last server_info built; rebuilt if the handlers change
+_server_info_cache: Optional[Tuple[Tuple[Tuple[str, Callable], ...], dict]] = None
+
 def get_server_info() -> dict:
-    """Constructs the server_info message."""
-    # from server import get_tool_schemas # Moved to top-level of this file
-    # from .handlers import tool_handlers # Moved to top-level of this file
+    """
+    Constructs the server_info message.
+    The message is built once per set of tool handlers; callers must not modify it.
+    """
+    global _server_info_cache
+    handlers_key = tuple(tool_handlers.items())
+    if _server_info_cache is None or _server_info_cache[0] != handlers_key:
+        _server_info_cache = (handlers_key, _build_server_info())
+    return _server_info_cache[1]
 
+def _build_server_info() -> dict:
+    """Builds the server_info message for the current tool_handlers."""
     server_name = "mcp-cadquery-server"  # TODO: Make configurable?
     server_version = "0.2.0-workspace"  # TODO: Get version dynamically?
     tool_schemas = get_tool_schemas() # Call local function
@@ -56,7 +105,7 @@ def get_server_info() -> dict:
         schema = tool_schemas.get(name, {"type": "object", "properties": {}})
         # Get docstring, strip, and take only the first line
         docstring = getattr(handler, '__doc__', f"Executes the {name} tool.")
-        description = docstring.strip().split('\n')[0] if docstring else f"Executes the {name} tool."
+        description = docstring.strip().partition('\n')[0] if docstring else f"Executes the {name} tool."
 
         tools.append({
             "name": name,
@@ -72,21 +121,41 @@ def get_server_info() -> dict:
         "resources": [] # Define if any resources are provided
     }
 
-def process_tool_request(request: dict) -> Optional[dict]:
+async def process_tool_request(request: dict, send_progress: Optional[Callable[[dict], Awaitable[None]]] = None) -> Optional[dict]:
     """
-    Processes a tool request synchronously and returns the message dictionary
+    Processes a tool request and returns the message dictionary
     to be sent back (either via SSE or stdio). Returns None if no message should be sent.
+    Coroutine handlers are awaited; blocking handlers run in tool_executor unless the
+    tool is listed in INLINE_TOOLS.
+    For tools in PROGRESS_TOOLS, intermediate results are sent as 'tool_progress'
+    messages through send_progress while the handler runs; all of them are delivered
+    before this coroutine returns the final message.
     """
     request_id = request.get("request_id", "unknown")
     tool_name = request.get("tool_name")
     result_message: Optional[dict] = None
     error_message: Optional[str] = None
-    log.debug(f"Processing tool request (ID: {request_id}, Tool: {tool_name})")
+    progress_futures: List[concurrent.futures.Future] = []
+    log.debug("Processing tool request (ID: %s, Tool: %s)", request_id, tool_name)
     try:
-        handler = tool_handlers.get(tool_name)
+        handler = _lookup_handler(tool_name)
+        dispatch_mode = _get_dispatch_mode(tool_name, handler) if handler else None
+        if handler and send_progress and tool_name in PROGRESS_TOOLS:
+            loop = asyncio.get_running_loop()
+            def report_progress(progress_result: dict) -> None:
+                # Called from the handler's thread; schedule the send on the event loop
+                progress_message = {"type": "tool_progress", "request_id": request_id, "result": progress_result}
+                progress_futures.append(asyncio.run_coroutine_threadsafe(send_progress(progress_message), loop))
+            handler = functools.partial(handler, progress=report_progress)
         if handler:
             # Execute the handler function associated with the tool_name
-            result_message = handler(request)
+            if dispatch_mode == DISPATCH_AWAIT:
+                result_message = await handler(request)
+            elif dispatch_mode == DISPATCH_INLINE:
+                result_message = handler(request)
+            else:
+                loop = asyncio.get_running_loop()
+                result_message = await loop.run_in_executor(tool_executor, handler, request)
         else:
             error_message = f"Unknown tool: {tool_name}"
             log.warning(error_message)
@@ -96,7 +165,9 @@ def process_tool_request(request: dict) -> Optional[dict]:
         detail = getattr(e, 'detail', str(e))
         error_message = f"Internal server error processing {tool_name}: {detail}"
 
-    log.debug(f"Tool processing complete (ID: {request_id}). Error: {error_message}, Result: {result_message}")
+    if progress_futures: # Keep progress ahead of the final result
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in progress_futures), return_exceptions=True)
+    log.debug("Tool processing complete (ID: %s). Error: %s, Result: %s", request_id, error_message, result_message) # Lazy, the result can be large
 
     # Construct the response message
     message_to_push: Optional[dict] = None
@@ -59,6 +59,7 @@ class InstallWorkspacePackageArgs(BaseModel):
 
 class SearchPartsArgs(BaseModel):
     query: Optional[str] = Field("", description="Search query string (empty returns all parts)")
+    limit: Optional[int] = Field(None, description="Maximum number of results to return, best matches first (default: all)")
 
 
 class GetShapePropertiesArgs(BaseModel):
@@ -68,4 +69,8 @@ class GetShapePropertiesArgs(BaseModel):
 
 class GetShapeDescriptionArgs(BaseModel):
     result_id: str = Field(..., description="Result ID from script execution")
-    shape_index: int = Field(0, description="Index of the shape in the result list")
\ No newline at end of file
+    shape_index: int = Field(0, description="Index of the shape in the result list")
+
+
+class GetShapePropertiesBatchArgs(BaseModel):
+    shapes: List[GetShapePropertiesArgs] = Field(..., description="Shapes to analyze, each given by result_id and shape_index")
@@ -0,0 +1,157 @@
+# Persistent script_runner.py processes, one per workspace environment
+
+import os
+import struct
+import contextlib
+import threading
+import subprocess
+import weakref
+from typing import Dict, Any, Optional, Iterator
+
+from .state import log, workspace_runners
+from .serialization import dumps_bytes, loads
+
+# Same framing as script_runner.serve(): 4-byte big-endian length + JSON. The payload stays JSON
+# because the runner only has the stdlib in every workspace venv; this side encodes and
+# decodes it with the fastest installed codec (msgspec/orjson, see serialization.py)
+FRAME_HEADER = struct.Struct(">I")
+MAX_WORKSPACE_RUNNERS = 4 # Idle runner processes kept (each holds an imported CadQuery); least recently used is closed first.
+                          # Runners in use are never evicted, so while requests run there can briefly be more
+RUNNER_STOP_TIMEOUT = 5 # Seconds to wait for a runner to exit after closing its stdin
+
+_registry_lock = threading.Lock() # Guards state.workspace_runners and each runner's users/retired
+
+def _stop_process(process: subprocess.Popen) -> None:
+    """Closes a runner's stdin (ending its serve loop) and makes sure the process is gone."""
+    if process.poll() is not None: return
+    try: process.stdin.close()
+    except OSError: pass
+    try: process.wait(timeout=RUNNER_STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill(); process.wait()
+
+class WorkspaceRunner:
+    """
+    A long-lived 'script_runner.py --serve' process for one workspace venv.
+
+    CadQuery is imported once when the process starts; every run() after that only
+    pays for the script itself. Requests are serialized by a per-runner lock.
+    A runner that dies is restarted on the next run().
+
+    Runners are handed out by workspace_runner(), which pins them (users > 0) while a
+    request runs. A runner removed from the registry while pinned is marked retired and
+    closed by its last user, so no process outlives the registry.
+    """
+    def __init__(self, python_exe: str, script_runner_path: str, workspace_path: str, env_version: Any = None):
+        self.python_exe = python_exe
+        self.script_runner_path = script_runner_path
+        self.workspace_path = workspace_path
+        self.env_version = env_version # Changes when the venv is (re)installed; see workspace_runner
+        self.lock = threading.Lock()
+        self.process: Optional[subprocess.Popen] = None
+        self._finalizer: Optional[weakref.finalize] = None
+        self.users = 0 # Requests currently holding this runner
+        self.retired = False # Removed from the registry; closed once users drops to 0
+
+    def _start(self) -> None:
+        cmd = [self.python_exe, self.script_runner_path, "--serve"]
+        log.info(f"Starting persistent script runner: {' '.join(cmd)}")
+        sub_env = {**os.environ, "COVERAGE_RUN_SUBPROCESS": "1"}
+        # stderr is inherited: runner logs go straight to the server's stderr and can never fill a pipe
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=sub_env, cwd=self.workspace_path)
+        # Terminates the child if the runner is garbage collected or the interpreter exits
+        self._finalizer = weakref.finalize(self, _stop_process, self.process)
+
+    def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Sends one request (as for script_runner.py's stdin) and returns the runner's result dict."""
+        with self.lock:
+            if self.process is None or self.process.poll() is not None: self._start()
+            try:
+                payload = dumps_bytes(request)
+                self.process.stdin.write(FRAME_HEADER.pack(len(payload)) + payload)
+                self.process.stdin.flush()
+                header = self.process.stdout.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size: raise EOFError("runner exited before replying")
+                (size,) = FRAME_HEADER.unpack(header)
+                response = self.process.stdout.read(size)
+                if len(response) < size: raise EOFError("runner reply was cut short")
+                return loads(response)
+            except (OSError, EOFError, ValueError) as e:
+                returncode = self.process.poll()
+                self._close_locked()
+                raise RuntimeError(f"Persistent script runner failed (exit code {returncode}): {e}") from e
+
+    def _close_locked(self) -> None:
+        if self._finalizer is not None: self._finalizer() # Runs _stop_process once
+        self.process = None; self._finalizer = None
+
+    def close(self) -> None:
+        """Stops the runner process (a later run() starts a new one)."""
+        with self.lock: self._close_locked()
+
+def _close_in_background(runner: WorkspaceRunner) -> None:
+    """Closes a runner without making the calling request wait for the process to exit."""
+    threading.Thread(target=runner.close, name="runner-close", daemon=True).start()
+
+def _retire_locked(runner: WorkspaceRunner) -> None:
+    """Handles a runner just removed from the registry: closed now if idle, else by its last user."""
+    runner.retired = True
+    if runner.users == 0: _close_in_background(runner)
+
+def _trim_locked() -> None:
+    """Evicts least recently used idle runners until the registry is within MAX_WORKSPACE_RUNNERS."""
+    while len(workspace_runners) > MAX_WORKSPACE_RUNNERS:
+        idle_key = next((key for key, runner in workspace_runners.items() if runner.users == 0), None)
+        if idle_key is None: return # Everything is in use; trimmed again as runners are released
+        _retire_locked(workspace_runners.pop(idle_key))
+
+def _checkout(workspace_path: str, python_exe: str, script_runner_path: str, env_version: Any) -> WorkspaceRunner:
+    with _registry_lock:
+        # Slots are per workspace venv: take the first idle runner, or start one in a new slot
+        slot = 0
+        while True:
+            key = (workspace_path, python_exe, slot)
+            runner = workspace_runners.get(key)
+            if runner is not None and runner.env_version != env_version:
+                _retire_locked(workspace_runners.pop(key)); runner = None
+            if runner is None:
+                runner = workspace_runners[key] = WorkspaceRunner(python_exe, script_runner_path, workspace_path, env_version)
+                break
+            if runner.users == 0: break
+            slot += 1
+        runner.users += 1
+        workspace_runners.move_to_end(key)
+        _trim_locked()
+        return runner
+
+def _checkin(runner: WorkspaceRunner) -> None:
+    with _registry_lock:
+        runner.users -= 1
+        if runner.users: return
+        if runner.retired: _close_in_background(runner)
+        else: _trim_locked()
+
+@contextlib.contextmanager
+def workspace_runner(workspace_path: str, python_exe: str, script_runner_path: str, env_version: Any = None) -> Iterator[WorkspaceRunner]:
+    """
+    Yields an idle persistent runner for a workspace venv, pinned for the duration of the block.
+    Concurrent callers (within one request or across requests) each get their own runner process.
+
+    A runner whose env_version differs from the given one (the venv was reinstalled
+    since it started) is replaced, so newly installed packages are imported fresh.
+    """
+    runner = _checkout(workspace_path, python_exe, script_runner_path, env_version)
+    try: yield runner
+    finally: _checkin(runner)
+
+def close_workspace_runners(workspace_path: Optional[str] = None) -> None:
+    """
+    Stops the runners of one workspace (all venvs), or every runner if workspace_path is None.
+    Runners still in use are removed from the registry now and stopped when their request ends.
+    """
+    with _registry_lock:
+        keys = [key for key in workspace_runners if workspace_path is None or key[0] == workspace_path]
+        runners = [workspace_runners.pop(key) for key in keys]
+        for runner in runners: runner.retired = True
+        idle_runners = [runner for runner in runners if runner.users == 0]
+    for runner in idle_runners: runner.close()
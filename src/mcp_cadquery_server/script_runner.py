@@ -20,14 +20,20 @@ Reads input configuration (script, params, workspace path) from stdin as JSON.
 Adds <workspace_path>/modules to sys.path.
 Executes the script using cadquery.cqgi.
 Prints the serialized BuildResult (or error info) as JSON to stdout.
+
+With --serve the runner stays alive and handles one request per frame: a 4-byte
+big-endian length followed by that many bytes of JSON, answered the same way.
+CadQuery is then imported once for all requests instead of once per execution.
 """
 
 import sys
 import os
 import json
+import importlib
 import traceback
 import logging
 import re
+import struct
 import time # Import the time module
 from typing import Dict, Any, List, Optional
 
@@ -42,20 +48,44 @@ log = logging.getLogger(__name__)
 
 # Parameter substitution is handled by the calling process (server.py)
 
+# Results are serialized with orjson when the workspace venv has it (the runner must also
+# work with only the stdlib installed); it is several times faster than json for large
+# results. Requests (mostly one script string) are still parsed by json, whose error
+# messages are reported back to the caller.
+try: import orjson
+except ImportError: orjson = None
+
+def _dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serializes obj to UTF-8 JSON bytes, compact or indented by 2 spaces. Falls back to the
+    json module for values orjson rejects (e.g. integers wider than 64 bits).
+    """
+    if orjson is not None:
+        try: return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError: pass # orjson.JSONEncodeError
+    return (json.dumps(obj, indent=2) if indent else json.dumps(obj, separators=(",", ":"))).encode("utf-8")
+
 # --- Main Execution ---
-def run():
-    log.info("Script runner started.")
+FRAME_HEADER = struct.Struct(">I") # Length prefix of each --serve request/response frame
+
+def _forget_workspace_modules(workspace_path: str) -> None:
+    """
+    Drops modules imported from the workspace (e.g. <workspace>/modules) so a persistent
+    runner picks up edits to them; packages installed in the venv stay imported.
+    """
+    workspace_prefix = os.path.join(os.path.abspath(workspace_path), "")
+    venv_prefix = os.path.join(os.path.abspath(sys.prefix), "")
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, "__file__", None)
+        if module_file and module_file.startswith(workspace_prefix) and not module_file.startswith(venv_prefix):
+            del sys.modules[name]
+    importlib.invalidate_caches() # Let the path finders see workspace files added since the last request
+
+def execute_request(input_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Executes one runner request (script, parameters, workspace, result ID) and returns the result dict."""
     output_result = {"success": False, "results": [], "exception_str": None}
 
     try:
-        # 1. Read input from stdin
-        log.info("Reading input JSON from stdin...")
-        input_data_str = sys.stdin.read()
-        log.debug(f"Received stdin data: {input_data_str[:200]}...")
-        if not input_data_str:
-            raise ValueError("No input data received from stdin.")
-        input_data = json.loads(input_data_str)
-
         workspace_path = input_data.get("workspace_path")
         script_content = input_data.get("script_content")
         parameters = input_data.get("parameters", {})
@@ -77,7 +107,7 @@ def run():
         modules_dir = os.path.join(workspace_path, "modules")
         if os.path.isdir(modules_dir):
             log.info(f"Adding modules directory to sys.path: {modules_dir}")
-            sys.path.insert(0, modules_dir) # Add to front to prioritize workspace modules
+            if modules_dir not in sys.path: sys.path.insert(0, modules_dir) # Add to front to prioritize workspace modules
         else:
             log.info(f"Modules directory not found, skipping sys.path modification: {modules_dir}")
 
@@ -174,11 +204,80 @@ def run():
         # Format exception for JSON output
         output_result["exception_str"] = "".join(traceback.format_exception(type(e), e, e.__traceback__))
 
+    return output_result
+
+def _read_exact(stream, size: int) -> Optional[bytes]:
+    """Reads exactly size bytes, or returns None at end of stream."""
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk: return None
+        data += chunk
+    return data
+
+def serve():
+    """Handles framed requests from stdin until it is closed (persistent runner mode)."""
+    # Frames use private copies of fds 0/1. The real stdin/stdout are pointed elsewhere so
+    # script prints (including C-level writes from OCP) cannot corrupt the frame stream.
+    frame_in = os.fdopen(os.dup(0), "rb")
+    frame_out = os.fdopen(os.dup(1), "wb")
+    devnull_fd = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull_fd, 0); os.close(devnull_fd)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    log.info("Script runner serving requests.")
+
+    while True:
+        header = _read_exact(frame_in, FRAME_HEADER.size)
+        if header is None: break
+        payload = _read_exact(frame_in, FRAME_HEADER.unpack(header)[0])
+        if payload is None: break
+        try:
+            input_data = json.loads(payload)
+            if not isinstance(input_data, dict): raise ValueError("Runner request must be a JSON object.")
+            if input_data.get("workspace_path"): _forget_workspace_modules(input_data["workspace_path"])
+            output_result = execute_request(input_data)
+        except BaseException as e: # SystemExit from a script must not end the runner
+            if isinstance(e, KeyboardInterrupt): raise
+            log.exception("Error handling runner request.")
+            output_result = {"success": False, "results": [], "exception_str": "".join(traceback.format_exception(type(e), e, e.__traceback__))}
+        try: response = _dumps_bytes(output_result) # Compact: the frame is not read by humans
+        except Exception as json_err:
+            log.exception("Failed to serialize result to JSON.")
+            response = json.dumps({"success": False, "results": [], "exception_str": f"JSON serialization error: {json_err}\nOriginal error: {output_result.get('exception_str', 'Unknown')}"}).encode("utf-8")
+        frame_out.write(FRAME_HEADER.pack(len(response)) + response)
+        frame_out.flush()
+    log.info("Runner input closed, exiting.")
+
+def run():
+    log.info("Script runner started.")
+    output_result = {"success": False, "results": [], "exception_str": None}
+
+    try:
+        # 1. Read input from stdin
+        log.info("Reading input JSON from stdin...")
+        # Raw bytes go straight to the JSON decoder, without a decoded str copy of the whole payload
+        input_bytes = sys.stdin.buffer.read()
+        if not input_bytes:
+            raise ValueError("No input data received from stdin.")
+        input_data = json.loads(input_bytes)
+        del input_bytes # Only the parsed request is kept for the (possibly long) execution
+        if log.isEnabledFor(logging.DEBUG) and isinstance(input_data, dict): log.debug("Received script (first 200 chars): %s...", str(input_data.get("script_content", ""))[:200])
+        output_result = execute_request(input_data)
+
+    except Exception as e:
+        log.exception("Error during script execution in runner.") # Log full traceback to stderr
+        output_result["success"] = False
+        # Format exception for JSON output
+        output_result["exception_str"] = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+
     # 6. Print JSON result to stdout
     log.info("Execution finished. Printing JSON result to stdout.")
     try:
-        json_output = json.dumps(output_result, indent=2)
-        print(json_output)
+        json_output = _dumps_bytes(output_result, indent=True)
+        sys.stdout.flush() # Anything already printed through the text layer goes first
+        sys.stdout.buffer.write(json_output + b"\n")
+        sys.stdout.buffer.flush()
     except Exception as json_err:
          # Fallback if JSON serialization fails
          log.exception("Failed to serialize result to JSON.")
@@ -186,4 +285,5 @@ def run():
          print(fallback_output)
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    if "--serve" in sys.argv[1:]: serve()
+    else: run()
\ No newline at end of file
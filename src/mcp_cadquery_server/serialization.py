@@ -0,0 +1,54 @@
+import json
+from typing import Any, Union
+
+# msgspec and orjson are optional: both encode several times faster than the stdlib
+# json module (msgspec fastest), but everything works (identically) without them.
+try:
+    import msgspec
+    _msgspec_encoder = msgspec.json.Encoder() # Reusable encoder, avoids per-call setup
+    _msgspec_decoder = msgspec.json.Decoder()
+    _MSGSPEC_ERRORS = (TypeError, OverflowError, msgspec.EncodeError)
+except ImportError:
+    msgspec = None
+    _msgspec_encoder = None
+    _msgspec_decoder = None
+    _MSGSPEC_ERRORS = ()
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    Serializes an object to compact UTF-8 encoded JSON bytes.
+
+    Uses msgspec or orjson when installed, falling back to the next encoder (and
+    finally the stdlib json module) for objects a faster encoder cannot handle
+    (e.g. integers wider than 64 bits).
+    """
+    if _msgspec_encoder is not None:
+        try:
+            return _msgspec_encoder.encode(obj)
+        except _MSGSPEC_ERRORS:
+            pass
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError: # orjson.JSONEncodeError subclasses TypeError
+            pass
+    return json.dumps(obj, separators=(",", ":")).encode('utf-8')
+
+def dumps_compact(obj: Any) -> str:
+    """Serializes an object to compact JSON (no whitespace between separators), see dumps_bytes."""
+    return dumps_bytes(obj).decode('utf-8')
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Parses JSON from bytes or str with the fastest available decoder.
+
+    Raises:
+        ValueError: If the data is not valid JSON (all decoders raise a ValueError subclass).
+    """
+    if _msgspec_decoder is not None: return _msgspec_decoder.decode(data)
+    if orjson is not None: return orjson.loads(data)
+    return json.loads(data)
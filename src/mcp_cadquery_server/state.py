@@ -2,8 +2,8 @@ import logging
 import sys
 import os
 import asyncio
-from typing import Dict, Any, List, Optional
-from cadquery import cqgi # For type hint
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set, Tuple
 
 # --- Logging Setup (Application Level) ---
 # Configure logging early
@@ -15,10 +15,39 @@ logging.basicConfig(
 )
 log = logging.getLogger("mcp_cadquery_server") # Use a consistent logger name
 
+class VersionedDict(dict):
+    """
+    A dict whose 'version' is bumped by every mutation, so caches derived from its contents
+    can tell they are stale however it was changed (by the scan, a test, or anything else).
+    """
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key: Any, value: Any) -> None: super().__setitem__(key, value); self.version += 1
+    def __delitem__(self, key: Any) -> None: super().__delitem__(key); self.version += 1
+    def __ior__(self, other: Any) -> "VersionedDict": self.update(other); return self
+    def pop(self, *args: Any) -> Any: self.version += 1; return super().pop(*args)
+    def popitem(self) -> Tuple[Any, Any]: self.version += 1; return super().popitem()
+    def clear(self) -> None: super().clear(); self.version += 1
+    def update(self, *args: Any, **kwargs: Any) -> None: super().update(*args, **kwargs); self.version += 1
+    def setdefault(self, key: Any, default: Any = None) -> Any: self.version += 1; return super().setdefault(key, default)
+
 # --- Global State ---
 shape_results: Dict[str, Dict[str, Any]] = {} # Store result dicts from script_runner
-part_index: Dict[str, Dict[str, Any]] = {} # Index for scanned parts
+part_index: "VersionedDict" = VersionedDict() # Index for scanned parts (part ID -> part data); its version keys cached search results
+part_token_index: Dict[str, Set[str]] = {} # Inverted index for search: token -> part IDs
+part_tokens: Dict[str, Set[str]] = {} # Tokens registered per part ID (for removal from part_token_index)
+# Lowercased (id, part, description, filename, newline-joined tags) per part ID, precomputed for search scoring
+part_search_fields: Dict[str, Tuple[str, str, str, str, str]] = {}
+part_search_sources: Dict[str, Dict[str, Any]] = {} # Part ID -> the part_index entry its search fields/tokens were built from
 sse_connections: List[asyncio.Queue] = [] # List of active SSE client queues
+tool_result_outbox: "OrderedDict[str, Dict[str, Any]]" = OrderedDict() # Final tool_result/tool_error per request ID (oldest evicted first)
+svg_preview_cache: Dict[str, str] = {} # (geometry fingerprint + SVG options) -> path of an already rendered preview
+svg_preview_keys: Dict[str, str] = {} # Preview path -> svg_preview_cache key of the render it holds (reverse of svg_preview_cache)
+# Part script content hash -> {"metadata", "preview_key", "svg" (rendered bytes), "svg_opts"} (least recently used first)
+part_content_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+workspace_runners: "OrderedDict[Tuple[str, str, int], Any]" = OrderedDict() # (workspace, venv python, slot) -> persistent WorkspaceRunner (least recently used first)
 
 # --- Global Path Configuration (Defaults & Placeholders) ---
 
@@ -1,62 +1,129 @@
 import asyncio
+import signal
 import sys
-import json
+import threading
 from typing import Dict, Any, Optional
 
 # Import necessary components from other modules
 from .state import log
 from .mcp_api import get_server_info, process_tool_request # Import process_tool_request
+from .serialization import dumps_bytes, loads
+
+STDIN_READ_SIZE = 65536 # Bytes requested from stdin per read
+
+def _write_stdio_message(message: dict) -> None:
+    """Writes one message to stdout as a JSON line, encoded straight to bytes."""
+    stdout = sys.stdout.buffer
+    stdout.write(dumps_bytes(message) + b"\n")
+    stdout.flush()
+
+# tool_error replies are filled into pre-encoded bytes; only the two strings need encoding
+_ERROR_TEMPLATE = b'{"type":"tool_error","request_id":%b,"error":%b}\n'
+
+def _write_stdio_error(request_id: Any, error: str) -> None:
+    """Writes a tool_error message to stdout without building and serializing a dict."""
+    stdout = sys.stdout.buffer
+    stdout.write(_ERROR_TEMPLATE % (dumps_bytes(request_id), dumps_bytes(error)))
+    stdout.flush()
+
+async def _send_stdio_message(message: dict) -> None:
+    """Async wrapper for _write_stdio_message, used to stream tool_progress updates."""
+    _write_stdio_message(message)
+
+async def _handle_stdio_line(line_bytes: bytes) -> None:
+    """Decodes one request line, processes it and writes the response (or a tool_error) to stdout."""
+    line_bytes = line_bytes.strip()
+    if not line_bytes: return
+    log.debug("Received stdio line: %r", line_bytes) # %-args are only formatted if debug is enabled
+    request_data: Optional[Dict[str, Any]] = None # Define request_data outside try for error handling scope
+    try:
+        # Decode the raw bytes directly; the decoders accept bytes, so no str round-trip
+        try: request_data = loads(line_bytes) # Assign here
+        except ValueError as e:
+            log.error(f"Failed to decode JSON from stdin: {e}"); _write_stdio_error("unknown", f"Invalid JSON received: {e}")
+            return
+        # Validate basic structure
+        # get() rejects a null tool_name/request_id as well as a missing one
+        if not isinstance(request_data, dict) or request_data.get("tool_name") is None or request_data.get("request_id") is None:
+            raise ValueError("Invalid MCP request format (missing tool_name or request_id)")
+
+        response = await process_tool_request(request_data, send_progress=_send_stdio_message) # Use imported function
+        if response: _write_stdio_message(response)
+    except BrokenPipeError: raise # Client closed stdout; let run_stdio_mode exit instead of writing an error reply
+    except ValueError as e: # Catch validation errors
+         log.error(f"Invalid request format: {e}")
+         req_id = request_data.get("request_id", "unknown") if isinstance(request_data, dict) else "unknown"
+         _write_stdio_error(req_id, f"Invalid request format: {e}")
+    except Exception as e:
+         log.error(f"Error processing stdio request: {e}", exc_info=True)
+         req_id = request_data.get("request_id", "unknown") if isinstance(request_data, dict) else "unknown"
+         _write_stdio_error(req_id, f"Internal server error: {e}")
+
+def _stdin_reader(loop: asyncio.AbstractEventLoop, chunk_queue: asyncio.Queue, stream) -> None:
+    """Reads stdin on a background thread and queues each chunk on the loop; b"" marks EOF."""
+    # read1 returns whatever is available (up to STDIN_READ_SIZE) without waiting to fill the buffer
+    read = getattr(stream, "read1", None) or (lambda _size: stream.readline())
+    try:
+        while True:
+            chunk = read(STDIN_READ_SIZE)
+            loop.call_soon_threadsafe(chunk_queue.put_nowait, chunk)
+            if not chunk: return
+    except RuntimeError: return # Event loop closed, nothing left to hand chunks to
+    except Exception as e:
+        log.error(f"Error reading stdin: {e}", exc_info=True)
+        try: loop.call_soon_threadsafe(chunk_queue.put_nowait, b"") # Treat as EOF so the loop exits
+        except RuntimeError: pass
 
 async def run_stdio_mode() -> None:
     """Runs the server in MCP stdio mode, reading JSON requests from stdin."""
     log.info("Starting server in Stdio mode. Reading from stdin...")
 
+    # A write to a closed stdout pipe should end the process right away (as for any CLI filter)
+    # rather than raise BrokenPipeError and go through traceback logging for every request
+    if hasattr(signal, "SIGPIPE"): signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+    loop = asyncio.get_running_loop()
+    chunk_queue: asyncio.Queue = asyncio.Queue()
+    # SIGTERM queues a None sentinel so the loop stops at the next message boundary
+    try: loop.add_signal_handler(signal.SIGTERM, chunk_queue.put_nowait, None)
+    except (NotImplementedError, RuntimeError, ValueError): pass # No loop signal handlers (e.g. Windows or not the main thread)
+
     # Send server_info once at the start for stdio mode
     try:
         server_info_message = get_server_info()
-        print(json.dumps(server_info_message), flush=True)
+        _write_stdio_message(server_info_message)
         log.info("Sent server_info via stdout for stdio mode.")
     except Exception as e:
         log.error(f"Failed to generate or send initial server_info in stdio mode: {e}")
         # Send an error message if possible
-        error_resp = {"type": "tool_error", "request_id": "server-init-fail", "error": f"Failed to send server_info: {e}"}
-        try: print(json.dumps(error_resp), flush=True)
+        try: _write_stdio_error("server-init-fail", f"Failed to send server_info: {e}")
         except: pass # Ignore if print fails
 
-    reader = asyncio.StreamReader()
-    protocol = asyncio.StreamReaderProtocol(reader)
-    loop = asyncio.get_event_loop()
+    # stdin is read by a dedicated thread doing blocking reads, which hands chunks to the loop
+    # through a queue; this avoids the pipe transport/selector round-trip per message
     try:
-        await loop.connect_read_pipe(lambda: protocol, sys.stdin)
+        threading.Thread(target=_stdin_reader, args=(loop, chunk_queue, sys.stdin.buffer), name="stdio-reader", daemon=True).start()
     except Exception as e:
-         log.error(f"Error connecting read pipe for stdin: {e}. Stdio mode may not work.", exc_info=True)
-         print(json.dumps({"type": "tool_error", "request_id": "stdio-init-fail", "error": f"Failed to connect stdin: {e}"}), flush=True)
+         log.error(f"Error starting stdin reader thread: {e}. Stdio mode may not work.", exc_info=True)
+         _write_stdio_error("stdio-init-fail", f"Failed to connect stdin: {e}")
          return # Cannot proceed without stdin
 
-    request_data: Optional[Dict[str, Any]] = None # Define request_data outside loop for error handling scope
+    buffer = bytearray() # Bytes received after the last complete line
     while True:
         try:
-            line_bytes = await reader.readline()
-            if not line_bytes: break # EOF
-            line = line_bytes.decode('utf-8').strip()
-            if not line: continue
-            log.debug(f"Received stdio line: {line}")
-            request_data = json.loads(line) # Assign here
-            # Validate basic structure
-            if not isinstance(request_data, dict) or "tool_name" not in request_data or "request_id" not in request_data:
-                raise ValueError("Invalid MCP request format (missing tool_name or request_id)")
-
-            response = process_tool_request(request_data) # Use imported function
-            if response: print(json.dumps(response), flush=True)
-        except json.JSONDecodeError as e:
-            log.error(f"Failed to decode JSON from stdin: {e}"); error_resp = {"type": "tool_error", "request_id": "unknown", "error": f"Invalid JSON received: {e}"}; print(json.dumps(error_resp), flush=True)
-        except ValueError as e: # Catch validation errors
-             log.error(f"Invalid request format: {e}")
-             req_id = request_data.get("request_id", "unknown") if isinstance(request_data, dict) else "unknown"
-             error_resp = {"type": "tool_error", "request_id": req_id, "error": f"Invalid request format: {e}"}; print(json.dumps(error_resp), flush=True)
-        except Exception as e:
-             log.error(f"Error processing stdio request: {e}", exc_info=True)
-             req_id = request_data.get("request_id", "unknown") if isinstance(request_data, dict) else "unknown"
-             error_resp = {"type": "tool_error", "request_id": req_id, "error": f"Internal server error: {e}"}; print(json.dumps(error_resp), flush=True)
+            # Each chunk is whatever the reader thread got (up to STDIN_READ_SIZE), not one line;
+            # pipelined requests are then handled from a single read, and lines have no length limit
+            chunk = await chunk_queue.get()
+            if chunk is None: log.info("SIGTERM received, exiting stdio mode."); break
+            if chunk:
+                if b"\n" not in chunk: buffer += chunk; continue
+                buffer += chunk
+                *lines, tail = buffer.split(b"\n")
+                buffer = bytearray(tail)
+            else: # EOF, handle a final line without a trailing newline
+                lines = [bytes(buffer)]; buffer.clear()
+            for line_bytes in lines:
+                await _handle_stdio_line(line_bytes)
+            if not chunk: break
         except KeyboardInterrupt: log.info("KeyboardInterrupt received, exiting stdio mode."); break
-        except Exception as e: log.error(f"Unexpected error in stdio loop: {e}", exc_info=True); await asyncio.sleep(1)
\ No newline at end of file
+        except BrokenPipeError: log.info("stdout closed, exiting stdio mode."); break
+        except Exception as e: log.error(f"Unexpected error in stdio loop: {e}", exc_info=True); await asyncio.sleep(1)
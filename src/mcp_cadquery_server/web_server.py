@@ -1,19 +1,54 @@
-import json
 import asyncio
 import os # Added import
-from typing import Optional, Dict, Any, Union # Added Union
-from fastapi import FastAPI, Request, HTTPException, Body
+import functools
+import mimetypes
+from typing import Optional, Dict, Any, Union, Tuple # Added Union
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import FileResponse, Response
 from fastapi.staticfiles import StaticFiles # Added import
 from sse_starlette.sse import EventSourceResponse
 
 # Import necessary components from other modules
-from .state import log, sse_connections # Import log and sse_connections from state
+from .state import log, sse_connections, tool_result_outbox # Import log and sse_connections from state
 from .mcp_api import get_server_info, process_tool_request # Import API functions
+from .serialization import dumps_compact, loads
 from . import state # Import state for default dir names
 
 app = FastAPI() # Define the app instance
 
+SSE_QUEUE_MAXSIZE = 256 # Frames buffered per SSE client before it is considered too slow and dropped
+TOOL_RESULT_OUTBOX_SIZE = 256 # Final results kept for GET /mcp/result/{request_id}
+
+def _encode_sse_frame(message: dict) -> str:
+    """Encodes a message dict once into the compact JSON frame sent to SSE clients."""
+    return dumps_compact(message)
+
+def _drop_sse_client(queue: asyncio.Queue) -> None:
+    """Removes a client queue from the fan-out list and tells its stream to close."""
+    if queue in sse_connections:
+        sse_connections.remove(queue)
+    # Discard the backlog so the None sentinel fits and the stream ends promptly
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(None)
+
+@functools.lru_cache(maxsize=4096)
+def _static_media_type(file_path: str) -> str:
+    """Media type served for a static file (depends only on its name, so it is cached per path)."""
+    return mimetypes.guess_type(file_path)[0] or "text/plain" # Same fallback as FileResponse
+
+def _resolve_static_file(static_dir: str, relative_path: str) -> Optional[Tuple[str, str]]:
+    """
+    Resolves a path inside the static directory to (file_path, media_type), or None if no such file exists.
+
+    The catch-all route runs on every SPA navigation and asset request, so the mimetype lookup
+    is cached per path. Whether the file exists is checked on every call (a single stat), so a
+    rebuilt or replaced frontend is picked up without restarting the server.
+    """
+    file_path = os.path.join(static_dir, relative_path)
+    if not os.path.isfile(file_path): return None
+    return file_path, _static_media_type(file_path)
+
 def configure_static_files(app_instance: FastAPI, static_dir: str, render_dir_name: str, render_dir_path: str, preview_dir_name: str, preview_dir_path: str, assets_dir_path: str) -> None:
     """
     Configures FastAPI static file serving for frontend, renders, and previews.
@@ -51,32 +86,32 @@ def configure_static_files(app_instance: FastAPI, static_dir: str, render_dir_na
         if ".." in full_path:
             state.log.warning(f"Attempted directory traversal: '{full_path}'")
             return HTTPException(status_code=404, detail="Not Found")
+        # API paths are never static files or SPA routes
+        if full_path.startswith("mcp/"):
+            return HTTPException(status_code=404, detail="Not Found")
 
-        # Construct potential path within the main static directory
-        file_path = os.path.join(static_dir, full_path)
-        state.log.debug(f"Checking for static file at: '{file_path}'")
-
-        # If the exact path is a file, serve it
-        if os.path.isfile(file_path):
-            state.log.debug(f"Serving static file: '{file_path}'")
-            return FileResponse(file_path)
+        # If the exact path is a file within the main static directory, serve it
+        resolved = _resolve_static_file(static_dir, full_path)
+        if resolved:
+            state.log.debug(f"Serving static file: '{resolved[0]}'")
+            return FileResponse(resolved[0], media_type=resolved[1])
 
         # If it's not a file, assume SPA routing and serve index.html
-        index_path = os.path.join(static_dir, "index.html")
-        state.log.debug(f"Path '{full_path}' not found as static file, checking for index.html at '{index_path}'")
-        if os.path.isfile(index_path):
-            state.log.debug(f"Serving index.html from: '{index_path}'")
-            return FileResponse(index_path)
+        state.log.debug(f"Path '{full_path}' not found as static file, checking for index.html in '{static_dir}'")
+        resolved = _resolve_static_file(static_dir, "index.html")
+        if resolved:
+            state.log.debug(f"Serving index.html from: '{resolved[0]}'")
+            return FileResponse(resolved[0], media_type=resolved[1])
         else:
             # If index.html doesn't exist either, return 404
-            state.log.warning(f"index.html not found at '{index_path}'")
+            state.log.warning(f"index.html not found in '{static_dir}'")
             return HTTPException(status_code=404, detail="Not Found")
 
 
 @app.get("/mcp")
 async def mcp_sse_endpoint(request: Request):
     """Handles SSE connections, sends initial server_info, and streams messages."""
-    queue: asyncio.Queue = asyncio.Queue()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_MAXSIZE) # Holds pre-encoded JSON frames
     sse_connections.append(queue)
     client_host = request.client.host if request.client else "unknown"
     log.info(f"New SSE connection from {client_host}. Total: {len(sse_connections)}")
@@ -84,7 +119,7 @@ async def mcp_sse_endpoint(request: Request):
     # Send server_info immediately upon connection
     server_info_message = get_server_info() # Use imported function
     try:
-        await queue.put(server_info_message)
+        queue.put_nowait(_encode_sse_frame(server_info_message))
         log.debug(f"Sent initial server_info to {client_host}")
     except Exception as e:
         log.error(f"Failed to send initial server_info to {client_host}: {e}")
@@ -93,12 +128,12 @@ async def mcp_sse_endpoint(request: Request):
     async def event_generator():
         try:
             while True:
-                message = await queue.get()
-                if message is None: # Sentinel value to close connection
+                frame = await queue.get()
+                if frame is None: # Sentinel value to close connection
                     log.info(f"Received None sentinel, closing SSE stream for {client_host}.")
                     break
-                log.debug(f"SSE sending to {client_host}: {json.dumps(message)}")
-                yield {"event": "mcp_message", "data": json.dumps(message)}
+                log.debug("SSE sending to %s: %s", client_host, frame)
+                yield {"event": "mcp_message", "data": frame} # Already JSON-encoded by the producer
                 queue.task_done()
         except asyncio.CancelledError:
             log.info(f"SSE connection from {client_host} cancelled/closed by client.")
@@ -112,8 +147,12 @@ async def mcp_sse_endpoint(request: Request):
     return EventSourceResponse(event_generator())
 
 @app.post("/mcp/execute")
-async def execute_tool_endpoint(request_body: dict = Body(...)) -> dict:
+async def execute_tool_endpoint(request: Request) -> Response:
     """Receives tool execution requests via POST and processes them asynchronously."""
+    # Decode the raw body directly instead of going through FastAPI's Body() parsing pipeline
+    try: request_body = loads(await request.body())
+    except ValueError as e: raise HTTPException(status_code=422, detail=f"Invalid JSON body: {e}")
+    if not isinstance(request_body, dict): raise HTTPException(status_code=422, detail="Request body must be a JSON object")
     request_id = request_body.get("request_id", "unknown")
     tool_name = request_body.get("tool_name")
     log.info(f"Received execution request via POST (ID: {request_id}, Tool: {tool_name})")
@@ -124,30 +163,50 @@ async def execute_tool_endpoint(request_body: dict = Body(...)) -> dict:
     # Run processing and SSE push in background
     asyncio.create_task(_process_and_push(request_body))
     # Return immediate acknowledgment
-    return {"status": "processing", "request_id": request_id}
+    return Response(content=dumps_compact({"status": "processing", "request_id": request_id}), media_type="application/json")
+
+@app.get("/mcp/result/{request_id}")
+async def get_tool_result_endpoint(request_id: str) -> dict:
+    """Returns the final tool_result/tool_error message for a request processed via POST /mcp/execute."""
+    message = tool_result_outbox.get(request_id)
+    if message is None:
+        raise HTTPException(status_code=404, detail=f"No result for request ID '{request_id}' (still processing, unknown or expired)")
+    return message
 
 async def push_sse_message(message_data: Optional[dict]) -> None:
-    """Pushes a message dictionary to all connected SSE clients."""
+    """
+    Pushes a message dictionary to all connected SSE clients.
+    The message is JSON-encoded once and the same frame is handed to every client
+    queue without awaiting; clients whose queue is full are dropped instead of
+    stalling the fan-out for everyone else.
+    """
     if not message_data:
         log.debug("push_sse_message called with None data, skipping.")
         return
-    log.info(f"Pushing message to {len(sse_connections)} SSE client(s): {json.dumps(message_data)}")
-    # Create a list of tasks to put messages onto queues
-    tasks = []
-    for queue in sse_connections:
-        tasks.append(asyncio.create_task(queue.put(message_data)))
-
-    # Wait for all tasks to complete (or handle exceptions)
-    if tasks:
+    frame = _encode_sse_frame(message_data)
+    log.info(f"Pushing message ID {message_data.get('request_id')} to {len(sse_connections)} SSE client(s).")
+    log.debug("SSE message payload: %s", frame) # Lazy, only formatted at debug level
+    for queue in list(sse_connections):
         try:
-            await asyncio.gather(*tasks)
-            log.debug(f"Successfully pushed message ID {message_data.get('request_id')} to all queues.")
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            log.warning(f"SSE client queue full ({SSE_QUEUE_MAXSIZE} pending frames), dropping slow client.")
+            _drop_sse_client(queue)
         except Exception as e:
             log.error(f"Error pushing message ID {message_data.get('request_id')} via SSE: {e}", exc_info=True)
 
+def _store_tool_result(message: dict) -> None:
+    """Keeps a final tool message so clients that missed it on SSE (e.g. dropped as slow) can fetch it."""
+    request_id = message.get("request_id")
+    if request_id is None: return
+    tool_result_outbox[request_id] = message
+    tool_result_outbox.move_to_end(request_id)
+    while len(tool_result_outbox) > TOOL_RESULT_OUTBOX_SIZE:
+        tool_result_outbox.popitem(last=False)
+
 async def _process_and_push(request: dict) -> None:
     """Helper to run processing and push result via SSE."""
-    # process_tool_request is synchronous, run it directly
-    message_to_push = process_tool_request(request) # Use imported function
+    message_to_push = await process_tool_request(request, send_progress=push_sse_message) # Use imported function
+    if message_to_push: _store_tool_result(message_to_push)
     # push_sse_message is asynchronous
     await push_sse_message(message_to_push)
\ No newline at end of file
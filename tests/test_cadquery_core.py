@@ -14,7 +14,16 @@ os.makedirs(TEST_OUTPUT_DIR, exist_ok=True)
 # Add project root to path to allow importing src
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.mcp_cadquery_server.core import get_shape_properties, get_shape_description
+from src.mcp_cadquery_server.core import get_shape_properties, get_shape_description, invalidate_shape_cache, get_shape_properties_batch
+from src.mcp_cadquery_server import core
+
+
+@pytest.fixture(autouse=True)
+def clear_shape_analysis_cache():
+    """Start every test with no cached shape analysis (the box fixture is shared)."""
+    core._shape_analysis_cache.clear()
+    yield
+    core._shape_analysis_cache.clear()
 
 
 @pytest.fixture(scope="module")
@@ -112,10 +121,10 @@ def test_get_shape_properties_boundingbox_exception(mock_bb, simple_box):
     assert properties['volume'] is not None # Other props should still calculate
     print("get_shape_properties BoundingBox exception test passed.")
 
-@patch('cadquery.Shape.Volume')
-def test_get_shape_properties_volume_exception(mock_volume, simple_box):
-    """Test exception handling during Volume calculation."""
-    mock_volume.side_effect = RuntimeError("Volume Error")
+@patch('src.mcp_cadquery_server.core._mass_properties')
+def test_get_shape_properties_volume_exception(mock_mass_props, simple_box):
+    """Test exception handling during Volume calculation (the shared mass-properties pass)."""
+    mock_mass_props.side_effect = RuntimeError("Volume Error")
     shape = simple_box.val()
     print("\nTesting get_shape_properties Volume exception...")
     properties = get_shape_properties(shape)
@@ -135,9 +144,10 @@ def test_get_shape_properties_area_exception(mock_area, simple_box):
     print("get_shape_properties Area exception test passed.")
 
 @patch('src.mcp_cadquery_server.core.log') # Patch log as well
+@patch('src.mcp_cadquery_server.core._mass_properties', side_effect=RuntimeError("Mass Properties Error"))
 @patch('cadquery.Shape.Center')
-def test_get_shape_properties_center_exception(mock_center, mock_log, simple_box): # Add mock_log
-    """Test exception handling during Center calculation."""
+def test_get_shape_properties_center_exception(mock_center, mock_mass_props, mock_log, simple_box): # Add mock_log
+    """Test exception handling during Center calculation (mass-properties pass and Center() fallback both fail)."""
     mock_center.side_effect = RuntimeError("Center Error")
     shape = simple_box.val()
     print("\nTesting get_shape_properties Center exception...")
@@ -150,6 +160,40 @@ def test_get_shape_properties_center_exception(mock_center, mock_log, simple_box
     # Check log warning was called
 
 
+def test_get_shape_properties_matches_cadquery_methods():
+    """Test that the shared mass-properties pass gives the same values as Volume()/Area()/Center() per shape type."""
+    box = cq.Workplane("XY").box(10, 20, 5)
+    for shape in [box.val(), box.faces(">Z").val(), box.edges().val(), box.vertices().val()]:
+        properties = get_shape_properties(shape)
+        center = shape.Center()
+        assert properties['center_of_mass'] == pytest.approx({'x': center.x, 'y': center.y, 'z': center.z})
+        assert properties['area'] == pytest.approx(shape.Area())
+        if shape.ShapeType() != "Vertex": assert properties['volume'] == pytest.approx(shape.Volume())
+        else: assert properties['volume'] is None # cq's Volume() raises for vertices
+
+
+def test_get_shape_properties_returns_copy_of_cached_result(simple_box):
+    """Test that modifying returned properties (including nested dicts) does not affect later calls."""
+    shape = simple_box.val()
+    properties = get_shape_properties(shape)
+    properties['volume'] = -1
+    properties['bounding_box']['center']['x'] = 99
+    properties['center_of_mass']['x'] = 99
+    cached = get_shape_properties(shape)
+    assert cached['volume'] == pytest.approx(1000)
+    assert cached['bounding_box']['center']['x'] == pytest.approx(0)
+    assert cached['center_of_mass']['x'] == pytest.approx(0)
+
+
+@pytest.mark.parametrize("serial", ["0", "1"])
+def test_get_shape_properties_batch_matches_serial(serial, monkeypatch):
+    """Test that batch property calls return per-shape results in input order, pooled or serial."""
+    monkeypatch.setenv("MCP_SERIAL_SHAPE_ANALYSIS", serial)
+    shapes = [cq.Workplane("XY").box(size, size, size).val() for size in (1, 2, 3)]
+    volumes = [props['volume'] for props in get_shape_properties_batch(shapes)]
+    assert volumes == pytest.approx([1.0, 8.0, 27.0])
+
+
 # --- Tests for get_shape_description ---
 
 def test_get_shape_description_workplane_success(simple_box):
@@ -182,7 +226,7 @@ def test_get_shape_description_invalid_type():
     assert "Object to describe is not a cq.Shape or cq.Workplane" in str(excinfo.value)
     print("get_shape_description invalid type test passed.")
 
-@patch('src.mcp_cadquery_server.core.get_shape_properties')
+@patch('src.mcp_cadquery_server.core._get_shape_properties_raw')
 def test_get_shape_description_missing_properties(mock_get_props, simple_box):
     """Test description generation when some properties are missing."""
     mock_get_props.return_value = {
@@ -202,7 +246,7 @@ def test_get_shape_description_missing_properties(mock_get_props, simple_box):
     assert "6 faces, 12 edges, and 8 vertices." in description # Counts should still work
     print("get_shape_description missing properties test passed.")
 
-@patch('src.mcp_cadquery_server.core.get_shape_properties')
+@patch('src.mcp_cadquery_server.core._get_shape_properties_raw')
 def test_get_shape_description_different_centers(mock_get_props, simple_box):
     """Test description when CoM differs from geometric center."""
     mock_get_props.return_value = {
@@ -223,7 +267,7 @@ def test_get_shape_description_different_centers(mock_get_props, simple_box):
     assert "center of mass is located at (1.000, 0.500, -0.100)." in description
 
 
-@patch('src.mcp_cadquery_server.core.get_shape_properties')
+@patch('src.mcp_cadquery_server.core._get_shape_properties_raw')
 @patch('cadquery.Shape.ShapeType') # Mock ShapeType as well
 def test_get_shape_description_volume_failed_solid(mock_shape_type, mock_get_props, simple_box):
     """Test description when volume fails for a solid."""
@@ -248,7 +292,7 @@ def test_get_shape_description_volume_failed_solid(mock_shape_type, mock_get_pro
     assert "Volume calculation failed, though it appears to be a solid." in description
     print("get_shape_description volume failure test passed.")
 
-@patch('src.mcp_cadquery_server.core.get_shape_properties')
+@patch('src.mcp_cadquery_server.core._get_shape_properties_raw')
 def test_get_shape_description_com_failed(mock_get_props, simple_box):
     """Test description when center of mass fails."""
     mock_get_props.return_value = {
@@ -271,6 +315,20 @@ def test_get_shape_description_com_failed(mock_get_props, simple_box):
     print("get_shape_description different centers test passed.")
 
 
+def test_get_shape_description_reuses_cached_analysis(simple_box):
+    """Test that a repeat description of the same shape skips the OCCT calls, until invalidated."""
+    shape = simple_box.val()
+    first = get_shape_description(shape)
+    with patch.object(cq.Shape, 'Faces', side_effect=AssertionError("recomputed")), \
+         patch.object(cq.Shape, 'Volume', side_effect=AssertionError("recomputed")), \
+         patch.object(cq.Shape, 'ShapeType', side_effect=AssertionError("recomputed")):
+        assert get_shape_description(shape) == first
+        assert get_shape_properties(cq.Shape.cast(shape.wrapped))['volume'] == pytest.approx(1000.0) # Same geometry, new wrapper
+    invalidate_shape_cache(shape)
+    with patch.object(cq.Shape, 'Faces', side_effect=RuntimeError("Faces Error")):
+        assert "Could not determine the count of faces" in get_shape_description(shape)
+
+
 @patch.object(cq.Shape, 'Faces', side_effect=RuntimeError("Faces Error"))
 def test_get_shape_description_faces_exception(mock_faces, simple_box):
     """Test exception handling during Faces() call."""
@@ -305,7 +363,7 @@ def test_get_shape_description_vertices_exception(mock_vertices, simple_box):
 
 
 @patch('src.mcp_cadquery_server.core.log') # Patch logging
-@patch('src.mcp_cadquery_server.core.get_shape_properties') # Patch the first major call
+@patch('src.mcp_cadquery_server.core._get_shape_properties_raw') # Patch the first major call
 def test_get_shape_description_generic_exception(mock_get_props, mock_log, simple_box):
     """Test the final generic exception handler in get_shape_description."""
     mock_get_props.side_effect = ValueError("Unexpected Description Error")
@@ -338,3 +396,14 @@ def test_get_shape_properties_generic_exception(mock_log_info, simple_box): # Re
     assert "Unexpected Core Error" in str(excinfo.value)
     # Logging check removed for simplicity, focus on raising the exception
     print("get_shape_properties generic exception test passed.")
+
+def test_build_script_brep_bytes():
+    """Test building a script to BREP bytes for the part process pool, including empty and failed builds."""
+    import io
+    brep_bytes, error = core.build_script_brep_bytes("import cadquery as cq\nshow_object(cq.Workplane('XY').box(1, 2, 3))")
+    assert error is None
+    assert cq.Shape.importBrep(io.BytesIO(brep_bytes)).Volume() == pytest.approx(6.0)
+    assert core.build_script_brep_bytes("x = 1") == (None, None)
+    brep_bytes, error = core.build_script_brep_bytes("raise ValueError('boom')")
+    assert brep_bytes is None and "boom" in error
+    with pytest.raises(SyntaxError): core.build_script_brep_bytes("def broken(:")
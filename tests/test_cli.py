@@ -2,6 +2,9 @@ import pytest
 import os
 import sys
 import subprocess # Use subprocess to run the script
+from unittest.mock import patch
+
+from src.mcp_cadquery_server import cli as cli_module
 
 
 
@@ -96,4 +99,12 @@ def test_cli_default_invocation_help():
     assert "--part-library-dir" not in result.stdout
     print("CLI --mode sse (default) --help test passed.")
 
+
+def test_uvicorn_fast_options_fall_back_when_missing():
+    """uvloop/httptools are selected only when importable."""
+    with patch.object(cli_module.importlib.util, "find_spec", return_value=object()):
+        assert cli_module._uvicorn_fast_options() == {"loop": "uvloop", "http": "httptools"}
+    with patch.object(cli_module.importlib.util, "find_spec", return_value=None):
+        assert cli_module._uvicorn_fast_options() == {}
+
 # TODO: Add more specific CLI tests if needed, e.g., passing invalid args
\ No newline at end of file
@@ -1,6 +1,7 @@
 import pytest
 import os
 import sys
+import ast
 from typing import Dict, Any, List, Optional
 
 # Add project root to path to allow importing src
@@ -8,6 +9,8 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from src.mcp_cadquery_server.core import (
     parse_docstring_metadata,
+    extract_module_docstring,
+    ensure_dir,
     _substitute_parameters
 )
 
@@ -107,6 +110,43 @@ def test_parse_metadata_no_valid_lines():
     """
     assert parse_docstring_metadata(docstring) == {}
 
+def test_parse_metadata_cached_result_is_not_shared():
+    docstring = "Part: Cached\nTags: a, b"
+    first = parse_docstring_metadata(docstring)
+    first["filename"] = "cached.py"
+    first["tags"].append("mutated")
+    assert parse_docstring_metadata(docstring) == {"part": "Cached", "tags": ["a", "b"]}
+
+def test_parse_metadata_multi_word_keys():
+    # Only 'Part Name' is recognised among multi-word keys; other multi-word keys are ignored
+    docstring = "Part Name: Bracket\nMounting Holes: 4\nMaterial: Steel"
+    assert parse_docstring_metadata(docstring) == {"part_name": "Bracket", "material": "Steel"}
+
+def test_core_defines_each_function_once():
+    # Guards against a duplicated block of definitions silently shadowing the first copy
+    import src.mcp_cadquery_server.core as core_module
+    with open(core_module.__file__, "r", encoding="utf-8") as f: tree = ast.parse(f.read())
+    names = [node.name for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))]
+    assert len(names) == len(set(names)), sorted(n for n in set(names) if names.count(n) > 1)
+
+# --- Tests for extract_module_docstring ---
+
+@pytest.mark.parametrize("source", [
+    '"""Part: Box\nTags: a, b\n"""\nimport cadquery as cq\n',
+    "#!/usr/bin/env python\n# -*- coding: utf-8 -*-\n\n'''\n    Indented\n    docstring\n'''\nx = 1\n",
+    'r"""Raw docstring"""  # trailing comment\nx = 1',
+    '"""Escapes \\t and \\n"""\n',
+    '"Single quoted docstring"\nx = 1\n',
+    '"""Not a docstring""" + "x"\n',
+    'b"""Bytes are not docstrings"""\n',
+    '\r\n"""CRLF\r\nsource"""\r\nx = 1\r\n',
+    'import cadquery as cq\n"""Too late to be a docstring"""\n',
+    'u = 1\n',
+    '',
+])
+def test_extract_module_docstring_matches_ast(source):
+    assert extract_module_docstring(source) == ast.get_docstring(ast.parse(source))
+
 # --- Tests for _substitute_parameters ---
 
 def test_substitute_basic():
@@ -125,7 +165,7 @@ def test_substitute_basic():
         "height = 2",
         "result = cq.Workplane('XY').box(length, width, height)"
     ]
-    assert _substitute_parameters(script_lines, params) == expected_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(expected_lines)
 
 def test_substitute_string_param():
     script_lines = [
@@ -137,7 +177,7 @@ def test_substitute_string_param():
         "text = 'new_value' # PARAM (Substituted)",
         "print(text)"
     ]
-    assert _substitute_parameters(script_lines, params) == expected_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(expected_lines)
 
 def test_substitute_boolean_param():
     script_lines = [
@@ -149,7 +189,7 @@ def test_substitute_boolean_param():
         "flag = True # PARAM (Substituted)",
         "if flag: pass"
     ]
-    assert _substitute_parameters(script_lines, params) == expected_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(expected_lines)
 
 def test_substitute_list_param():
     script_lines = [
@@ -161,7 +201,7 @@ def test_substitute_list_param():
         "points = [10, 20, 30] # PARAM (Substituted)",
         "print(points)"
     ]
-    assert _substitute_parameters(script_lines, params) == expected_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(expected_lines)
 
 def test_substitute_dict_param():
     script_lines = [
@@ -170,7 +210,7 @@ def test_substitute_dict_param():
     ]
     params = {"config": {"b": 2, "c": "hello"}}
     # Note: dict repr might have different key order
-    result_lines = _substitute_parameters(script_lines, params)
+    result_lines = _substitute_parameters("\n".join(script_lines), params).split("\n")
     assert result_lines[0].startswith("config = {") and "'b': 2" in result_lines[0] and "'c': 'hello'" in result_lines[0] and result_lines[0].endswith("# PARAM (Substituted)")
     assert result_lines[1] == "print(config)"
 
@@ -182,7 +222,7 @@ def test_substitute_no_marker():
     ]
     params = {"length": 99}
     # Expect no change
-    assert _substitute_parameters(script_lines, params) == script_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(script_lines)
 
 def test_substitute_param_not_provided():
     script_lines = [
@@ -196,7 +236,7 @@ def test_substitute_param_not_provided():
         "width = 5 # PARAM", # Should remain unchanged
         "result = cq.Workplane('XY').box(length, width, 2)"
     ]
-    assert _substitute_parameters(script_lines, params) == expected_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(expected_lines)
 
 def test_substitute_extra_param_provided():
     script_lines = [
@@ -209,7 +249,7 @@ def test_substitute_extra_param_provided():
         "result = cq.Workplane('XY').box(length, 5, 2)"
     ]
     # Expect unused param to be ignored
-    assert _substitute_parameters(script_lines, params) == expected_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(expected_lines)
 
 def test_substitute_with_indentation():
     script_lines = [
@@ -223,7 +263,7 @@ def test_substitute_with_indentation():
         "    val = 100 # PARAM (Substituted)",
         "    print(val)"
     ]
-    assert _substitute_parameters(script_lines, params) == expected_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(expected_lines)
 
 def test_substitute_empty_params():
     script_lines = [
@@ -232,12 +272,17 @@ def test_substitute_empty_params():
     ]
     params = {}
     # Expect no change
-    assert _substitute_parameters(script_lines, params) == script_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(script_lines)
 
 def test_substitute_empty_script():
-    script_lines = []
     params = {"a": 1}
-    assert _substitute_parameters(script_lines, params) == []
+    assert _substitute_parameters("", params) == ""
+
+def test_substitute_preserves_blank_lines_and_trailing_newline():
+    script = "a = 1 # PARAM\n\n  b = 2 # PARAM  \n\nprint(a, b)\n"
+    params = {"a": 5, "b": 6}
+    expected = "a = 5 # PARAM (Substituted)\n\n  b = 6 # PARAM (Substituted)\n\nprint(a, b)\n"
+    assert _substitute_parameters(script, params) == expected
 
 
 # Custom class for testing fallback substitution
@@ -262,4 +307,27 @@ def test_substitute_unsupported_type_fallback():
         "value = CustomStr(test_data) # PARAM (Substituted)", # Should use str()
         "print(value)"
     ]
-    assert _substitute_parameters(script_lines, params) == expected_lines
+    assert _substitute_parameters("\n".join(script_lines), params) == "\n".join(expected_lines)
+
+# --- Tests for ensure_dir ---
+
+def test_ensure_dir_creates_once(tmp_path, monkeypatch):
+    from src.mcp_cadquery_server import core
+    target = str(tmp_path / "a" / "b")
+    ensure_dir(target)
+    assert os.path.isdir(target)
+    monkeypatch.setattr(core.os, "makedirs", lambda *a, **kw: pytest.fail("makedirs called for a known directory"))
+    ensure_dir(target) # Cached, no syscall
+    ensure_dir("") # Empty dirname (file in cwd) is a no-op
+
+# --- Tests for deferred CadQuery import ---
+
+def test_server_modules_import_without_cadquery():
+    """Importing the server stack must not load cadquery/OCCT; it is imported on first geometry use."""
+    import subprocess
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    code = ("import sys; import src.mcp_cadquery_server.web_server, src.mcp_cadquery_server.cli; "
+            "assert 'cadquery' not in sys.modules, 'cadquery imported eagerly'; "
+            "import src.mcp_cadquery_server.core as core; assert core.cqgi.__name__ == 'cadquery.cqgi'")
+    result = subprocess.run([sys.executable, "-c", code], cwd=project_root, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -1,6 +1,7 @@
 import subprocess
 import sys
 import os
+import asyncio
 import pytest
 
 VENV_DIR = ".venv-cadquery"
@@ -16,11 +17,23 @@ from pathlib import Path # Import Path
 # Import directly from the correct module
 from src.mcp_cadquery_server.env_setup import (
     prepare_workspace_env,
+    prepare_workspace_envs,
     _run_command_helper,
     workspace_reqs_mtime_cache,
+    UV_PIP_INSTALL_FLAGS,
+    ENV_STAMP_FILE,
     PYTHON_VERSION as ENV_SETUP_PYTHON_VERSION # Import with alias if needed locally
 )
 from src.mcp_cadquery_server import state # Import state for defaults if needed
+from src.mcp_cadquery_server import env_setup
+
+
+@pytest.fixture(autouse=True)
+def reset_uv_path_cache():
+    """Each test mocks shutil.which itself, so forget any uv path cached by an earlier test."""
+    env_setup._uv_path = None
+    yield
+    env_setup._uv_path = None
 
 
 # Note: Environment setup is now handled by prepare_workspace_env per workspace.
@@ -110,7 +123,7 @@ def test_prepare_workspace_env_creation(mock_which, mock_run_helper, tmp_path):
 
     # Check that _run_command_helper was called for venv creation and cadquery install
     expected_venv_call = call(["uv", "venv", str(venv_dir), "-p", ENV_SETUP_PYTHON_VERSION], log_prefix=f"WorkspaceEnv({workspace_path.name})")
-    expected_cq_install_call = call(["uv", "pip", "install", "cadquery", "--python", str(expected_python_exe)], log_prefix=f"WorkspaceEnv({workspace_path.name})")
+    expected_cq_install_call = call(["uv", "pip", "install", "cadquery", "--python", str(expected_python_exe), *UV_PIP_INSTALL_FLAGS], log_prefix=f"WorkspaceEnv({workspace_path.name})")
 
     # Check calls - order might vary slightly depending on implementation details, focus on presence
     mock_run_helper.assert_has_calls([expected_venv_call, expected_cq_install_call], any_order=False) # Ensure venv before install
@@ -166,7 +179,7 @@ def test_prepare_workspace_env_existing_venv(mock_which, mock_run_helper, tmp_pa
     mock_which.assert_called_once_with("uv")
 
     # Check that only the cadquery install command was run
-    expected_cq_install_call = call(["uv", "pip", "install", "cadquery", "--python", str(expected_python_exe)], log_prefix=f"WorkspaceEnv({workspace_path.name})")
+    expected_cq_install_call = call(["uv", "pip", "install", "cadquery", "--python", str(expected_python_exe), *UV_PIP_INSTALL_FLAGS], log_prefix=f"WorkspaceEnv({workspace_path.name})")
     mock_run_helper.assert_called_once_with(*expected_cq_install_call.args, **expected_cq_install_call.kwargs)
 
     # Ensure venv creation wasn't called
@@ -206,7 +219,7 @@ def test_prepare_workspace_env_with_requirements(mock_which, mock_run_helper, tm
             exe_path.parent.mkdir(parents=True, exist_ok=True)
             exe_path.touch()
             return subprocess.CompletedProcess(args=cmd, returncode=0, stdout="venv created", stderr="")
-        elif cmd[0] == "uv" and cmd[1] == "pip" and "cadquery" in cmd:
+        elif cmd[0] == "uv" and cmd[1] == "pip" and "cadquery" in cmd and "-r" not in cmd:
              return subprocess.CompletedProcess(args=cmd, returncode=0, stdout="cadquery installed", stderr="")
         elif cmd[0] == "uv" and cmd[1] == "pip" and "-r" in cmd:
              # Check if the correct requirements file is being used
@@ -229,15 +242,13 @@ def test_prepare_workspace_env_with_requirements(mock_which, mock_run_helper, tm
 
     # Check calls
     expected_venv_call = call(["uv", "venv", str(venv_dir), "-p", ENV_SETUP_PYTHON_VERSION], log_prefix=f"WorkspaceEnv({workspace_path.name})")
-    expected_cq_install_call = call(["uv", "pip", "install", "cadquery", "--python", str(expected_python_exe)], log_prefix=f"WorkspaceEnv({workspace_path.name})")
-    expected_reqs_install_call = call(["uv", "pip", "install", "-r", str(requirements_file), "--python", str(expected_python_exe)], log_prefix=f"WorkspaceEnv({workspace_path.name})")
+    expected_reqs_install_call = call(["uv", "pip", "install", "cadquery", "-r", str(requirements_file), "--python", str(expected_python_exe), *UV_PIP_INSTALL_FLAGS], log_prefix=f"WorkspaceEnv({workspace_path.name})")
 
     mock_run_helper.assert_has_calls([
         expected_venv_call,
-        expected_cq_install_call,
         expected_reqs_install_call
     ], any_order=False) # Ensure correct order
-    assert mock_run_helper.call_count == 3
+    assert mock_run_helper.call_count == 2 # cadquery and requirements.txt share one install
 
     # Check mtime cache was updated
     assert str(workspace_path) in workspace_reqs_mtime_cache
@@ -295,7 +306,7 @@ def test_prepare_workspace_env_requirements_unchanged(mock_which, mock_run_helpe
     mock_which.assert_called_once_with("uv")
 
     # Check that only the cadquery install command was run
-    expected_cq_install_call = call(["uv", "pip", "install", "cadquery", "--python", str(expected_python_exe)], log_prefix=f"WorkspaceEnv({workspace_path.name})")
+    expected_cq_install_call = call(["uv", "pip", "install", "cadquery", "--python", str(expected_python_exe), *UV_PIP_INSTALL_FLAGS], log_prefix=f"WorkspaceEnv({workspace_path.name})")
     mock_run_helper.assert_called_once_with(*expected_cq_install_call.args, **expected_cq_install_call.kwargs)
 
     # Ensure cache value hasn't changed
@@ -327,7 +338,7 @@ def test_prepare_workspace_env_requirements_changed(mock_which, mock_run_helper,
     def side_effect_run_helper(*args, **kwargs):
         cmd = args[0]
         print(f"Mock _run_command_helper called with: {cmd}")
-        if cmd[0] == "uv" and cmd[1] == "pip" and "cadquery" in cmd:
+        if cmd[0] == "uv" and cmd[1] == "pip" and "cadquery" in cmd and "-r" not in cmd:
              return subprocess.CompletedProcess(args=cmd, returncode=0, stdout="cadquery installed", stderr="")
         elif cmd[0] == "uv" and cmd[1] == "pip" and "-r" in cmd:
              assert cmd[cmd.index("-r") + 1] == str(requirements_file)
@@ -352,15 +363,10 @@ def test_prepare_workspace_env_requirements_changed(mock_which, mock_run_helper,
     assert returned_python_exe == str(expected_python_exe)
     mock_which.assert_called_once_with("uv")
 
-    # Check that cadquery install AND requirements install were called
-    expected_cq_install_call = call(["uv", "pip", "install", "cadquery", "--python", str(expected_python_exe)], log_prefix=f"WorkspaceEnv({workspace_path.name})")
-    expected_reqs_install_call = call(["uv", "pip", "install", "-r", str(requirements_file), "--python", str(expected_python_exe)], log_prefix=f"WorkspaceEnv({workspace_path.name})")
+    # Check that cadquery and requirements were installed in a single call
+    expected_reqs_install_call = call(["uv", "pip", "install", "cadquery", "-r", str(requirements_file), "--python", str(expected_python_exe), *UV_PIP_INSTALL_FLAGS], log_prefix=f"WorkspaceEnv({workspace_path.name})")
 
-    mock_run_helper.assert_has_calls([
-        expected_cq_install_call,
-        expected_reqs_install_call
-    ], any_order=False) # Ensure correct order
-    assert mock_run_helper.call_count == 2
+    mock_run_helper.assert_called_once_with(*expected_reqs_install_call.args, **expected_reqs_install_call.kwargs)
 
     # Check mtime cache was updated to the NEW mtime
     current_mtime = requirements_file.stat().st_mtime # Get the actual current mtime
@@ -372,6 +378,64 @@ def test_prepare_workspace_env_requirements_changed(mock_which, mock_run_helper,
 
 
 
+@patch('src.mcp_cadquery_server.env_setup._run_command_helper')
+@patch('shutil.which')
+def test_prepare_workspace_env_stamp_skips_uv(mock_which, mock_run_helper, tmp_path):
+    """Test that a matching environment stamp skips all uv commands, even with an empty mtime cache (e.g. after a restart)."""
+    mock_which.return_value = "/path/to/uv"
+    workspace_path = tmp_path / "env_stamp_workspace"
+    workspace_path.mkdir()
+    requirements_file = workspace_path / "requirements.txt"
+    requirements_file.write_text("numpy")
+
+    venv_dir = workspace_path / ".venv"
+    bin_subdir = "Scripts" if sys.platform == "win32" else "bin"
+    expected_python_exe = venv_dir / bin_subdir / ("python.exe" if sys.platform == "win32" else "python")
+    expected_python_exe.parent.mkdir(parents=True, exist_ok=True)
+    expected_python_exe.touch()
+
+    mock_run_helper.side_effect = lambda cmd, **kwargs: subprocess.CompletedProcess(args=cmd, returncode=0, stdout="", stderr="")
+
+    # First run installs everything and writes the stamp
+    workspace_reqs_mtime_cache.clear()
+    prepare_workspace_env(str(workspace_path))
+    assert any("-r" in c.args[0] for c in mock_run_helper.call_args_list)
+    assert (venv_dir / ENV_STAMP_FILE).exists()
+
+    # Simulate a server restart: the in-process cache is gone but the stamp still matches
+    workspace_reqs_mtime_cache.clear()
+    mock_run_helper.reset_mock(); mock_which.reset_mock()
+    assert prepare_workspace_env(str(workspace_path)) == str(expected_python_exe)
+    mock_run_helper.assert_not_called()
+    mock_which.assert_not_called()
+
+    # Changing requirements.txt content invalidates the stamp
+    requirements_file.write_text("numpy\nscipy")
+    prepare_workspace_env(str(workspace_path))
+    assert any("-r" in c.args[0] for c in mock_run_helper.call_args_list)
+
+
+
+@patch('src.mcp_cadquery_server.env_setup._run_command_helper')
+@patch('shutil.which')
+def test_prepare_workspace_envs_concurrent(mock_which, mock_run_helper, tmp_path):
+    """Test preparing several workspaces at once returns each venv python in input order."""
+    mock_which.return_value = "/path/to/uv"
+    mock_run_helper.side_effect = lambda cmd, **kwargs: subprocess.CompletedProcess(args=cmd, returncode=0, stdout="", stderr="")
+    bin_subdir = "Scripts" if sys.platform == "win32" else "bin"
+    expected = []
+    for name in ("ws_a", "ws_b"):
+        exe = tmp_path / name / ".venv" / bin_subdir / ("python.exe" if sys.platform == "win32" else "python")
+        exe.parent.mkdir(parents=True); exe.touch()
+        expected.append(str(exe))
+    paths = [str(tmp_path / "ws_a"), str(tmp_path / "ws_b"), str(tmp_path / "ws_a")]
+
+    result = asyncio.run(prepare_workspace_envs(paths, max_concurrency=2))
+
+    assert result == [expected[0], expected[1], expected[0]]
+    assert mock_run_helper.call_count == 2 # One base install per distinct workspace
+
+
 @patch('src.mcp_cadquery_server.env_setup._run_command_helper')
 @patch('shutil.which')
 def test_prepare_workspace_env_install_failure(mock_which, mock_run_helper, tmp_path):
@@ -398,7 +462,7 @@ def test_prepare_workspace_env_install_failure(mock_which, mock_run_helper, tmp_
             exe_path.parent.mkdir(parents=True, exist_ok=True)
             exe_path.touch()
             return subprocess.CompletedProcess(args=cmd, returncode=0, stdout="venv created", stderr="")
-        elif cmd[0] == "uv" and cmd[1] == "pip" and "cadquery" in cmd:
+        elif cmd[0] == "uv" and cmd[1] == "pip" and "cadquery" in cmd and "-r" not in cmd:
              return subprocess.CompletedProcess(args=cmd, returncode=0, stdout="cadquery installed", stderr="")
         elif cmd[0] == "uv" and cmd[1] == "pip" and "-r" in cmd:
              print("Simulating requirements install failure...")
@@ -423,14 +487,12 @@ def test_prepare_workspace_env_install_failure(mock_which, mock_run_helper, tmp_
 
     # Verify calls up to the point of failure
     expected_venv_call = call(["uv", "venv", str(venv_dir), "-p", ENV_SETUP_PYTHON_VERSION], log_prefix=f"WorkspaceEnv({workspace_path.name})")
-    expected_cq_install_call = call(["uv", "pip", "install", "cadquery", "--python", str(expected_python_exe)], log_prefix=f"WorkspaceEnv({workspace_path.name})")
-    expected_reqs_install_call = call(["uv", "pip", "install", "-r", str(requirements_file), "--python", str(expected_python_exe)], log_prefix=f"WorkspaceEnv({workspace_path.name})")
+    expected_reqs_install_call = call(["uv", "pip", "install", "cadquery", "-r", str(requirements_file), "--python", str(expected_python_exe), *UV_PIP_INSTALL_FLAGS], log_prefix=f"WorkspaceEnv({workspace_path.name})")
     mock_run_helper.assert_has_calls([
         expected_venv_call,
-        expected_cq_install_call,
         expected_reqs_install_call
     ], any_order=False)
-    assert mock_run_helper.call_count == 3
+    assert mock_run_helper.call_count == 2
 
     print(f"\nTest test_prepare_workspace_env_install_failure passed for {workspace_path}")
 
@@ -454,3 +516,14 @@ def test_prepare_workspace_env_uv_not_found(mock_which, tmp_path):
     mock_which.assert_called_once_with("uv")
 
     print(f"\nTest test_prepare_workspace_env_uv_not_found passed for {workspace_path}")
+
+
+@patch('shutil.which')
+def test_get_uv_caches_lookup(mock_which):
+    """Test that the uv PATH lookup happens once and a miss is not cached."""
+    mock_which.return_value = None
+    with pytest.raises(FileNotFoundError): env_setup._get_uv()
+    mock_which.return_value = "/path/to/uv"
+    assert env_setup._get_uv() == "/path/to/uv"
+    assert env_setup._get_uv() == "/path/to/uv"
+    assert mock_which.call_count == 2 # The miss and the first hit; the second hit came from the cache
@@ -377,3 +377,102 @@ show_object(assy, name="test_assembly")
     # Check if the intermediate file was created
     expected_brep = test_workspace / ".cq_results" / result_id / "test_assembly.brep"
     assert expected_brep.is_file(), f"Expected BREP file not found at {expected_brep}"
+
+def test_persistent_runner_reuses_process(test_workspace):
+    """Test the --serve runner: one process for several requests, script prints, module edits and sys.exit."""
+    from src.mcp_cadquery_server.runner_pool import WorkspaceRunner
+    module_path = test_workspace / "modules" / "serve_module.py"
+    module_path.write_text("VALUE = 42\n")
+    script_content = (
+        "import cadquery as cq\n"
+        "import serve_module\n"
+        "print('noise on stdout')\n"
+        "show_object(cq.Workplane('XY').box(serve_module.VALUE, 1, 1), name='served_box')"
+    )
+    runner = WorkspaceRunner(PYTHON_EXE, SCRIPT_RUNNER_PATH, str(test_workspace))
+    try:
+        def run(result_id, script=script_content):
+            return runner.run({"workspace_path": str(test_workspace), "script_content": script, "parameters": {}, "result_id": result_id})
+
+        first = run("serve_0")
+        assert first["success"] is True, first["exception_str"]
+        assert (test_workspace / ".cq_results" / "serve_0" / "served_box.brep").is_file()
+        pid = runner.process.pid
+
+        module_path.write_text("VALUE = 4242\n") # Edited workspace modules are re-imported
+        second = run("serve_1", script_content.replace("name='served_box'", "name=str(serve_module.VALUE)"))
+        assert second["success"] is True, second["exception_str"]
+        assert second["results"][0]["name"] == "4242"
+
+        exited = run("serve_2", "import sys\nsys.exit(3)") # A script exiting does not end the runner
+        assert exited["success"] is False and "SystemExit" in exited["exception_str"]
+        assert run("serve_3")["success"] is True
+        assert runner.process.pid == pid
+    finally:
+        runner.close()
+    assert runner.process is None
+
+def _wait_closed(runner, timeout=10):
+    """Waits for a runner closed in the background (see runner_pool._close_in_background)."""
+    import time
+    deadline = time.monotonic() + timeout
+    while runner.process is not None and time.monotonic() < deadline: time.sleep(0.05)
+    return runner.process is None
+
+def test_persistent_runner_restarts_after_death(test_workspace):
+    """Test a runner whose process died is restarted by the next run()."""
+    from src.mcp_cadquery_server.runner_pool import WorkspaceRunner
+    runner = WorkspaceRunner(PYTHON_EXE, SCRIPT_RUNNER_PATH, str(test_workspace))
+    request = {"workspace_path": str(test_workspace), "script_content": "x = 1", "parameters": {}, "result_id": "restart"}
+    try:
+        assert runner.run(request)["success"] is True
+        dead_process = runner.process
+        dead_process.kill(); dead_process.wait()
+        assert runner.run(request)["success"] is True
+        assert runner.process is not dead_process and runner.process.poll() is None
+    finally:
+        runner.close()
+
+def test_workspace_runner_pool_pinning(test_workspace, monkeypatch):
+    """Test pool runners: per-workspace slots, env_version replacement, and no eviction of runners in use."""
+    from src.mcp_cadquery_server import runner_pool
+    from src.mcp_cadquery_server.state import workspace_runners
+    monkeypatch.setattr(runner_pool, "MAX_WORKSPACE_RUNNERS", 1)
+    workspace, other_workspace = str(test_workspace), str(test_workspace / "other")
+    request = {"workspace_path": workspace, "script_content": "x = 1", "parameters": {}, "result_id": "pool"}
+    try:
+        with runner_pool.workspace_runner(workspace, PYTHON_EXE, SCRIPT_RUNNER_PATH, env_version=1) as first:
+            assert first.run(request)["success"] is True
+            with runner_pool.workspace_runner(workspace, PYTHON_EXE, SCRIPT_RUNNER_PATH, env_version=1) as second:
+                assert second is not first # Concurrent users of one workspace get separate runners
+            with runner_pool.workspace_runner(other_workspace, PYTHON_EXE, SCRIPT_RUNNER_PATH) as other:
+                # Over the cap, but the pinned runner is not evicted (or closed under its user)
+                assert (workspace, PYTHON_EXE, 0) in workspace_runners and not first.retired
+            assert first.process.poll() is None
+        assert list(workspace_runners.values()) == [first] # Idle runners trimmed back to the cap
+        assert second.retired and other.retired
+
+        with runner_pool.workspace_runner(workspace, PYTHON_EXE, SCRIPT_RUNNER_PATH, env_version=1) as reused:
+            assert reused is first # An idle runner is reused
+            # The venv is reinstalled while the runner is in use: it is replaced, and closed when released
+            runner_pool.close_workspace_runners(workspace)
+            assert first.retired and first.process is not None
+        assert _wait_closed(first)
+
+        with runner_pool.workspace_runner(workspace, PYTHON_EXE, SCRIPT_RUNNER_PATH, env_version=1) as old_env: old_env.run(request)
+        with runner_pool.workspace_runner(workspace, PYTHON_EXE, SCRIPT_RUNNER_PATH, env_version=2) as new_env:
+            assert new_env is not old_env and old_env.retired
+        assert _wait_closed(old_env)
+    finally:
+        runner_pool.close_workspace_runners(workspace); runner_pool.close_workspace_runners(other_workspace)
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_runner_result_serialization(use_orjson, monkeypatch):
+    """Results serialize the same with or without orjson, including values orjson rejects."""
+    from src.mcp_cadquery_server import script_runner
+    if not use_orjson: monkeypatch.setattr(script_runner, "orjson", None)
+    result = {"success": True, "results": [{"name": "box", "intermediate_path": "/tmp/box.brep"}], "exception_str": None}
+    assert json.loads(script_runner._dumps_bytes(result)) == result
+    assert json.loads(script_runner._dumps_bytes(result, indent=True)) == result
+    assert b"\n  " in script_runner._dumps_bytes(result, indent=True)
+    assert json.loads(script_runner._dumps_bytes({"big": 2 ** 70})) == {"big": 2 ** 70}
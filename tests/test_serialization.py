@@ -0,0 +1,59 @@
+import pytest
+import os
+import sys
+import json
+
+# Add project root to path to allow importing src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.mcp_cadquery_server import serialization
+from src.mcp_cadquery_server.serialization import dumps_compact
+
+MESSAGE = {"type": "tool_result", "request_id": "req-1", "result": {"success": True, "results": [{"name": "shape_0", "volume": 1.5, "tags": ["a", "b"]}], "error": None}}
+
+class _FakeMsgspecEncoder:
+    """Stands in for msgspec.json.Encoder (compact output, bytes) when msgspec is not installed."""
+    def encode(self, obj):
+        if not isinstance(obj, dict): raise TypeError("unsupported")
+        return json.dumps(obj, separators=(",", ":")).encode('utf-8')
+
+@pytest.mark.parametrize("encoder", ["msgspec", "orjson", "json"])
+def test_dumps_compact_round_trips(monkeypatch, encoder):
+    if encoder == "orjson" and serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    if encoder != "msgspec":
+        monkeypatch.setattr(serialization, "_msgspec_encoder", None)
+    elif serialization._msgspec_encoder is None:
+        monkeypatch.setattr(serialization, "_msgspec_encoder", _FakeMsgspecEncoder())
+        monkeypatch.setattr(serialization, "_MSGSPEC_ERRORS", (TypeError,))
+    if encoder == "json":
+        monkeypatch.setattr(serialization, "orjson", None)
+    encoded = dumps_compact(MESSAGE)
+    assert isinstance(encoded, str)
+    assert ", " not in encoded and ": " not in encoded # Compact separators
+    assert json.loads(encoded) == MESSAGE
+
+def test_dumps_compact_skips_msgspec_on_unsupported_values(monkeypatch):
+    monkeypatch.setattr(serialization, "_msgspec_encoder", _FakeMsgspecEncoder())
+    monkeypatch.setattr(serialization, "_MSGSPEC_ERRORS", (TypeError,))
+    assert json.loads(dumps_compact([1, 2])) == [1, 2] # Rejected by the fake encoder, handled by the next one
+
+def test_dumps_compact_falls_back_for_unsupported_values():
+    big = {"value": 2 ** 70} # Too wide for orjson
+    assert json.loads(dumps_compact(big)) == big
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_loads_accepts_bytes_and_rejects_invalid_json(monkeypatch, use_orjson):
+    if use_orjson and serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    monkeypatch.setattr(serialization, "_msgspec_decoder", None)
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    assert serialization.loads(dumps_compact(MESSAGE).encode('utf-8')) == MESSAGE
+    with pytest.raises(ValueError):
+        serialization.loads(b'{"request_id": "req-1", ')
+
+def test_dumps_bytes_matches_dumps_compact():
+    encoded = serialization.dumps_bytes(MESSAGE)
+    assert isinstance(encoded, bytes)
+    assert encoded.decode('utf-8') == dumps_compact(MESSAGE)
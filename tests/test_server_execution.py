@@ -17,7 +17,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 # Import necessary components from their new locations
 from src.mcp_cadquery_server import state
 from src.mcp_cadquery_server.web_server import app # Import app from web_server
-from src.mcp_cadquery_server.env_setup import prepare_workspace_env # Import from env_setup
+from src.mcp_cadquery_server.env_setup import prepare_workspace_env, UV_PIP_INSTALL_FLAGS # Import from env_setup
 # shape_results is accessed via state.shape_results
 
 # Import the old function for comparison if needed (or remove old tests)
@@ -74,6 +74,19 @@ def test_execute_script_with_show_object():
     assert isinstance(build_result.results[0].shape, cq.Workplane)
     print("Valid script execution with show_object test passed.")
 
+def test_execute_script_reuses_parsed_model():
+    """Test that repeated builds of the same script text parse it once and still build fresh results."""
+    from cadquery import cqgi
+    from src.mcp_cadquery_server import core
+    script = "import cadquery as cq\nshow_object(cq.Workplane('XY').box(2, 1, 1), name='box')\ndebug(cq.Workplane('XY').box(1, 1, 1))"
+    core._parse_cqgi_script.cache_clear()
+    with patch.object(cqgi, "parse", wraps=cqgi.parse) as mock_parse:
+        first, second = execute_cqgi_script(script), execute_cqgi_script(script)
+    mock_parse.assert_called_once_with(script)
+    assert first.success is second.success is True
+    assert first.results[0].shape is not second.results[0].shape
+    assert len(first.results) == len(second.results) == 1 and len(second.debugObjects) == 1
+
 def test_execute_script_with_syntax_error():
     """Test executing a script with a Python syntax error."""
     script = "import cadquery as cq\nresult = cq.Workplane('XY').box(1, 2,"
@@ -348,7 +361,7 @@ def test_integration_execute_with_installed_package(mock_prepare_env, mock_run_h
     print(f"\nInstalling package {package_name}...")
     # Simulate _run_command_helper success for the install call
     # We need to configure the mock *before* the client call
-    install_cmd_args = ['uv', 'pip', 'install', package_name, '--python', sys.executable]
+    install_cmd_args = ['uv', 'pip', 'install', package_name, '--python', sys.executable, *UV_PIP_INSTALL_FLAGS]
     mock_run_helper.return_value = subprocess.CompletedProcess(args=install_cmd_args, returncode=0, stdout="Installed", stderr="")
 
     install_response = client.post("/mcp/execute", json=install_request_body)
@@ -462,3 +475,27 @@ def test_integration_execute_script_failure_in_workspace(mock_prepare_env, clien
     assert not expected_brep_file.exists(), f"Intermediate BREP file should not exist for failed execution: {expected_brep_file}"
 
     print("Integration test for script failure passed.")
+
+@pytest.mark.parametrize("cpu_count", [1, 2])
+@patch('src.mcp_cadquery_server.handlers.prepare_workspace_env')
+def test_execute_parameter_sets_use_persistent_runners(mock_prepare_env, cpu_count, tmp_path):
+    """Test that parameter sets run in persistent runners, one runner process per concurrent set."""
+    from src.mcp_cadquery_server.handlers import handle_execute_cadquery_script
+    from src.mcp_cadquery_server.runner_pool import close_workspace_runners
+    mock_prepare_env.return_value = sys.executable
+    workspace_path = tmp_path / "persistent_runner_ws"
+    workspace_path.mkdir()
+    script = "import cadquery as cq\nsize = 1.0 # PARAM\nshow_object(cq.Workplane('XY').box(size, size, size), name='box')"
+    parameter_sets = [{"size": 1.0}, {"size": 2.0}, {"size": 3.0}]
+    try:
+        with patch('os.cpu_count', return_value=cpu_count):
+            response = handle_execute_cadquery_script({"request_id": "persist", "arguments": {
+                "workspace_path": str(workspace_path), "script": script, "parameter_sets": parameter_sets}})
+        assert [r["result_id"] for r in response["results"]] == ["persist_0", "persist_1", "persist_2"] # Input order
+        assert all(r["success"] for r in response["results"])
+        assert (workspace_path / ".cq_results" / "persist_2" / "box.brep").is_file()
+        runners = [r for (ws, *_), r in state.workspace_runners.items() if ws == str(workspace_path)]
+        assert len(runners) == cpu_count and all(r.process.poll() is None for r in runners)
+    finally:
+        close_workspace_runners(str(workspace_path))
+    assert not any(key[0] == str(workspace_path) for key in state.workspace_runners)
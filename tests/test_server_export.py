@@ -15,7 +15,11 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from src.mcp_cadquery_server.core import (
     execute_cqgi_script, # Still needed for one fixture
     export_shape_to_svg_file,
-    export_shape_to_file
+    export_shape_to_file,
+    export_brep_to_svg_file,
+    render_brep_to_svg_bytes,
+    shape_to_brep_bytes,
+    optimize_svg_text
 )
 # Import cqgi for type hints if needed
 from cadquery import cqgi
@@ -78,6 +82,40 @@ def test_export_svg_with_options(test_box_shape, tmp_path):
     assert "<svg" in content and "</svg>" in content
     print("SVG export with options test passed.")
 
+def test_export_svg_from_brep_bytes_matches_shape_export(test_box_shape, tmp_path):
+    """The BREP-bytes entry point (used by the SVG process pool) renders the same SVG as the shape export."""
+    svg_opts = {"width": 100, "height": 80}
+    direct_file, brep_file = tmp_path / "direct.svg", tmp_path / "from_brep.svg"
+    export_shape_to_svg_file(test_box_shape, str(direct_file), svg_opts)
+    export_brep_to_svg_file(shape_to_brep_bytes(test_box_shape), str(brep_file), svg_opts)
+    assert brep_file.read_text() == direct_file.read_text()
+
+def test_render_brep_to_svg_bytes_matches_file_export(test_box_shape, tmp_path):
+    """The in-memory SVG render produces exactly the bytes the file export writes."""
+    svg_opts = {"width": 100, "height": 80}
+    svg_file = tmp_path / "box.svg"
+    export_brep_to_svg_file(shape_to_brep_bytes(test_box_shape), str(svg_file), svg_opts)
+    assert render_brep_to_svg_bytes(shape_to_brep_bytes(test_box_shape), svg_opts) == svg_file.read_bytes()
+
+def test_export_svg_optimized_output(test_box_shape, tmp_path):
+    """Test that SVG output is left as cq wrote it by default, and rounded and merged with optimize=True."""
+    import re
+    from cadquery.occ_impl.exporters.svg import getSVG
+    optimized_file, raw_file = tmp_path / "optimized.svg", tmp_path / "raw.svg"
+    export_shape_to_svg_file(test_box_shape, str(optimized_file), {"optimize": True, "precision": 1})
+    export_shape_to_svg_file(test_box_shape, str(raw_file), {})
+    optimized, raw = optimized_file.read_text(), raw_file.read_text()
+    assert raw == getSVG(test_box_shape, {})
+    assert len(optimized) < len(raw)
+    assert optimized == optimize_svg_text(raw, 1)
+    assert optimized.count("<path") < raw.count("<path")
+    for path_data in re.findall(r'<path d="([^"]*)"', optimized):
+        assert not re.search(r"\.\d{2,}", path_data) # At most 1 decimal
+
+def test_optimize_svg_text_rounds_and_merges():
+    svg = '<g>\n  <path d="M1.23456,-0.0001 L2.5,3.0 " />\n  <path d="M1e-17,4.56789 " />\n</g><g><path d="M7.0,8.0" /></g>'
+    assert optimize_svg_text(svg, 2) == '<g>\n  <path d="M1.23,0 L2.5,3 M0,4.57" />\n</g><g><path d="M7,8" /></g>'
+
 def test_export_svg_invalid_path(test_box_shape):
     output_file = "/non_existent_directory/test.svg"
     svg_opts = {}
@@ -127,6 +165,17 @@ def test_export_shape_creates_directory(test_box_shape, tmp_path):
     assert output_dir.is_dir()
     print("Directory creation test passed.")
 
+def test_export_recreates_directory_removed_after_caching(test_box_shape, tmp_path):
+    """Test that exports still succeed when a directory ensure_dir already cached is deleted."""
+    output_dir = tmp_path / "removed"
+    export_shape_to_file(test_box_shape, str(output_dir / "first.step"), export_format="STEP")
+    shutil.rmtree(output_dir)
+    export_shape_to_file(test_box_shape, str(output_dir / "second.step"), export_format="STEP")
+    assert (output_dir / "second.step").stat().st_size > 0
+    shutil.rmtree(output_dir)
+    export_shape_to_svg_file(test_box_shape, str(output_dir / "third.svg"), {})
+    assert (output_dir / "third.svg").stat().st_size > 0
+
 def test_export_shape_invalid_type(tmp_path):
     """Test exporting an invalid object type."""
     output_file = tmp_path / "invalid.step"
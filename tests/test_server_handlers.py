@@ -5,6 +5,7 @@ import uuid
 import shutil
 import json
 import asyncio
+import signal
 import time
 import tempfile # Keep for potential future use, though not strictly needed now
 import subprocess # Import subprocess for mocking
@@ -27,6 +28,7 @@ from src.mcp_cadquery_server import state # Import state module
 # e.g., state.shape_results, state.part_index, state.DEFAULT_OUTPUT_DIR_NAME etc.
 # Import core logic needed by fixtures
 from src.mcp_cadquery_server.core import execute_cqgi_script
+from src.mcp_cadquery_server.env_setup import UV_PIP_INSTALL_FLAGS
 
 # --- Test Data ---
 EXAMPLE_PARTS = {
@@ -63,6 +65,16 @@ def manage_state_and_test_files(tmp_path): # Remove stored_build_result_id_for_h
     print("\nAuto-fixture: Setting up state and test files...")
     state.shape_results.clear()
     state.part_index.clear()
+    state.part_token_index.clear()
+    state.part_tokens.clear()
+    state.part_search_fields.clear()
+    state.part_search_sources.clear()
+    state.svg_preview_cache.clear()
+    state.svg_preview_keys.clear()
+    state.part_content_cache.clear()
+    state.tool_result_outbox.clear()
+    from src.mcp_cadquery_server import handlers
+    handlers._import_brep_cached.cache_clear()
 
     # Remove logic that re-created the build result from the old fixture
     # script = "import cadquery as cq\nresult = cq.Workplane('XY').box(1, 1, 1)\nshow_object(result)"
@@ -113,6 +125,8 @@ def manage_state_and_test_files(tmp_path): # Remove stored_build_result_id_for_h
         patch('src.mcp_cadquery_server.state.ACTIVE_PART_LIBRARY_DIR', str(tmp_part_lib_dir)),
         patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', str(tmp_static_dir)),
         patch('src.mcp_cadquery_server.state.ACTIVE_ASSETS_DIR_PATH', str(tmp_assets_dir)),
+        # Tests below mock subprocess.run for a one-shot runner per parameter set
+        patch.dict(os.environ, {"MCP_ONESHOT_SCRIPT_RUNNER": "1"}),
     ]
 
     # Enter all patch contexts
@@ -148,6 +162,13 @@ def manage_state_and_test_files(tmp_path): # Remove stored_build_result_id_for_h
     print("\nAuto-fixture: Tearing down state and test files...")
     state.shape_results.clear()
     state.part_index.clear()
+    state.part_token_index.clear()
+    state.part_tokens.clear()
+    state.part_search_fields.clear()
+    state.part_search_sources.clear()
+    state.svg_preview_cache.clear()
+    state.svg_preview_keys.clear()
+    state.tool_result_outbox.clear()
     print("Auto-fixture: Cleared shape_results and part_index.")
 
     # Stop all patches
@@ -254,7 +275,9 @@ def test_mcp_execute_endpoint_script_params_success(mock_ensure_env, mock_subpro
     mock_runner_output_1 = json.dumps({ "success": True, "results": [{"name": "shape_0", "type": "Workplane", "intermediate_path": dummy_brep_path_1}], "exception_str": None })
     mock_process_0 = subprocess.CompletedProcess(args=[], returncode=0, stdout=mock_runner_output_0, stderr="")
     mock_process_1 = subprocess.CompletedProcess(args=[], returncode=0, stdout=mock_runner_output_1, stderr="")
-    mock_subprocess_run.side_effect = [mock_process_0, mock_process_1] # Return different results for each call
+    # Return each set's result by its result_id (parameter sets may run concurrently)
+    mock_processes = {result_id_0: mock_process_0, result_id_1: mock_process_1}
+    mock_subprocess_run.side_effect = lambda cmd, **kwargs: mock_processes[json.loads(kwargs["input"])["result_id"]]
 
     # --- Test Execution ---
     script = "import cadquery as cq\nlength = 1.0 # PARAM\nresult = cq.Workplane('XY').box(length, 2, 1)\nshow_object(result)"
@@ -440,6 +463,48 @@ def test_mcp_execute_endpoint_export_shape_step_success(mock_export_file, mock_i
 
     print("POST /mcp/execute export_shape (STEP, Workspace) test passed.")
 
+def test_resolve_workspace_rechecks_directory(tmp_path):
+    """Test a cached workspace path is still rejected once the directory is gone."""
+    from src.mcp_cadquery_server import handlers
+    workspace = tmp_path / "ws"
+    workspace.mkdir()
+    assert handlers._resolve_workspace(str(workspace)) == str(workspace)
+    workspace.rmdir()
+    with pytest.raises(ValueError, match="Invalid workspace path"):
+        handlers._resolve_workspace(str(workspace))
+
+def test_import_brep_reuses_shape_until_file_changes(tmp_path):
+    """Test an intermediate BREP is parsed once per file version."""
+    from src.mcp_cadquery_server import handlers
+    brep_path = tmp_path / "shape.brep"
+    cq.Workplane().box(1, 2, 3).val().exportBrep(str(brep_path))
+    with patch('cadquery.importers.importBrep', wraps=cq.importers.importBrep) as mock_import:
+        first = handlers._import_brep(str(brep_path))
+        assert handlers._import_brep(str(brep_path)) is first
+        assert mock_import.call_count == 1
+        cq.Workplane().box(2, 2, 2).val().exportBrep(str(brep_path))
+        os.utime(brep_path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+        assert handlers._import_brep(str(brep_path)).val().Volume() == pytest.approx(8.0)
+        assert mock_import.call_count == 2
+
+def test_handle_get_shape_properties_batch(tmp_path):
+    """Test batched properties keep request order and import each intermediate file once."""
+    from src.mcp_cadquery_server import handlers
+    results = []
+    for name, size in (("small", 1), ("large", 2)):
+        brep_path = tmp_path / f"{name}.brep"
+        cq.Workplane().box(size, size, size).val().exportBrep(str(brep_path))
+        results.append({"name": name, "type": "Workplane", "intermediate_path": str(brep_path)})
+    state.shape_results["batch-result"] = {"success": True, "results": results}
+    shapes = [{"result_id": "batch-result", "shape_index": i} for i in (1, 0, 1)]
+    with patch('cadquery.importers.importBrep', wraps=cq.importers.importBrep) as mock_import:
+        response = handlers.handle_get_shape_properties_batch({"request_id": "test-batch", "arguments": {"shapes": shapes}})
+    assert [props["volume"] for props in response["results"]] == [pytest.approx(8.0), pytest.approx(1.0), pytest.approx(8.0)]
+    assert mock_import.call_count == 2
+
+    with pytest.raises(Exception, match="Invalid shape_index 5"):
+        handlers.handle_get_shape_properties_batch({"request_id": "test-batch-bad", "arguments": {"shapes": [{"result_id": "batch-result", "shape_index": 5}]}})
+
 def test_mcp_execute_scan_part_library(client, tmp_path): # Add tmp_path
     """Test scan_part_library via API."""
     request_id = f"test-scan-{uuid.uuid4()}"
@@ -460,6 +525,233 @@ def test_mcp_execute_scan_part_library(client, tmp_path): # Add tmp_path
     assert not os.path.exists(os.path.join(state.ACTIVE_PART_PREVIEW_DIR_PATH, "part3_error.svg"))
     print("POST /mcp/execute scan_part_library test passed.")
 
+def test_handle_scan_part_library_concurrent(tmp_path):
+    """Test the async scan handler builds modified parts in worker threads and caches the rest."""
+    from src.mcp_cadquery_server import handlers
+    tmp_part_lib_dir = tmp_path / "test_workspace" / state.DEFAULT_PART_LIBRARY_DIR
+    tmp_preview_dir = tmp_path / "scan_previews"
+    request = {"request_id": "test-scan-direct", "arguments": {"workspace_path": str(tmp_part_lib_dir)}}
+    with patch.object(handlers, 'ACTIVE_PART_PREVIEW_DIR_PATH', str(tmp_preview_dir)), \
+         patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', None):
+        response = asyncio.run(handlers.handle_scan_part_library(request))
+        assert response["scanned"] == 3 and response["indexed"] == 2 and response["errors"] == 1
+        assert set(state.part_index) == {"part1_box", "part2_sphere"}
+        assert state.part_index["part1_box"]["metadata"]["tags"] == ["box", "test", "simple"]
+        assert os.path.exists(tmp_preview_dir / "part1_box.svg")
+        assert os.path.exists(tmp_preview_dir / "part2_sphere.svg")
+
+        # Second scan: unchanged parts come from the cache, the failing part is retried
+        response = asyncio.run(handlers.handle_scan_part_library(request))
+        assert response["cached"] == 2 and response["indexed"] == 0 and response["errors"] == 1
+
+def test_remember_preview_keeps_reverse_index():
+    """Test each preview path maps to exactly one render key, without scanning the cache."""
+    from src.mcp_cadquery_server import handlers
+    handlers._remember_preview("key_a", "/previews/p.svg")
+    handlers._remember_preview("key_b", "/previews/p.svg") # p.svg rewritten with other geometry
+    assert state.svg_preview_cache == {"key_b": "/previews/p.svg"}
+    handlers._remember_preview("key_b", "/previews/q.svg") # Same render now recorded for q.svg
+    assert state.svg_preview_cache == {"key_b": "/previews/q.svg"}
+    assert state.svg_preview_keys == {"/previews/q.svg": "key_b"}
+
+def test_write_preview_replaces_file_atomically(tmp_path):
+    """Test a preview is swapped in whole: a failed write leaves the old file intact and no temp file behind."""
+    from src.mcp_cadquery_server import handlers
+    preview_path = tmp_path / "previews" / "p.svg"
+    assert handlers._write_preview(str(preview_path), b"<svg>old</svg>")
+    with patch.object(handlers.os, 'replace', side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            handlers._write_preview(str(preview_path), b"<svg>new</svg>")
+    assert preview_path.read_bytes() == b"<svg>old</svg>"
+    assert os.listdir(preview_path.parent) == ["p.svg"]
+    assert handlers._write_preview(str(preview_path), b"<svg>new</svg>")
+    assert preview_path.read_bytes() == b"<svg>new</svg>" and os.listdir(preview_path.parent) == ["p.svg"]
+
+def test_handle_scan_part_library_reuses_svg_for_unchanged_geometry(tmp_path):
+    """Test a docstring-only edit re-indexes the part without re-rendering its SVG preview."""
+    from src.mcp_cadquery_server import handlers
+    tmp_part_lib_dir = tmp_path / "test_workspace" / state.DEFAULT_PART_LIBRARY_DIR
+    tmp_preview_dir = tmp_path / "scan_previews"
+    request = {"request_id": "test-scan-svg-cache", "arguments": {"workspace_path": str(tmp_part_lib_dir)}}
+    with patch.object(handlers, 'ACTIVE_PART_PREVIEW_DIR_PATH', str(tmp_preview_dir)), \
+         patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', None):
+        asyncio.run(handlers.handle_scan_part_library(request))
+        assert len(state.svg_preview_cache) == 2
+
+        part_path = tmp_part_lib_dir / "part1_box.py"
+        part_path.write_text(part_path.read_text(encoding='utf-8').replace("Test Part 1", "Renamed Part 1"), encoding='utf-8')
+        os.utime(part_path, (time.time() + 10, time.time() + 10)) # Ensure the mtime changes
+        with patch.object(handlers, 'export_shape_to_svg_file', wraps=handlers.export_shape_to_svg_file) as mock_export_svg:
+            response = asyncio.run(handlers.handle_scan_part_library(request))
+        assert response["updated"] == 1
+        assert state.part_index["part1_box"]["metadata"]["part"] == "Renamed Part 1"
+        mock_export_svg.assert_not_called()
+        assert os.path.exists(tmp_preview_dir / "part1_box.svg")
+
+def test_handle_scan_part_library_keeps_identical_preview_file(tmp_path):
+    """Test a re-render that produces the same SVG leaves the existing preview file untouched."""
+    from src.mcp_cadquery_server import handlers
+    tmp_part_lib_dir = tmp_path / "test_workspace" / state.DEFAULT_PART_LIBRARY_DIR
+    preview_path = tmp_path / "scan_previews" / "part1_box.svg"
+    request = {"request_id": "test-scan-same-svg", "arguments": {"workspace_path": str(tmp_part_lib_dir)}}
+    with patch.object(handlers, 'ACTIVE_PART_PREVIEW_DIR_PATH', str(preview_path.parent)), \
+         patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', None):
+        asyncio.run(handlers.handle_scan_part_library(request))
+        os.utime(preview_path, ns=(10**9, 10**9))
+        # Forget everything in memory (as after a restart) so the part is built and rendered again
+        state.part_index.clear(); state.svg_preview_cache.clear(); state.svg_preview_keys.clear(); state.part_content_cache.clear()
+        with patch.object(handlers, '_run_in_part_process', wraps=handlers._run_in_part_process) as mock_run:
+            asyncio.run(handlers.handle_scan_part_library(request))
+        assert any(c.args[0] is handlers.render_brep_to_svg_bytes for c in mock_run.call_args_list)
+    assert preview_path.stat().st_mtime_ns == 10**9
+
+def test_handle_scan_part_library_content_hash_cache(tmp_path):
+    """Test a touched part stays cached and reverted content is re-indexed without executing it."""
+    from src.mcp_cadquery_server import handlers
+    tmp_part_lib_dir = tmp_path / "test_workspace" / state.DEFAULT_PART_LIBRARY_DIR
+    request = {"request_id": "test-scan-content-hash", "arguments": {"workspace_path": str(tmp_part_lib_dir)}}
+    part_path = tmp_part_lib_dir / "part1_box.py"
+    original = part_path.read_text(encoding='utf-8')
+    with patch.object(handlers, 'ACTIVE_PART_PREVIEW_DIR_PATH', str(tmp_path / "scan_previews")), \
+         patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', None):
+        asyncio.run(handlers.handle_scan_part_library(request))
+        os.utime(part_path, (time.time() + 10, time.time() + 10)) # mtime changes, content does not
+        with patch.object(handlers, '_run_in_part_process', wraps=handlers._run_in_part_process) as mock_run:
+            response = asyncio.run(handlers.handle_scan_part_library(request))
+        assert response["cached"] == 2 and response["updated"] == 0
+        assert not any(c.args[1] == original for c in mock_run.call_args_list) # Only the failing part was built again
+
+        part_path.write_text(original.replace("box(1, 1, 1)", "box(2, 2, 2)"), encoding='utf-8')
+        os.utime(part_path, (time.time() + 20, time.time() + 20))
+        asyncio.run(handlers.handle_scan_part_library(request))
+        part_path.write_text(original, encoding='utf-8') # Revert to content indexed before
+        os.utime(part_path, (time.time() + 30, time.time() + 30))
+        with patch.object(handlers, '_run_in_part_process', wraps=handlers._run_in_part_process) as mock_run:
+            response = asyncio.run(handlers.handle_scan_part_library(request))
+        assert response["updated"] == 1
+        assert not any(c.args[1] == original for c in mock_run.call_args_list) # Not executed again
+        assert state.part_index["part1_box"]["metadata"]["part"] == "Test Part 1"
+        assert os.path.exists(tmp_path / "scan_previews" / "part1_box.svg")
+
+def test_handle_scan_part_library_missing_library(tmp_path):
+    """Test scanning a library directory that does not exist is reported as an error."""
+    from src.mcp_cadquery_server import handlers
+    request = {"request_id": "test-scan-missing", "arguments": {"workspace_path": str(tmp_path / "no_such_library")}}
+    with patch.object(handlers, 'ACTIVE_PART_PREVIEW_DIR_PATH', str(tmp_path / "scan_previews")), \
+         patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', None):
+        with pytest.raises(Exception, match="Part library directory not found"):
+            asyncio.run(handlers.handle_scan_part_library(request))
+
+def test_handle_scan_part_library_removes_deleted_part_preview(tmp_path):
+    """Test a part whose file is gone is dropped from the index along with its preview."""
+    from src.mcp_cadquery_server import handlers
+    tmp_part_lib_dir = tmp_path / "test_workspace" / state.DEFAULT_PART_LIBRARY_DIR
+    preview_dir = tmp_path / "scan_previews"
+    request = {"request_id": "test-scan-remove", "arguments": {"workspace_path": str(tmp_part_lib_dir)}}
+    with patch.object(handlers, 'ACTIVE_PART_PREVIEW_DIR_PATH', str(preview_dir)), \
+         patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', None):
+        asyncio.run(handlers.handle_scan_part_library(request))
+        assert state.part_index["part1_box"]["preview_path"] == str(preview_dir / "part1_box.svg")
+        assert (preview_dir / "part1_box.svg").exists()
+        removed_hash = state.part_index["part1_box"]["content_hash"]
+        assert removed_hash in state.part_content_cache
+        (tmp_part_lib_dir / "part1_box.py").unlink()
+        response = asyncio.run(handlers.handle_scan_part_library(request))
+    assert response["removed"] == 1
+    assert "part1_box" not in state.part_index
+    assert not (preview_dir / "part1_box.svg").exists()
+    assert removed_hash not in state.part_content_cache # Its build results are dropped too
+
+def test_remember_part_content_evicts_least_recently_used():
+    """Test part_content_cache is capped, dropping the least recently used content hash first."""
+    from src.mcp_cadquery_server import handlers
+    with patch.object(handlers, 'PART_CONTENT_CACHE_SIZE', 2):
+        handlers._remember_part_content("a", {}); handlers._remember_part_content("b", {})
+        handlers._remember_part_content("a", {}) # Used again, so "b" is now the oldest
+        handlers._remember_part_content("c", {})
+    assert list(state.part_content_cache) == ["a", "c"]
+
+def test_to_static_url(tmp_path):
+    """Test paths under the static dir map to URLs and everything else to None."""
+    from src.mcp_cadquery_server import handlers
+    static_dir = tmp_path / "static"
+    with patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', str(static_dir)):
+        assert handlers._to_static_url(str(static_dir / "part_previews" / "a.svg")) == "/part_previews/a.svg"
+        assert handlers._to_static_url(str(tmp_path / "elsewhere" / "a.svg")) is None
+    with patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', None):
+        assert handlers._to_static_url(str(static_dir / "a.svg")) is None
+
+
+def test_handle_search_parts_token_index(tmp_path):
+    """Test search_parts uses the token index built by the scan, including substring and removal cases."""
+    from src.mcp_cadquery_server import handlers
+    tmp_part_lib_dir = tmp_path / "test_workspace" / state.DEFAULT_PART_LIBRARY_DIR
+    scan_request = {"request_id": "test-scan-for-index", "arguments": {"workspace_path": str(tmp_part_lib_dir)}}
+
+    def search(query, **arguments):
+        response = handlers.handle_search_parts({"request_id": "test-search-index", "arguments": {"query": query, **arguments}})
+        assert response["success"] is True
+        return [part["part_id"] for part in response["results"]]
+
+    with patch.object(handlers, 'ACTIVE_PART_PREVIEW_DIR_PATH', str(tmp_path / "scan_previews")), \
+         patch('src.mcp_cadquery_server.state.ACTIVE_STATIC_DIR', None):
+        asyncio.run(handlers.handle_scan_part_library(scan_request))
+        assert "box" in state.part_token_index and "sphere" in state.part_token_index
+        assert state.part_search_fields["part1_box"] == ("part1_box", "test part 1", "a simple test box part.", "part1_box.py", "box\ntest\nsimple")
+
+        assert search("box") == ["part1_box"]
+        with patch.object(handlers, '_search_candidates') as mock_candidates:
+            assert search(" BOX ") == ["part1_box"] # Same normalized query, served from the result cache
+        mock_candidates.assert_not_called()
+        assert search("SPHERE") == ["part2_sphere"]
+        assert search("sph") == ["part2_sphere"] # Substring of a token
+        # Tied scores keep part_index order, which follows the directory listing
+        assert sorted(search("round simple")) == ["part1_box", "part2_sphere"] # Either tag term matches
+        assert sorted(search("test part")) == ["part1_box", "part2_sphere"]
+        assert search("xyz_no_match") == []
+        top_part = search("part", limit=1)
+        assert top_part == search("part")[:1] and len(top_part) == 1 # Top-K selection matches the sorted head
+        assert search("test part", limit=1) == search("test part")[:1] # Sliced from the cached full result
+        assert len(search("", limit=1)) == 1
+        with pytest.raises(Exception, match="'limit' must be a positive integer"): search("box", limit=0)
+
+        all_parts = handlers.handle_search_parts({"request_id": "test-search-all", "arguments": {"query": ""}})["results"]
+        assert {part["part_id"] for part in all_parts} == {"part1_box", "part2_sphere"}
+        all_parts.clear() # Responses are copies: modifying one does not corrupt the cached results
+        again = handlers.handle_search_parts({"request_id": "test-search-all-2", "arguments": {}})["results"]
+        assert {part["part_id"] for part in again} == {"part1_box", "part2_sphere"}
+        box_results = handlers.handle_search_parts({"request_id": "test-search-copy", "arguments": {"query": "box"}})["results"]
+        box_results.append("junk")
+        assert search("box") == ["part1_box"]
+
+        # Any change to part_index, not only a scan, invalidates the cached results
+        state.part_index["manual_part"] = {"part_id": "manual_part", "metadata": {}}
+        assert sorted(search("")) == ["manual_part", "part1_box", "part2_sphere"]
+        del state.part_index["manual_part"]
+        assert sorted(search("")) == ["part1_box", "part2_sphere"]
+
+        os.remove(tmp_part_lib_dir / "part2_sphere.py")
+        asyncio.run(handlers.handle_scan_part_library(scan_request))
+        assert "sphere" not in state.part_token_index
+        assert search("sphere") == []
+        assert search("") == ["part1_box"] # Cache invalidated by the removal
+
+def test_handle_search_parts_finds_parts_added_directly():
+    """Test parts placed in part_index without a scan are searchable, and tied scores keep index order."""
+    from src.mcp_cadquery_server import handlers
+
+    def search(query):
+        return [part["part_id"] for part in handlers.handle_search_parts({"request_id": "test-search-direct", "arguments": {"query": query}})["results"]]
+
+    state.part_index["bolt_m3"] = {"part_id": "bolt_m3", "metadata": {"part": "Bolt", "description": "m3 bolt"}}
+    state.part_index["anchor_bolt"] = {"part_id": "anchor_bolt", "metadata": {"part": "Bolt", "description": "m8 bolt"}}
+    assert search("bolt") == ["bolt_m3", "anchor_bolt"] # Equal scores, insertion order (not alphabetical)
+    state.part_index["bolt_m3"] = {"part_id": "bolt_m3", "metadata": {"part": "Screw", "description": "m3 screw"}}
+    assert search("screw") == ["bolt_m3"] # Replaced entries are re-indexed
+    assert search("m8") == ["anchor_bolt"]
+    del state.part_index["anchor_bolt"]
+    assert search("m8") == [] and "anchor_bolt" not in state.part_search_fields
+
 def test_mcp_execute_search_parts_success(client, tmp_path): # Add tmp_path
     """Test search_parts via API after scanning."""
     # 1. Scan the library first (using the API)
@@ -1286,6 +1578,15 @@ def test_mcp_execute_save_workspace_module_success(client, tmp_path):
 
     print("POST /mcp/execute save_workspace_module (Success) test passed.")
 
+def test_handle_save_workspace_module_overwrites(tmp_path):
+    """Test saving a module again replaces (truncates) the previous content, byte for byte."""
+    from src.mcp_cadquery_server import handlers
+    workspace_path = tmp_path / "test_workspace"
+    for content in ["x = 1\n" * 1000, "name = 'Größe'\r\n"]:
+        request = {"request_id": "test-save-direct", "arguments": {"workspace_path": str(workspace_path), "module_filename": "util.py", "module_content": content}}
+        handlers.handle_save_workspace_module(request)
+        assert (workspace_path / "modules" / "util.py").read_bytes() == content.encode('utf-8')
+
 
 def test_mcp_execute_save_workspace_module_invalid_filename(client, tmp_path):
     """Test save_workspace_module with invalid filename (contains path sep)."""
@@ -1380,7 +1681,7 @@ def test_mcp_execute_install_package_success(mock_ensure_env, mock_run_command,
 
     # Check mocks were called
     mock_ensure_env.assert_called_once_with(workspace_path)
-    expected_install_command = ["uv", "pip", "install", package_to_install, "--python", fake_python_exe]
+    expected_install_command = ["uv", "pip", "install", package_to_install, "--python", fake_python_exe, *UV_PIP_INSTALL_FLAGS]
     mock_run_command.assert_called_once_with(expected_install_command, log_prefix=f"InstallPkg({os.path.basename(workspace_path)})")
 
     print("POST /mcp/execute install_workspace_package (Success) test passed.")
@@ -1418,12 +1719,30 @@ def test_mcp_execute_install_package_failure(mock_ensure_env, mock_run_command,
 
     # Check mocks were called
     mock_ensure_env.assert_called_once_with(workspace_path)
-    expected_install_command = ["uv", "pip", "install", package_to_install, "--python", fake_python_exe]
+    expected_install_command = ["uv", "pip", "install", package_to_install, "--python", fake_python_exe, *UV_PIP_INSTALL_FLAGS]
     mock_run_command.assert_called_once_with(expected_install_command, log_prefix=f"InstallPkg({os.path.basename(workspace_path)})")
     # Ideally check for tool_error SSE message indicating failure
 
     print("POST /mcp/execute install_workspace_package (Failure) test passed.")
 
+
+@pytest.mark.parametrize("returncode", [0, 1])
+def test_handle_install_workspace_package_result(tmp_path, returncode):
+    """Test the install handler reports the helper's CompletedProcess as success or failure."""
+    from src.mcp_cadquery_server import handlers
+    workspace_path = str(tmp_path / "test_workspace")
+    completed = subprocess.CompletedProcess(args=[], returncode=returncode, stdout="uv output", stderr="")
+    request = {"request_id": "test-install-direct", "arguments": {"workspace_path": workspace_path, "package_name": "requests"}}
+    with patch.object(handlers, 'prepare_workspace_env', return_value="/fake/python"), \
+         patch.object(handlers, '_run_command_helper', return_value=completed) as mock_run_command:
+        if returncode == 0:
+            assert handlers.handle_install_workspace_package(request) == {"success": True, "message": "Package 'requests' installed successfully.", "output": "uv output"}
+        else:
+            with pytest.raises(Exception, match="Failed to install package 'requests'"):
+                handlers.handle_install_workspace_package(request)
+    mock_run_command.assert_called_once_with(["uv", "pip", "install", "requests", "--python", "/fake/python", *UV_PIP_INSTALL_FLAGS], check=False,
+                                             log_prefix="InstallPkg(test_workspace)", cwd=workspace_path)
+
 print("POST /mcp/execute get_shape_description for failed build test passed (checked immediate response).")
 
 
@@ -1487,13 +1806,159 @@ def test_sse_connection_sends_server_info(mock_get_server_info, MockQueue, clien
     mock_get_server_info.assert_called_once() # Ensure server info was fetched
     MockQueue.assert_called_once() # Ensure a Queue instance was created
 
-    # Check that put was called on the *instance* of the queue
-    # The server puts the raw dictionary from get_server_info onto the queue
-    mock_queue_instance.put.assert_called_once_with(expected_server_info)
+    # Check that put_nowait was called on the *instance* of the queue
+    # The server puts the JSON-encoded server_info frame onto the queue
+    mock_queue_instance.put_nowait.assert_called_once()
+    assert json.loads(mock_queue_instance.put_nowait.call_args.args[0]) == expected_server_info
 
     print("GET /mcp initial server_info message test passed (verified queue.put call).")
 
 
+def test_mcp_result_endpoint_returns_final_message(client):
+    """Test that the final message of a POSTed request can be fetched from GET /mcp/result/{request_id}."""
+    request_id = f"test-result-outbox-{uuid.uuid4()}"
+    assert client.get(f"/mcp/result/{request_id}").status_code == 404
+    response = client.post("/mcp/execute", json={"request_id": request_id, "tool_name": "search_parts", "arguments": {"query": "box"}})
+    assert response.json() == {"status": "processing", "request_id": request_id}
+    for _ in range(50): # Wait for the background task
+        result_response = client.get(f"/mcp/result/{request_id}")
+        if result_response.status_code == 200: break
+        time.sleep(0.02)
+    assert result_response.status_code == 200
+    message = result_response.json()
+    assert message["type"] == "tool_result" and message["request_id"] == request_id
+    assert message["result"]["success"] is True
+
+
+def test_push_sse_message_drops_full_queue():
+    """Test that push_sse_message encodes once, feeds every client and drops clients whose queue is full."""
+    from src.mcp_cadquery_server import web_server
+
+    async def run_push():
+        fast_queue, slow_queue = asyncio.Queue(maxsize=2), asyncio.Queue(maxsize=1)
+        slow_queue.put_nowait("stale-frame")
+        with patch.object(web_server, 'sse_connections', [fast_queue, slow_queue]) as connections:
+            await web_server.push_sse_message({"type": "tool_result", "request_id": "push-1", "result": {}})
+            return fast_queue, slow_queue, list(connections)
+
+    fast_queue, slow_queue, connections = asyncio.run(run_push())
+    assert connections == [fast_queue]
+    assert json.loads(fast_queue.get_nowait()) == {"type": "tool_result", "request_id": "push-1", "result": {}}
+    assert slow_queue.get_nowait() is None # Close sentinel replaces the backlog
+
+
+def test_process_tool_request_offloads_blocking_handlers():
+    """Test that blocking handlers run in the tool executor while inline tools stay on the loop thread."""
+    import threading
+    from src.mcp_cadquery_server import mcp_api
+    handler_threads = {}
+
+    def make_handler(name):
+        def handler(request):
+            handler_threads[name] = threading.current_thread()
+            return {"success": True}
+        return handler
+
+    async def run_requests():
+        with patch.dict(mcp_api.tool_handlers, {"blocking_tool": make_handler("blocking_tool"), "search_parts": make_handler("search_parts")}):
+            blocking = await mcp_api.process_tool_request({"request_id": "offload-1", "tool_name": "blocking_tool"})
+            inline = await mcp_api.process_tool_request({"request_id": "offload-2", "tool_name": "search_parts"})
+        return blocking, inline, threading.current_thread()
+
+    blocking, inline, loop_thread = asyncio.run(run_requests())
+    assert blocking == {"type": "tool_result", "request_id": "offload-1", "result": {"success": True}}
+    assert inline == {"type": "tool_result", "request_id": "offload-2", "result": {"success": True}}
+    assert handler_threads["blocking_tool"] is not loop_thread
+    assert handler_threads["search_parts"] is loop_thread
+
+
+def test_process_tool_request_dispatch_mode_resolved_once():
+    """Test that a handler's dispatch mode is resolved on first use and reused afterwards."""
+    from src.mcp_cadquery_server import mcp_api
+
+    async def coroutine_handler(request): return {"awaited": True}
+    def blocking_handler(request): return {"awaited": False}
+
+    async def run_requests():
+        with patch.dict(mcp_api.tool_handlers, {"async_tool": coroutine_handler, "blocking_tool": blocking_handler}):
+            first = await mcp_api.process_tool_request({"request_id": "mode-1", "tool_name": "async_tool"})
+            with patch.object(mcp_api.inspect, "iscoroutinefunction", side_effect=AssertionError("re-inspected")):
+                second = await mcp_api.process_tool_request({"request_id": "mode-2", "tool_name": "async_tool"})
+            third = await mcp_api.process_tool_request({"request_id": "mode-3", "tool_name": "blocking_tool"})
+        return first, second, third
+
+    first, second, third = asyncio.run(run_requests())
+    assert first["result"] == second["result"] == {"awaited": True}
+    assert third["result"] == {"awaited": False}
+    assert mcp_api._dispatch_modes[coroutine_handler] == mcp_api.DISPATCH_AWAIT
+    assert mcp_api._dispatch_modes[blocking_handler] == mcp_api.DISPATCH_EXECUTOR
+
+
+def test_process_tool_request_streams_progress_before_result():
+    """Test that progress reported by a handler thread is sent as tool_progress before the final result."""
+    from src.mcp_cadquery_server import mcp_api
+    sent_messages = []
+
+    def handler(request, progress=None):
+        for i in range(3):
+            progress({"result_id": f"{request['request_id']}_{i}", "success": True})
+        return {"success": True}
+
+    async def send_progress(message):
+        sent_messages.append(message)
+
+    async def run_request():
+        with patch.dict(mcp_api.tool_handlers, {"execute_cadquery_script": handler}):
+            return await mcp_api.process_tool_request({"request_id": "progress-1", "tool_name": "execute_cadquery_script"}, send_progress=send_progress)
+
+    final = asyncio.run(run_request())
+    assert [m["type"] for m in sent_messages] == ["tool_progress"] * 3
+    assert [m["result"]["result_id"] for m in sent_messages] == ["progress-1_0", "progress-1_1", "progress-1_2"]
+    assert final == {"type": "tool_result", "request_id": "progress-1", "result": {"success": True}}
+
+
+def test_serve_static_or_index_resolves_and_caches(tmp_path):
+    """Test the catch-all static route on a fresh app: files, SPA fallback and files changing on disk."""
+    from fastapi import FastAPI
+    from src.mcp_cadquery_server import web_server
+    static_dir = tmp_path / "static_app"
+    (static_dir / "assets").mkdir(parents=True)
+    (static_dir / "index.html").write_text("<html>Index</html>", encoding='utf-8')
+    (static_dir / "app.js").write_text("console.log('app');", encoding='utf-8')
+    static_app = FastAPI()
+    web_server.configure_static_files(static_app, str(static_dir), "renders", str(tmp_path / "renders"),
+                                      "previews", str(tmp_path / "previews"), str(static_dir / "assets"))
+    web_server._static_media_type.cache_clear()
+
+    with TestClient(static_app) as static_client:
+        response = static_client.get("/app.js")
+        assert response.status_code == 200 and response.text == "console.log('app');"
+        assert "javascript" in response.headers["content-type"]
+        response = static_client.get("/some/spa/route")
+        assert response.status_code == 200 and response.text == "<html>Index</html>"
+        # Files added or removed while the server runs are picked up (lookups are not cached)
+        (static_dir / "app.js").unlink()
+        (static_dir / "some").mkdir()
+        (static_dir / "some" / "spa").write_text("new file", encoding='utf-8')
+        assert static_client.get("/app.js").text == "<html>Index</html>"
+        assert static_client.get("/some/spa").text == "new file"
+    web_server._static_media_type.cache_clear()
+
+
+def test_get_server_info_cached_until_handlers_change():
+    """Test server_info is built once and rebuilt when the set of tool handlers changes."""
+    from src.mcp_cadquery_server import mcp_api
+    info = mcp_api.get_server_info()
+    assert mcp_api.get_server_info() is info
+    def extra_tool(request):
+        """Extra test tool."""
+    with patch.dict(mcp_api.tool_handlers, {"extra_tool": extra_tool}):
+        tools = {tool["name"]: tool for tool in mcp_api.get_server_info()["tools"]}
+        assert tools["extra_tool"]["description"] == "Extra test tool."
+        assert tools["extra_tool"]["input_schema"] == {"type": "object", "properties": {}, "required": []}
+    assert "extra_tool" not in {tool["name"] for tool in mcp_api.get_server_info()["tools"]}
+
+
 # Remove patch for get_server_info as we'll compare with the real output
 # Import the function needed for the test
 from src.mcp_cadquery_server.mcp_api import get_server_info
@@ -1600,4 +2065,64 @@ def test_stdio_mode_sends_server_info(): # Removed mock_get_server_info argument
 # Testing static file serving would require a different approach, perhaps
 # involving running the server as a separate process or more complex fixture setup.
 # Testing static file serving would require a different approach, perhaps
-# involving running the server as a separate process or more complex fixture setup.
\ No newline at end of file
+# involving running the server as a separate process or more complex fixture setup.
+
+def test_stdio_mode_handles_pipelined_requests():
+    """Test that stdio mode answers several requests sent in one write, including a final line without newline."""
+    server_script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server.py'))
+    requests_blob = (
+        '{"request_id": "pipe-1", "tool_name": "search_parts", "arguments": {}}\n'
+        'not json\n'
+        '{"request_id": "pipe-2", "tool_name": "search_parts", "arguments": {"query": "box"}}'
+    )
+    process = subprocess.run([sys.executable, server_script_path, "--mode", "stdio"], input=requests_blob,
+                             capture_output=True, text=True, encoding='utf-8', timeout=60)
+    messages = [json.loads(line) for line in process.stdout.splitlines() if line.strip()]
+    assert [m["type"] for m in messages] == ["server_info", "tool_result", "tool_error", "tool_result"]
+    assert [m["request_id"] for m in messages[1:]] == ["pipe-1", "unknown", "pipe-2"]
+
+def test_stdio_mode_exits_on_sigterm():
+    """Test that SIGTERM ends stdio mode cleanly while it is waiting for input."""
+    server_script_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server.py'))
+    process = subprocess.Popen([sys.executable, server_script_path, "--mode", "stdio"], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        first_line = process.stdout.readline() # server_info is sent once the loop is set up
+        assert json.loads(first_line)["type"] == "server_info"
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+        assert b"SIGTERM received, exiting stdio mode." in process.stderr.read()
+    finally:
+        if process.poll() is None: process.kill()
+
+
+@pytest.mark.parametrize("arguments, valid", [
+    ({"parameters": {"w": 1}}, True),
+    ({"parameter_sets": [{"w": 1}, {"w": 2}]}, True),
+    ({"parameters": [1]}, False),
+    ({"parameter_sets": [{"w": 1}, 2]}, False),
+])
+def test_execute_args_check_params(arguments, valid):
+    """Test the parameter validation of ExecuteCadqueryScriptArgs."""
+    from src.mcp_cadquery_server.models import ExecuteCadqueryScriptArgs
+    arguments = {"workspace_path": "/ws", "script": "result = None", **arguments}
+    if valid: ExecuteCadqueryScriptArgs(**arguments)
+    else:
+        with pytest.raises(ValueError): ExecuteCadqueryScriptArgs(**arguments)
+    assert set(ExecuteCadqueryScriptArgs.schema()["required"]) == {"workspace_path", "script"}
+
+
+@pytest.mark.parametrize("returncode", [None, 1])
+def test_handle_launch_cq_editor(returncode):
+    """Test CQ-Editor is launched detached and an immediate exit is reported as a failure."""
+    from src.mcp_cadquery_server.handlers import handle_launch_cq_editor
+    process = MagicMock(pid=1234)
+    process.poll.return_value = returncode
+    with patch("src.mcp_cadquery_server.handlers.subprocess.Popen", return_value=process) as mock_popen:
+        if returncode is None:
+            assert handle_launch_cq_editor({"request_id": "cq-editor"})["success"] is True
+        else:
+            with pytest.raises(Exception, match="exited immediately with code 1"): handle_launch_cq_editor({"request_id": "cq-editor"})
+    _, kwargs = mock_popen.call_args
+    assert kwargs["stdin"] == kwargs["stdout"] == kwargs["stderr"] == subprocess.DEVNULL
+    assert kwargs["start_new_session"] is True